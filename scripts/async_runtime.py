@@ -0,0 +1,114 @@
+import asyncio
+import atexit
+import threading
+import weakref
+
+
+# 每个事件循环上的共享资源（如 httpx.AsyncClient）：loop -> {key: (resource, aclose)}
+_LOOP_RESOURCES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+_LOOP_RESOURCES_LOCK = threading.Lock()
+
+
+def loop_resource(key: str, factory, aclose=None):
+    """返回当前运行中事件循环上的共享资源，不存在时用 factory 创建
+
+    异步客户端的连接池绑定在创建它的事件循环上，因此按循环缓存；aclose 为
+    关闭资源的协程函数，在 close_loop_resources() 或运行时关闭时调用。
+    """
+    loop = asyncio.get_running_loop()
+    with _LOOP_RESOURCES_LOCK:
+        bucket = _LOOP_RESOURCES.setdefault(loop, {})
+        entry = bucket.get(key)
+        if entry is None:
+            entry = (factory(), aclose)
+            bucket[key] = entry
+    return entry[0]
+
+
+async def close_loop_resources():
+    """关闭当前事件循环上的全部共享资源（在循环结束前调用）"""
+    loop = asyncio.get_running_loop()
+    with _LOOP_RESOURCES_LOCK:
+        bucket = _LOOP_RESOURCES.pop(loop, {})
+    for resource, aclose in bucket.values():
+        if aclose is None:
+            continue
+        try:
+            await aclose(resource)
+        except Exception:
+            pass
+
+
+class AsyncRuntime:
+    """框架持有的长生命周期事件循环，由后台守护线程承载
+
+    同步调用方通过 run() 把协程提交到该循环并阻塞等待结果，多次调用复用
+    同一个循环及其上的连接池，避免每次 asyncio.run() 新建/销毁循环与客户端。
+    """
+
+    def __init__(self, name: str = "sagent-async-runtime"):
+        self._name = name
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self.start()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None and self._thread is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _serve():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=_serve, name=self._name, daemon=True)
+            thread.start()
+            ready.wait()
+            self._loop, self._thread = loop, thread
+            return loop
+
+    def in_runtime_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """提交协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro, timeout: float | None = None):
+        """在运行时循环上执行协程并阻塞等待结果"""
+        if self.in_runtime_thread():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() cannot block inside the runtime loop; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def shutdown(self, timeout: float = 5.0):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None or thread is None or not thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(close_loop_resources(), loop).result(timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+
+
+_RUNTIME = AsyncRuntime()
+
+
+def get_runtime() -> AsyncRuntime:
+    return _RUNTIME
+
+
+atexit.register(_RUNTIME.shutdown)
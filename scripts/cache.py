@@ -0,0 +1,159 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+def cache_key(*parts) -> str:
+    """按任意可JSON序列化的组成部分生成稳定的缓存键"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """进程内 LRU 缓存：条目按各自 TTL 过期，超过 max_entries 时淘汰最久未使用的条目"""
+
+    tier = "memory"
+
+    def __init__(self, max_entries: int = 512, clock=time.monotonic):
+        self.max_entries = max(1, int(max_entries))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl_seconds: float):
+        if ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock() + float(ttl_seconds))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteCache:
+    """基于SQLite文件的缓存层：进程重启后仍可命中，值以JSON文本存储，过期时间使用墙钟"""
+
+    tier = "disk"
+
+    def __init__(self, path: Path, timeout_seconds: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._timeout = timeout_seconds
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=self._timeout, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError:
+                pass
+            self._local.conn = conn
+        return conn
+
+    def get_entry(self, key: str):
+        """返回 (value, 剩余秒数)；不存在或已过期时返回 (None, 0)"""
+        row = self._conn().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None, 0.0
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            self.delete(key)
+            return None, 0.0
+        return json.loads(row[0]), remaining
+
+    def get(self, key: str):
+        return self.get_entry(key)[0]
+
+    def set(self, key: str, value, ttl_seconds: float):
+        if ttl_seconds <= 0:
+            return
+        self._conn().execute(
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, json.dumps(value, ensure_ascii=False), time.time() + float(ttl_seconds)),
+        )
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge_expired(self) -> int:
+        return self._conn().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+
+class TieredCache:
+    """内存层 + 可选磁盘层：先查内存，磁盘命中后回填内存；get 返回 (value, tier)"""
+
+    def __init__(self, memory: TTLCache, disk: SQLiteCache | None = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            return value, self.memory.tier
+        if self.disk is not None:
+            try:
+                value, remaining = self.disk.get_entry(key)
+            except sqlite3.Error:
+                value, remaining = None, 0.0
+            if value is not None:
+                self.memory.set(key, value, remaining)
+                return value, self.disk.tier
+        return None, None
+
+    def set(self, key: str, value, ttl_seconds: float):
+        self.memory.set(key, value, ttl_seconds)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl_seconds)
+            except sqlite3.Error:
+                pass
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
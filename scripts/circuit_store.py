@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def _new_state() -> dict:
+    return {"state": "closed", "failures": 0, "opened_at": 0.0}
+
+
+class InMemoryBreakerStore:
+    """进程内断路器状态存储：provider -> {state, failures, opened_at}，读改写由锁保护"""
+
+    backend = "memory"
+
+    def __init__(self):
+        self.states: dict[str, dict] = {}
+        self._lock = threading.RLock()
+
+    def clock(self) -> float:
+        return time.monotonic()
+
+    @contextmanager
+    def transaction(self, provider: str):
+        """原子读改写：在 with 块内修改返回的状态字典"""
+        with self._lock:
+            st = self.states.get(provider)
+            if not st:
+                st = _new_state()
+                self.states[provider] = st
+            yield st
+
+    def get(self, provider: str) -> dict | None:
+        with self._lock:
+            st = self.states.get(provider)
+            return dict(st) if st else None
+
+    def clear(self):
+        with self._lock:
+            self.states.clear()
+
+
+class SQLiteBreakerStore:
+    """基于SQLite文件的断路器状态存储，供同一主机上的多个工作进程共享
+
+    opened_at 使用墙钟时间（time.time），以便跨进程比较；每次读改写在
+    BEGIN IMMEDIATE 事务中完成，避免并发进程相互覆盖失败计数。
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: Path, timeout_seconds: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._timeout = timeout_seconds
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS circuit_state ("
+            "provider TEXT PRIMARY KEY, state TEXT NOT NULL, failures INTEGER NOT NULL, opened_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None：手动管理事务
+            conn = sqlite3.connect(str(self.path), timeout=self._timeout, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError:
+                pass
+            self._local.conn = conn
+        return conn
+
+    def clock(self) -> float:
+        return time.time()
+
+    @contextmanager
+    def transaction(self, provider: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT state, failures, opened_at FROM circuit_state WHERE provider = ?", (provider,)
+            ).fetchone()
+            st = {"state": row[0], "failures": int(row[1]), "opened_at": float(row[2])} if row else _new_state()
+            yield st
+            conn.execute(
+                "INSERT INTO circuit_state (provider, state, failures, opened_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(provider) DO UPDATE SET state = excluded.state, failures = excluded.failures, opened_at = excluded.opened_at",
+                (provider, st.get("state", "closed"), int(st.get("failures", 0)), float(st.get("opened_at", 0.0))),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, provider: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT state, failures, opened_at FROM circuit_state WHERE provider = ?", (provider,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"state": row[0], "failures": int(row[1]), "opened_at": float(row[2])}
+
+    def clear(self):
+        self._conn().execute("DELETE FROM circuit_state")
+
+
+BACKENDS = {"memory", "sqlite"}
@@ -1,64 +1,220 @@
+import hashlib
 import json
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from functools import lru_cache
 
 
 ROOT = Path(__file__).resolve().parents[1]
 
+DEFAULT_ROUTING = {"strategy": {"type": "weighted", "weights": {}}}
+DEFAULT_OUTPUT_SCHEMA = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "type": "object",
+    "properties": {
+        "answer": {"type": "string"},
+        "citations": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+        "tool_used": {"type": ["string", "null"]},
+        "tool_result": {}
+    },
+    "required": ["answer", "citations", "tool_used", "tool_result"],
+    "additionalProperties": False
+}
+
+
+def _read_bytes(path: Path) -> bytes | None:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
 
-def _read_yaml(path: Path):
+
+def _parse_yaml(raw: bytes | None):
+    if raw is None:
+        return None
     try:
         import yaml
-        with open(path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f) or {}
+        return yaml.safe_load(raw.decode('utf-8')) or {}
     except Exception:
-        return {}
+        return None
 
 
-def _read_json(path: Path):
+def _parse_json(raw: bytes | None):
+    if raw is None:
+        return None
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return json.loads(raw.decode('utf-8'))
     except Exception:
-        return {}
+        return None
+
+
+def _read_yaml(path: Path):
+    data = _parse_yaml(_read_bytes(path))
+    return data if data is not None else {}
+
+
+def _read_json(path: Path):
+    data = _parse_json(_read_bytes(path))
+    return data if data is not None else {}
+
+
+def _immutable(*_a, **_k):
+    raise TypeError("config snapshot is read-only; copy.deepcopy() it to modify")
+
+
+class FrozenDict(dict):
+    """只读字典：读取接口与 dict 完全一致（json 序列化、isinstance 检查均可用），任何修改都会抛出 TypeError"""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _immutable
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class FrozenList(list):
+    """只读列表，语义同 FrozenDict"""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = append = extend = insert = pop = remove = clear = sort = reverse = __iadd__ = __imul__ = _immutable
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+
+def freeze(value):
+    """递归转换为 FrozenDict / FrozenList"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """递归转换回可修改的 dict / list"""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """不可变的配置快照：注册表、路由、安全护栏、输出Schema与工具Schema一次性加载
+
+    version 为各配置文件内容的哈希；请求开始时固定一个快照，整个请求内看到的配置保持一致。
+    """
+
+    root: Path
+    version: str
+    registry: FrozenDict
+    routing: FrozenDict
+    guardrails: FrozenDict
+    output_schema: FrozenDict
+    tool_schemas: FrozenDict
+
+    def tool_guardrails(self, tool_name: str) -> FrozenDict:
+        return (self.guardrails.get("tools") or {}).get(tool_name) or FrozenDict()
+
+
+def build_snapshot(root: Path | None = None) -> ConfigSnapshot:
+    """从磁盘读取全部配置并构建快照；缺失或无法解析的文件使用默认值"""
+    root = Path(root or ROOT)
+    paths = {
+        "registry": root / 'config' / 'models' / 'registry.yaml',
+        "routing": root / 'config' / 'routing.yaml',
+        "guardrails": root / 'config' / 'policies' / 'guardrails.yaml',
+        "output_schema": root / 'config' / 'policies' / 'output_schema.json',
+    }
+    raw = {name: _read_bytes(path) for name, path in paths.items()}
+    tools_dir = root / 'config' / 'tools' / 'schema'
+    tool_raw = {}
+    if tools_dir.is_dir():
+        for p in sorted(tools_dir.glob('*.json')):
+            tool_raw[p.stem] = _read_bytes(p)
+    digest = hashlib.sha256()
+    for name, data in list(raw.items()) + sorted(tool_raw.items()):
+        digest.update(name.encode('utf-8') + b'\0' + (data or b'') + b'\0')
+    routing = _parse_yaml(raw["routing"])
+    tool_schemas = {}
+    for name, data in tool_raw.items():
+        schema = _parse_json(data)
+        if schema is not None:
+            tool_schemas[name] = schema
+    return ConfigSnapshot(
+        root=root,
+        version=digest.hexdigest()[:16],
+        registry=freeze(_parse_yaml(raw["registry"]) or {}),
+        routing=freeze(routing if routing is not None else DEFAULT_ROUTING),
+        guardrails=freeze(_parse_yaml(raw["guardrails"]) or {}),
+        output_schema=freeze(_parse_json(raw["output_schema"]) or DEFAULT_OUTPUT_SCHEMA),
+        tool_schemas=freeze(tool_schemas),
+    )
+
+
+_SNAPSHOTS: dict[str, ConfigSnapshot] = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def get_config_snapshot(root: Path | None = None) -> ConfigSnapshot:
+    """返回指定根目录的当前快照（每个根目录只构建一次）"""
+    key = str(Path(root or ROOT))
+    snap = _SNAPSHOTS.get(key)
+    if snap is not None:
+        return snap
+    with _SNAPSHOTS_LOCK:
+        snap = _SNAPSHOTS.get(key)
+        if snap is None:
+            snap = build_snapshot(Path(key))
+            _SNAPSHOTS[key] = snap
+    return snap
+
+
+def set_config_snapshot(snapshot: ConfigSnapshot):
+    """原子替换某根目录的当前快照；已开始的请求继续使用各自固定的旧快照"""
+    with _SNAPSHOTS_LOCK:
+        _SNAPSHOTS[str(snapshot.root)] = snapshot
+
+
+def clear_config_snapshots():
+    with _SNAPSHOTS_LOCK:
+        _SNAPSHOTS.clear()
 
 
 class ConfigLoader:
-    """Centralized configuration loader with caching and helpers."""
+    """Centralized configuration loader backed by the shared config snapshot."""
 
-    def __init__(self):
-        self._root = ROOT
+    def __init__(self, root: Path | None = None):
+        self._root = Path(root or ROOT)
+
+    def snapshot(self) -> ConfigSnapshot:
+        return get_config_snapshot(self._root)
 
-    @lru_cache(maxsize=1)
     def registry(self) -> dict:
-        return _read_yaml(self._root / 'config' / 'models' / 'registry.yaml')
+        return self.snapshot().registry
 
-    @lru_cache(maxsize=1)
     def routing(self) -> dict:
-        return _read_yaml(self._root / 'config' / 'routing.yaml')
+        return self.snapshot().routing
 
-    @lru_cache(maxsize=1)
     def guardrails(self) -> dict:
-        return _read_yaml(self._root / 'config' / 'policies' / 'guardrails.yaml')
+        return self.snapshot().guardrails
 
-    @lru_cache(maxsize=1)
     def output_schema(self) -> dict:
-        data = _read_json(self._root / 'config' / 'policies' / 'output_schema.json')
-        if not data:
-            # Fallback default schema
-            return {
-                "$schema": "https://json-schema.org/draft/2020-12/schema",
-                "type": "object",
-                "properties": {
-                    "answer": {"type": "string"},
-                    "citations": {"type": "array", "items": {"type": "string"}, "minItems": 1},
-                    "tool_used": {"type": ["string", "null"]},
-                    "tool_result": {}
-                },
-                "required": ["answer", "citations", "tool_used", "tool_result"],
-                "additionalProperties": False
-            }
-        return data
+        return self.snapshot().output_schema
 
     def tool_policies(self, tool_name: str) -> dict:
         routing = self.routing() or {}
@@ -90,4 +246,3 @@ def validate_all_configs() -> tuple[bool, list]:
         return vc.validate_all()
     except Exception:
         return False, ["validate_all() not available"]
-
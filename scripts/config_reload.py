@@ -0,0 +1,98 @@
+import logging
+import threading
+from pathlib import Path
+
+from scripts.config_loader import ROOT, build_snapshot, get_config_snapshot, set_config_snapshot
+
+
+def watched_files(root: Path) -> list[Path]:
+    """快照依赖的配置文件：注册表、路由、护栏、输出Schema与工具Schema"""
+    files = [
+        root / "config" / "models" / "registry.yaml",
+        root / "config" / "routing.yaml",
+        root / "config" / "policies" / "guardrails.yaml",
+        root / "config" / "policies" / "output_schema.json",
+    ]
+    tools_dir = root / "config" / "tools" / "schema"
+    if tools_dir.is_dir():
+        files.extend(sorted(tools_dir.glob("*.json")))
+    return files
+
+
+def files_signature(root: Path) -> tuple:
+    sig = []
+    for path in watched_files(root):
+        try:
+            st = path.stat()
+            sig.append((str(path), st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((str(path), None, None))
+    return tuple(sig)
+
+
+class ConfigReloader:
+    """轮询配置文件的 mtime，变化后在后台线程校验并构建新快照，再原子替换当前快照
+
+    校验失败时保留旧快照并记录错误，直到文件再次变化；进行中的请求继续使用各自固定的旧快照。
+    """
+
+    def __init__(self, root: Path | None = None, interval_seconds: float = 2.0, logger: logging.Logger | None = None, on_reload=None):
+        self.root = Path(root or ROOT)
+        self.interval_seconds = max(0.05, float(interval_seconds))
+        self.logger = logger
+        self.on_reload = on_reload
+        # 首次检查总是与当前快照比较内容版本（fork 出的工作进程可能持有较旧的快照）
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def check(self) -> bool | None:
+        """检查一次：无变化（或内容未变）返回 None，已替换返回 True，校验失败返回 False"""
+        sig = files_signature(self.root)
+        if sig == self._signature:
+            return None
+        try:
+            from scripts import validate_config as vc
+            ok, issues = vc.validate_all(self.root)
+        except Exception as e:
+            ok, issues = False, [{"severity": "error", "message": f"{type(e).__name__}: {e}"}]
+        if ok:
+            snapshot = build_snapshot(self.root)
+        # 校验或构建期间文件又被修改：本轮放弃，下一轮重新处理
+        if files_signature(self.root) != sig:
+            return None
+        self._signature = sig
+        if not ok:
+            if self.logger:
+                errors = [i.get("message") for i in issues if i.get("severity") == "error"]
+                self.logger.error(f"config_reload_rejected; errors={errors}")
+            return False
+        old = get_config_snapshot(self.root)
+        if snapshot.version == old.version:
+            return None
+        set_config_snapshot(snapshot)
+        if self.logger:
+            self.logger.info(f"config_reloaded; version={old.version}->{snapshot.version}")
+        if self.on_reload:
+            self.on_reload(snapshot)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception:
+                if self.logger:
+                    self.logger.exception("config_reload_failed")
+
+    def start(self) -> "ConfigReloader":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="config-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_seconds + 1)
+            self._thread = None
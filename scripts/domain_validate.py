@@ -1,24 +1,29 @@
 import json
+import sys
 from pathlib import Path
 from typing import Dict, Any, Tuple
 
-from jsonschema import validate as jsonschema_validate, ValidationError
+from jsonschema import ValidationError
 
 ROOT = Path(__file__).resolve().parents[1]
+# 以脚本方式运行时确保项目根目录在 sys.path 中
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from scripts.schema_registry import get_validator_registry
 
 
 def load_domain_schema(domain: str) -> Dict[str, Any]:
     path = ROOT / "config" / "domain_schema" / f"{domain}.json"
     if not path.exists():
         raise FileNotFoundError(f"unknown domain schema: {domain}")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # 按 mtime 缓存解析结果与编译后的校验器
+    return get_validator_registry().load_file(path)
 
 
 def validate_domain(doc: Any, domain: str) -> Tuple[bool, str | None]:
     try:
-        schema = load_domain_schema(domain)
-        jsonschema_validate(instance=doc, schema=schema)
+        get_validator_registry().validate(doc, load_domain_schema(domain))
         # Additional lightweight consistency checks
         if domain == "stories":
             # Each story should have non-empty acceptance criteria
@@ -0,0 +1,108 @@
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+import yaml
+
+from scripts.schema_registry import get_validator_registry
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规划缓存使用的归一化提示语：NFKC（全角转半角）、小写、折叠空白"""
+    text = unicodedata.normalize("NFKC", prompt or "")
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _cast(value: str, kind: str | None):
+    if kind == "number":
+        return float(value) if any(c in value for c in ".eE") else int(value)
+    if kind == "integer":
+        return int(value)
+    return value
+
+
+class RulePlanner:
+    """基于正则规则的快速规划器：明显的请求直接生成工具计划，无需调用LLM
+
+    规则定义见 config/tools/rules.yaml；生成的参数须通过工具Schema校验，否则视为未命中。
+    """
+
+    def __init__(self, rules: list[dict]):
+        self.rules = []
+        for i, rule in enumerate(rules or []):
+            if not isinstance(rule, dict) or not rule.get("tool") or not rule.get("pattern"):
+                raise ValueError(f"rules[{i}]: tool 与 pattern 必填")
+            self.rules.append({
+                "name": rule.get("name") or f"rule_{i}",
+                "tool": rule["tool"],
+                "when": re.compile(rule["when"]) if rule.get("when") else None,
+                "pattern": re.compile(rule["pattern"]),
+                "args": rule.get("args") or {},
+            })
+
+    def _build_args(self, spec: dict, match: re.Match):
+        args = {}
+        for name, conf in spec.items():
+            if not isinstance(conf, dict):
+                args[name] = conf
+                continue
+            if "value" in conf:
+                args[name] = conf["value"]
+                continue
+            raw = match.group(conf.get("group", name))
+            if raw is None:
+                continue
+            if "map" in conf:
+                raw = raw.strip()
+                if raw not in conf["map"]:
+                    return None
+                args[name] = conf["map"][raw]
+            else:
+                args[name] = _cast(raw, conf.get("type"))
+        return args
+
+    def plan(self, user_prompt: str, tool_schemas: dict) -> dict | None:
+        """返回第一条命中规则生成的计划；未命中返回 None"""
+        text = unicodedata.normalize("NFKC", user_prompt or "")
+        for rule in self.rules:
+            schema = tool_schemas.get(rule["tool"])
+            if schema is None:
+                continue
+            if rule["when"] is not None and not rule["when"].search(text):
+                continue
+            match = rule["pattern"].search(text)
+            if not match:
+                continue
+            try:
+                args = self._build_args(rule["args"], match)
+            except (ValueError, IndexError):
+                continue
+            if args is None or not get_validator_registry().get(schema).is_valid(args):
+                continue
+            return {"use_tool": True, "tool": rule["tool"], "args": args, "reason": f"rule:{rule['name']}"}
+        return None
+
+
+_PLANNERS: dict = {}
+_PLANNERS_LOCK = threading.Lock()
+
+
+def load_rule_planner(path: Path) -> RulePlanner | None:
+    """加载规则文件（按 mtime 缓存编译结果）；文件不存在时返回 None"""
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    key = str(path)
+    with _PLANNERS_LOCK:
+        cached = _PLANNERS.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    planner = RulePlanner(data.get("rules") or [])
+    with _PLANNERS_LOCK:
+        _PLANNERS[key] = (mtime, planner)
+    return planner
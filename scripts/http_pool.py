@@ -0,0 +1,230 @@
+import atexit
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+from scripts.async_runtime import loop_resource
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def origin_of(url: str) -> str:
+    """scheme://host[:port]，作为连接池的分组键"""
+    parts = urlsplit(url or "")
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    default_port = {"http": 80, "https": 443}.get(scheme)
+    port = parts.port if parts.port and parts.port != default_port else None
+    return f"{scheme}://{host}:{port}" if port else f"{scheme}://{host}"
+
+
+def _settling_transport(pool: "HttpClientPool", origin: str, is_async: bool):
+    """包装 httpx 默认传输层：请求在收到响应前以任何异常结束（含任务取消、超时）时都结算在途计数"""
+    import httpx
+
+    if is_async:
+        class _AsyncSettling(httpx.AsyncBaseTransport):
+            def __init__(self, inner):
+                self._inner = inner
+
+            async def handle_async_request(self, request):
+                try:
+                    return await self._inner.handle_async_request(request)
+                except BaseException:
+                    pool._settle(origin, request)
+                    raise
+
+            async def aclose(self):
+                await self._inner.aclose()
+
+        return _AsyncSettling(httpx.AsyncHTTPTransport(limits=pool._limits(), http2=pool.http2))
+
+    class _Settling(httpx.BaseTransport):
+        def __init__(self, inner):
+            self._inner = inner
+
+        def handle_request(self, request):
+            try:
+                return self._inner.handle_request(request)
+            except BaseException:
+                pool._settle(origin, request)
+                raise
+
+        def close(self):
+            self._inner.close()
+
+    return _Settling(httpx.HTTPTransport(limits=pool._limits(), http2=pool.http2))
+
+
+class HttpClientPool:
+    """web 工具共享的 httpx 客户端池：每个源站（scheme+host+port）一个长连接客户端
+
+    - 同步客户端进程内共享（httpx.Client 线程安全），异步客户端按事件循环共享
+    - max_connections_per_host / max_keepalive_per_host 限制单个源站的并发连接与空闲保活连接
+    - http2 需要安装 h2，未安装时自动退回 HTTP/1.1
+    - in_flight 在响应钩子或传输层异常（含 CancelledError）时结算，每个请求只减一次
+    """
+
+    def __init__(self, max_connections_per_host: int = 10, max_keepalive_per_host: int = 5, keepalive_expiry_seconds: float = 30.0, http2: bool = False, timeout_seconds: float = 10.0):
+        self.max_connections_per_host = max(1, int(max_connections_per_host))
+        self.max_keepalive_per_host = max(0, int(max_keepalive_per_host))
+        self.keepalive_expiry_seconds = float(keepalive_expiry_seconds)
+        self.http2 = bool(http2) and _h2_available()
+        self.timeout_seconds = float(timeout_seconds)
+        self._lock = threading.Lock()
+        self._clients: dict = {}
+        self._stats: dict[str, dict] = {}
+        # 已发出但尚未收到响应（也未以传输错误结束）的请求，保证在途计数每个请求只减一次
+        self._pending = weakref.WeakSet()
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(
+            max_connections=self.max_connections_per_host,
+            max_keepalive_connections=self.max_keepalive_per_host,
+            keepalive_expiry=self.keepalive_expiry_seconds,
+        )
+
+    def _host_stats(self, origin: str) -> dict:
+        with self._lock:
+            st = self._stats.get(origin)
+            if st is None:
+                st = {"clients": 0, "requests": 0, "responses": 0, "errors": 0, "in_flight": 0}
+                self._stats[origin] = st
+            return st
+
+    def _count(self, origin: str, **deltas):
+        st = self._host_stats(origin)
+        with self._lock:
+            for k, v in deltas.items():
+                st[k] += v
+
+    def _settle(self, origin: str, request, **deltas):
+        """请求结束：若仍在途则在途计数减一，并累加其余计数"""
+        st = self._host_stats(origin)
+        with self._lock:
+            if request is not None and request in self._pending:
+                self._pending.discard(request)
+                st["in_flight"] -= 1
+            for k, v in deltas.items():
+                st[k] += v
+
+    def _hooks(self, origin: str, is_async: bool):
+        def on_request(request):
+            with self._lock:
+                self._pending.add(request)
+            self._count(origin, requests=1, in_flight=1)
+
+        def on_response(response):
+            self._settle(origin, response.request, responses=1)
+
+        if not is_async:
+            return {"request": [on_request], "response": [on_response]}
+
+        async def a_on_request(request):
+            on_request(request)
+
+        async def a_on_response(response):
+            on_response(response)
+
+        return {"request": [a_on_request], "response": [a_on_response]}
+
+    def client(self, url: str):
+        """返回 url 所属源站的共享同步客户端"""
+        import httpx
+        origin = origin_of(url)
+        with self._lock:
+            c = self._clients.get(origin)
+            if c is not None:
+                return c
+        c = httpx.Client(timeout=self.timeout_seconds, transport=_settling_transport(self, origin, False), event_hooks=self._hooks(origin, False))
+        with self._lock:
+            existing = self._clients.get(origin)
+            if existing is not None:
+                c.close()
+                return existing
+            self._clients[origin] = c
+        self._count(origin, clients=1)
+        return c
+
+    def async_client(self, url: str):
+        """返回当前事件循环上 url 所属源站的共享异步客户端（随 close_loop_resources 关闭）"""
+        import httpx
+        origin = origin_of(url)
+
+        def factory():
+            self._count(origin, clients=1)
+            return httpx.AsyncClient(timeout=self.timeout_seconds, transport=_settling_transport(self, origin, True), event_hooks=self._hooks(origin, True))
+
+        return loop_resource(f"httpx.AsyncClient:{id(self)}:{origin}", factory, aclose=lambda c: c.aclose())
+
+    def failed(self, url: str, exc: BaseException | None = None):
+        """请求以异常结束时调用：记录错误；仅当该请求尚未收到响应（传输错误）时修正在途计数"""
+        try:
+            request = getattr(exc, "request", None)
+        except RuntimeError:
+            # httpx 异常未关联请求时访问 .request 会抛出 RuntimeError
+            request = None
+        self._settle(origin_of(url), request, errors=1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hosts = {origin: dict(st) for origin, st in self._stats.items()}
+        return {
+            "http2": self.http2,
+            "max_connections_per_host": self.max_connections_per_host,
+            "max_keepalive_per_host": self.max_keepalive_per_host,
+            "hosts": hosts,
+        }
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for c in clients:
+            try:
+                c.close()
+            except Exception:
+                pass
+
+
+_POOLS: dict[tuple, HttpClientPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_http_pool(conf: dict | None = None) -> HttpClientPool:
+    """按配置返回共享连接池（相同配置复用同一实例）"""
+    conf = conf or {}
+    key = (
+        int(conf.get("max_connections_per_host", 10)),
+        int(conf.get("max_keepalive_per_host", 5)),
+        float(conf.get("keepalive_expiry_seconds", 30.0)),
+        bool(conf.get("http2", False)),
+        float(conf.get("timeout_seconds", 10.0)),
+    )
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = HttpClientPool(*key)
+            _POOLS[key] = pool
+    return pool
+
+
+def http_pool_stats() -> list[dict]:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return [p.stats() for p in pools]
+
+
+@atexit.register
+def close_http_pools():
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    for p in pools:
+        p.close()
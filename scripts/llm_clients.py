@@ -0,0 +1,134 @@
+import os
+import threading
+from dataclasses import dataclass
+
+from scripts.async_runtime import loop_resource
+
+try:
+    from openai import OpenAI, AsyncOpenAI
+except Exception:
+    OpenAI = AsyncOpenAI = None
+
+try:
+    import dashscope
+except Exception:
+    dashscope = None
+
+
+DASHSCOPE = "dashscope"
+OPENAI_COMPATIBLE = "openai_compatible"
+TRANSPORTS = {DASHSCOPE, OPENAI_COMPATIBLE}
+
+
+def transport_of(cfg: dict) -> str:
+    """提供方的调用方式：优先 registry.yaml 的 transport，未配置时有 base_url（或 LLM_BASE_URL）走 OpenAI 兼容，否则走 DashScope"""
+    cfg = cfg or {}
+    declared = cfg.get("transport")
+    if declared in TRANSPORTS:
+        return declared
+    return OPENAI_COMPATIBLE if (cfg.get("base_url") or os.getenv("LLM_BASE_URL")) else DASHSCOPE
+
+
+@dataclass(frozen=True)
+class Transport:
+    """一次解析的结果；error 非空表示该提供方当前不可用（缺少SDK或密钥）"""
+
+    kind: str
+    api_key: str | None = None
+    base_url: str | None = None
+    error: str | None = None
+
+
+class ProviderClients:
+    """提供方客户端注册表
+
+    按提供方配置与相关环境变量只解析一次调用方式，并缓存结果（包括缺少SDK/密钥等不可用结果），
+    热路径上不再尝试注定失败的端点；OpenAI 兼容客户端按 (api_key, base_url) 复用，
+    异步客户端按事件循环复用，各自保留连接池。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._transports: dict[tuple, Transport] = {}
+        self._clients: dict[tuple, object] = {}
+
+    def resolve(self, cfg: dict) -> Transport:
+        cfg = cfg or {}
+        kind = transport_of(cfg)
+        api_key_env = cfg.get("api_key_env") or "LLM_API_KEY"
+        # 环境变量的当前值是键的一部分：补充密钥后自动重新解析
+        key = (
+            kind,
+            api_key_env,
+            cfg.get("base_url"),
+            os.getenv(api_key_env),
+            os.getenv("LLM_API_KEY"),
+            os.getenv("LLM_BASE_URL"),
+            os.getenv("DASHSCOPE_API_KEY"),
+        )
+        transport = self._transports.get(key)
+        if transport is None:
+            transport = self._build(kind, cfg, api_key_env)
+            with self._lock:
+                self._transports[key] = transport
+        return transport
+
+    def _build(self, kind: str, cfg: dict, api_key_env: str) -> Transport:
+        if kind == DASHSCOPE:
+            if dashscope is None or not hasattr(dashscope, "Generation"):
+                return Transport(kind, error="DashScope不可用: SDK未安装或导入失败")
+            api_key = os.getenv("DASHSCOPE_API_KEY")
+            if not api_key:
+                return Transport(kind, error="DashScope不可用: 环境变量DASHSCOPE_API_KEY未设置")
+            return Transport(kind, api_key=api_key)
+        if OpenAI is None:
+            return Transport(kind, error="兼容端点不可用: openai SDK未安装")
+        api_key = os.getenv(api_key_env) or os.getenv("LLM_API_KEY")
+        base_url = os.getenv("LLM_BASE_URL") or cfg.get("base_url")
+        if not api_key:
+            return Transport(kind, error=f"兼容端点不可用: 环境变量{api_key_env}未设置")
+        if not base_url:
+            return Transport(kind, error="兼容端点不可用: 未配置base_url")
+        return Transport(kind, api_key=api_key, base_url=base_url)
+
+    def openai(self, cfg: dict):
+        """共享的同步 OpenAI 兼容客户端；不可用时返回 None"""
+        transport = self.resolve(cfg)
+        if transport.error or transport.kind != OPENAI_COMPATIBLE:
+            return None
+        key = (transport.api_key, transport.base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = OpenAI(api_key=transport.api_key, base_url=transport.base_url)
+                self._clients[key] = client
+        return client
+
+    def async_openai(self, cfg: dict):
+        """当前事件循环上共享的异步 OpenAI 兼容客户端；不可用时返回 None"""
+        transport = self.resolve(cfg)
+        if transport.error or transport.kind != OPENAI_COMPATIBLE or AsyncOpenAI is None:
+            return None
+        return loop_resource(
+            f"AsyncOpenAI:{transport.base_url}:{hash(transport.api_key)}",
+            lambda: AsyncOpenAI(api_key=transport.api_key, base_url=transport.base_url),
+            aclose=lambda c: c.close(),
+        )
+
+    def clear(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._transports.clear()
+            self._clients.clear()
+        for c in clients:
+            try:
+                c.close()
+            except Exception:
+                pass
+
+
+_CLIENTS = ProviderClients()
+
+
+def get_provider_clients() -> ProviderClients:
+    return _CLIENTS
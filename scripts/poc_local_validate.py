@@ -4,22 +4,43 @@ import json
 import time
 import logging
 import uuid
+import copy
+import random
+import threading
 from datetime import datetime, timezone
 import asyncio
+import concurrent.futures
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
 import yaml
 from http import HTTPStatus
 from collections import deque
-from jsonschema import validate as jsonschema_validate, ValidationError
-try:
-    from scripts.config_loader import get_loader
-except Exception:
-    get_loader = None
-
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+from collections.abc import Callable
+from jsonschema import ValidationError
+
+# 以脚本方式运行时确保项目根目录在 sys.path 中，以便导入 scripts.* 模块
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from scripts.circuit_store import InMemoryBreakerStore, SQLiteBreakerStore
+from scripts.rate_limit import get_rate_limiter
+from scripts.async_runtime import get_runtime, loop_resource, close_loop_resources
+from scripts.stream_validate import StreamingJSONValidator
+from scripts.provider_stats import get_provider_stats, rank_providers, pick_p2c, pick_weighted_random
+from scripts.single_flight import SingleFlight, single_flight_key
+from scripts.cache import TTLCache, SQLiteCache, TieredCache, cache_key
+from scripts.fast_planner import load_rule_planner, normalize_prompt
+from scripts.schema_registry import get_validator_registry
+
+from scripts.config_loader import ConfigSnapshot, get_config_snapshot
+from scripts.http_pool import get_http_pool
+from scripts.llm_clients import DASHSCOPE, get_provider_clients
+from scripts.tool_retrieval import compact_schema, get_tool_index
+from scripts.rag_index import get_rag_store, sync_rag_store, track_written_file
+from scripts.prompt_builder import planner_prompts, planner_shortlist_prompts, prefix_hash, structured_prompts, with_retry_error
 
 try:
     import dashscope
@@ -29,13 +50,118 @@ except Exception:
 
 ROOT = Path(__file__).resolve().parents[1]
 
-# 记录最近一次LLM调用耗时（毫秒），用于策略评估
-LAST_CALL_DURATION_MS: int | None = None
-# 记录最近一次错误类型，用于断路器分类（例如：llm_none、schema_invalid、latency_exceeded）
-LAST_ERROR_TYPE: str | None = None
 
-# 简易断路器状态：provider -> {state: 'closed'|'open'|'half_open', failures: int, opened_at: float}
-CIRCUIT_STATE: dict[str, dict] = {}
+
+@dataclass
+class RequestContext:
+    """请求级执行上下文（contextvar承载），替代模块级全局变量，保证并发请求互不干扰
+
+    - duration_ms：最近一次LLM调用耗时（毫秒），用于策略评估
+    - error_type：最近一次错误类型，用于断路器分类（llm_none、schema_invalid、latency_exceeded）
+    - attempts：本上下文内的LLM调用次数
+    - provider_attempts：按提供方统计的尝试次数（在父上下文累计）
+    - deadline：端到端截止时间（time.monotonic），None 表示不限
+    - stream：是否以流式方式获取结构化输出（增量校验、提前中止）
+    - config：本请求固定使用的配置快照，None 表示使用当前快照
+    - cancel_event：取消标志（对冲落败的尝试被置位），子上下文默认共享；置位后不再重试、退避、记录事件或写缓存
+    - quota：为本提供方重新预留一次调用的限流额度（返回需等待的秒数，None 表示等待上限内不可得），结构化输出每次重试前调用
+    """
+
+    session_id: str | None = None
+    tool_used: str | None = None
+    duration_ms: int | None = None
+    error_type: str | None = None
+    attempts: int = 0
+    provider_attempts: dict = field(default_factory=dict)
+    deadline: float | None = None
+    stream: bool = False
+    config: ConfigSnapshot | None = None
+    cancel_event: threading.Event | None = None
+    quota: Callable[[], float | None] | None = None
+    parent: "RequestContext | None" = None
+
+    def child(self, **overrides) -> "RequestContext":
+        """派生单次提供方尝试的子上下文：共享会话与截止时间，独立记录耗时与错误"""
+        return RequestContext(
+            session_id=overrides.get("session_id", self.session_id),
+            tool_used=overrides.get("tool_used", self.tool_used),
+            deadline=overrides.get("deadline", self.deadline),
+            stream=overrides.get("stream", self.stream),
+            config=overrides.get("config", self.config),
+            cancel_event=overrides.get("cancel_event", self.cancel_event),
+            quota=overrides.get("quota", self.quota),
+            parent=self,
+        )
+
+    def remaining_ms(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(0.0, (self.deadline - time.monotonic()) * 1000.0)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def cancel(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def note_provider_attempt(self, provider: str):
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        root.provider_attempts[provider] = int(root.provider_attempts.get(provider, 0)) + 1
+
+
+_REQUEST_CONTEXT: contextvars.ContextVar = contextvars.ContextVar("sagent_request_context", default=None)
+
+
+def current_request_context() -> RequestContext:
+    """返回当前请求上下文；未显式建立时为当前线程/任务惰性创建一个"""
+    ctx = _REQUEST_CONTEXT.get()
+    if ctx is None:
+        ctx = RequestContext()
+        _REQUEST_CONTEXT.set(ctx)
+    return ctx
+
+
+def _call_timeout(default: float | None = None) -> float | None:
+    """单次外部调用（LLM/HTTP）的超时秒数：默认值与当前请求剩余预算取较小者"""
+    remaining = current_request_context().remaining_ms()
+    if remaining is None:
+        return default
+    remaining_s = remaining / 1000.0
+    return remaining_s if default is None else min(float(default), remaining_s)
+
+
+def _budget_allows_sleep(seconds: float) -> bool:
+    """退避前检查：请求已取消或等待结束时已无剩余预算，则不再重试"""
+    ctx = current_request_context()
+    if ctx.cancelled():
+        return False
+    remaining = ctx.remaining_ms()
+    return remaining is None or remaining / 1000.0 > seconds
+
+
+@contextmanager
+def request_context(ctx: RequestContext | None = None, **fields):
+    """在 with 块内激活请求上下文（默认新建），退出时恢复先前上下文"""
+    ctx = ctx or RequestContext(**fields)
+    token = _REQUEST_CONTEXT.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _REQUEST_CONTEXT.reset(token)
+
+
+# 断路器状态存储：默认进程内（加锁），可通过 policies.circuit_breaker.backend=sqlite 在多进程间共享
+_MEMORY_BREAKER_STORE = InMemoryBreakerStore()
+# 进程内断路器状态：provider -> {state: 'closed'|'open'|'half_open', failures: int, opened_at: float}
+CIRCUIT_STATE: dict[str, dict] = _MEMORY_BREAKER_STORE.states
+_BREAKER_STORES: dict[str, SQLiteBreakerStore] = {}
+_BREAKER_STORES_LOCK = threading.Lock()
 # 简易 web_search 限速状态（最近一分钟的时间戳）
 WEB_SEARCH_RATE_STATE = {"timestamps": deque()}
 NORMALIZE_SUPPORTS = [
@@ -56,8 +182,21 @@ def load_yaml(path: Path):
         return yaml.safe_load(f)
 
 
+def current_config() -> ConfigSnapshot:
+    """当前请求固定的配置快照；请求外调用时返回 ROOT 对应的共享快照"""
+    snap = current_request_context().config
+    if snap is not None and snap.root == ROOT:
+        return snap
+    return get_config_snapshot(ROOT)
+
+
+def tool_guardrails(tool_name: str) -> dict:
+    """guardrails.yaml 中 tools.<name> 的只读配置"""
+    return current_config().tool_guardrails(tool_name)
+
+
 def get_provider_config():
-    registry = load_yaml(ROOT / "config" / "models" / "registry.yaml")
+    registry = current_config().registry
     provider = os.getenv("LLM_PROVIDER", registry.get("default_provider", "qwen"))
     providers = registry.get("providers", {})
     cfg = providers.get(provider)
@@ -67,11 +206,7 @@ def get_provider_config():
 
 
 def load_routing_config():
-    path = ROOT / "config" / "routing.yaml"
-    try:
-        return load_yaml(path)
-    except Exception:
-        return {"strategy": {"type": "weighted", "weights": {}}}
+    return current_config().routing
 
 
 def choose_provider(registry: dict, routing: dict):
@@ -80,11 +215,11 @@ def choose_provider(registry: dict, routing: dict):
     env_provider = os.getenv("LLM_PROVIDER")
     if env_provider and env_provider in providers:
         return env_provider
-    # 加权选择（当前实现：选择权重最高的可用提供方）
+    # 加权选择（当前实现：选择权重最高的可用提供方）；latency_aware 时按运行时延迟重排
     weights = (routing.get("strategy", {}) or {}).get("weights", {})
     if weights:
-        ordered = sorted(weights.items(), key=lambda kv: kv[1], reverse=True)
-        for name, _w in ordered:
+        ordered = [name for name, _w in sorted(weights.items(), key=lambda kv: kv[1], reverse=True)]
+        for name in _apply_strategy(ordered, routing, registry):
             if name in providers:
                 return name
     # 退回默认
@@ -109,6 +244,41 @@ def choose_provider_for_task(registry: dict, routing: dict, tool_name: str | Non
     return choose_provider(registry, routing)
 
 
+# 负载均衡策略使用的随机源（测试可替换为固定种子）
+_LB_RANDOM = random.Random()
+
+
+def _apply_strategy(ordered: list[str], routing: dict, registry: dict | None = None, tool_name: str | None = None) -> list[str]:
+    """按 strategy.type 调整候选顺序
+
+    - weighted：保持配置顺序
+    - latency_aware：按 EWMA 延迟与错误率重排
+    - p2c / weighted_random：在策略允许且断路器未打开的候选中选出首选，其余按原顺序作为故障切换尾部
+    """
+    strategy = (routing or {}).get("strategy") or {}
+    stype = strategy.get("type")
+    if len(ordered) < 2:
+        return ordered
+    if stype == "latency_aware":
+        half_life = strategy.get("stats_half_life_seconds")
+        return rank_providers(ordered, get_provider_stats(), float(strategy.get("error_penalty", 2.0)), None if half_life is None else float(half_life))
+    if stype not in {"p2c", "weighted_random"}:
+        return ordered
+    providers = (registry or {}).get("providers", {})
+    policies = _effective_policies(routing, tool_name)
+    eligible = [
+        name for name in ordered
+        if (not providers or policy_allows_provider(providers.get(name), policies)) and not _cb_cooling_down(name, policies)
+    ]
+    if not eligible:
+        return ordered
+    if stype == "p2c":
+        head = pick_p2c(eligible, get_provider_stats(), _LB_RANDOM)
+    else:
+        head = pick_weighted_random(eligible, strategy.get("weights") or {}, _LB_RANDOM)
+    return [head] + [name for name in ordered if name != head]
+
+
 def select_providers_for_tool(registry: dict, routing: dict, tool_name: str | None):
     providers = registry.get("providers", {})
     ordered = []
@@ -131,7 +301,7 @@ def select_providers_for_tool(registry: dict, routing: dict, tool_name: str | No
     # 仍为空则用默认提供方
     if not ordered:
         ordered = [registry.get("default_provider", "qwen")] if registry.get("default_provider") else []
-    return ordered
+    return _apply_strategy(ordered, routing, registry, tool_name)
 
 
 def policy_allows_provider(provider_cfg: dict, policies: dict, est_tokens: int = 1000):
@@ -160,6 +330,9 @@ def policy_allows_provider(provider_cfg: dict, policies: dict, est_tokens: int =
 
 
 def event_log(session_id: str, event: str, details: dict):
+    # 已取消的尝试（对冲落败）不再写入会话时间线
+    if current_request_context().cancelled():
+        return
     try:
         logs_dir = ROOT / "logs"
         logs_dir.mkdir(parents=True, exist_ok=True)
@@ -191,56 +364,80 @@ def _cb_params(policies: dict):
     return threshold, cooldown
 
 
-def _cb_state(provider: str):
-    st = CIRCUIT_STATE.get(provider)
-    if not st:
-        st = {"state": "closed", "failures": 0, "opened_at": 0.0}
-        CIRCUIT_STATE[provider] = st
-    return st
+def _cb_store(policies: dict | None):
+    """按策略选择断路器存储后端：memory（默认）或 sqlite（同机多进程共享）"""
+    cb = (policies or {}).get("circuit_breaker") or {}
+    if (cb.get("backend") or "memory") != "sqlite":
+        return _MEMORY_BREAKER_STORE
+    path = Path(cb.get("path") or "logs/circuit_state.sqlite")
+    if not path.is_absolute():
+        path = ROOT / path
+    key = str(path.resolve())
+    with _BREAKER_STORES_LOCK:
+        store = _BREAKER_STORES.get(key)
+        if store is None:
+            store = SQLiteBreakerStore(path)
+            _BREAKER_STORES[key] = store
+    return store
+
+
+def _cb_state(provider: str, policies: dict | None = None):
+    return _cb_store(policies).get(provider) or {"state": "closed", "failures": 0, "opened_at": 0.0}
+
+
+def _cb_cooling_down(provider: str, policies: dict | None = None) -> bool:
+    """只读判断断路器是否打开且仍在冷却期内（不触发半开转换）"""
+    _threshold, cooldown = _cb_params(policies)
+    store = _cb_store(policies)
+    st = store.get(provider)
+    return bool(st) and st["state"] == "open" and (store.clock() - st["opened_at"]) < cooldown
 
 
 def _cb_should_skip(provider: str, policies: dict, session_id: str | None):
     threshold, cooldown = _cb_params(policies)
-    st = _cb_state(provider)
-    if st["state"] == "open":
-        now = time.monotonic()
-        if (now - st["opened_at"]) < cooldown:
-            if session_id:
-                event_log(session_id, "circuit_skip_open", {"provider": provider, "cooldown_seconds": cooldown})
-            return True, "skip_circuit_open"
-        # 进入半开，允许一次尝试
-        st["state"] = "half_open"
-        if session_id:
-            event_log(session_id, "circuit_half_open", {"provider": provider})
+    store = _cb_store(policies)
+    event = None
+    with store.transaction(provider) as st:
+        if st["state"] == "open":
+            if (store.clock() - st["opened_at"]) < cooldown:
+                event = ("circuit_skip_open", {"provider": provider, "cooldown_seconds": cooldown})
+            else:
+                # 进入半开，允许一次尝试
+                st["state"] = "half_open"
+                event = ("circuit_half_open", {"provider": provider})
+    if event and session_id:
+        event_log(session_id, event[0], event[1])
+    if event and event[0] == "circuit_skip_open":
+        return True, "skip_circuit_open"
     return False, None
 
 
 def _cb_record_failure(provider: str, policies: dict, err_type: str | None, session_id: str | None):
     threshold, _cooldown = _cb_params(policies)
-    st = _cb_state(provider)
-    st["failures"] = int(st.get("failures", 0)) + 1
-    if st["state"] == "half_open":
-        # 半开失败，重新打开
-        st["state"] = "open"
-        st["opened_at"] = time.monotonic()
-        if session_id:
-            event_log(session_id, "circuit_open", {"provider": provider, "reason": err_type or "failure", "failures": st["failures"]})
-        return
-    if st["failures"] >= threshold:
-        st["state"] = "open"
-        st["opened_at"] = time.monotonic()
-        if session_id:
-            event_log(session_id, "circuit_open", {"provider": provider, "reason": err_type or "failure", "failures": st["failures"]})
-
-
-def _cb_record_success(provider: str, session_id: str | None):
-    st = _cb_state(provider)
-    if st["state"] in {"open", "half_open"} or st.get("failures", 0) > 0:
-        st["state"] = "closed"
-        st["failures"] = 0
-        st["opened_at"] = 0.0
-        if session_id:
-            event_log(session_id, "circuit_closed", {"provider": provider})
+    store = _cb_store(policies)
+    opened = None
+    with store.transaction(provider) as st:
+        st["failures"] = int(st.get("failures", 0)) + 1
+        # 半开失败重新打开；或失败次数达到阈值
+        if st["state"] == "half_open" or st["failures"] >= threshold:
+            st["state"] = "open"
+            st["opened_at"] = store.clock()
+            opened = st["failures"]
+    if opened is not None and session_id:
+        event_log(session_id, "circuit_open", {"provider": provider, "reason": err_type or "failure", "failures": opened})
+
+
+def _cb_record_success(provider: str, session_id: str | None, policies: dict | None = None):
+    store = _cb_store(policies)
+    closed = False
+    with store.transaction(provider) as st:
+        if st["state"] in {"open", "half_open"} or st.get("failures", 0) > 0:
+            st["state"] = "closed"
+            st["failures"] = 0
+            st["opened_at"] = 0.0
+            closed = True
+    if closed and session_id:
+        event_log(session_id, "circuit_closed", {"provider": provider})
 
 
 def _make_degraded_output(citation: str, tool_used, tool_result, schema: dict):
@@ -255,120 +452,507 @@ def _make_degraded_output(citation: str, tool_used, tool_result, schema: dict):
     return data
 
 
+def _effective_policies(routing: dict, tool_used):
+    # 选择工具级策略优先，叠加全局policies
+    tool_policies = ((routing.get("task_routing", {}) or {}).get("policies", {}) or {}).get(tool_used) or {}
+    global_policies = routing.get("policies", {}) or {}
+    return {**global_policies, **tool_policies}
+
+
+def _check_sla_total(start_all: float, policies: dict, citation: str, tool_used, tool_result, schema: dict, tried: list, logger=None, session_id: str | None = None, deadline: float | None = None):
+    """检查端到端延迟SLA：返回 (action, output)，action 为 None/'degrade'/'abort'
+
+    deadline 为请求上下文的截止时间（time.monotonic），可能早于 max_latency_ms_total 推导的时间。
+    """
+    max_total = (policies or {}).get("max_latency_ms_total")
+    on_timeout = (policies or {}).get("on_sla_timeout", "abort")
+    if max_total is None and deadline is None:
+        return None, None
+    elapsed_ms = int((time.monotonic() - start_all) * 1000)
+    # 使用>=以确保当阈值为0时立即触发（测试要求）
+    over_total = max_total is not None and elapsed_ms >= float(max_total)
+    if not over_total and (deadline is None or time.monotonic() < deadline):
+        return None, None
+    tried.append("sla_timeout_total")
+    if on_timeout == "degrade":
+        degraded = _make_degraded_output(citation, tool_used, tool_result, schema)
+        if session_id:
+            event_log(session_id, "sla_degrade_total", {"elapsed_ms": elapsed_ms, "max_latency_ms_total": max_total})
+        if logger:
+            logger.warning(f"sla_degrade_total; elapsed_ms={elapsed_ms}; max_latency_ms_total={max_total}")
+        tried.append("sla_degrade")
+        return "degrade", degraded
+    if session_id:
+        event_log(session_id, "sla_timeout_total", {"elapsed_ms": elapsed_ms, "max_latency_ms_total": max_total})
+    if logger:
+        logger.warning(f"sla_timeout_total; elapsed_ms={elapsed_ms}; max_latency_ms_total={max_total}")
+    return "abort", None
+
+
+def _estimate_request_tokens(user_prompt: str, tool_result, schema: dict, completion_tokens: int = 512):
+    """粗略估算一次结构化请求的token数（中英文混合按约2字符/token），用于tpm限流"""
+    chars = len(user_prompt or "") + len(str(tool_result)) + len(json.dumps(schema or {}, ensure_ascii=False)) + 200
+    return chars // 2 + completion_tokens
+
+
+def _precheck_provider(name: str, cfg: dict, policies: dict, tried: list, session_id: str | None = None, ctx: RequestContext | None = None, est_tokens: int = 1000):
+    """断路器、策略与限流过滤；返回发起请求前需等待的秒数，None 表示跳过该提供方"""
+    skip, tag = _cb_should_skip(name, policies, session_id)
+    if skip:
+        tried.append(f"{tag}:{name}")
+        return None
+    if not policy_allows_provider(cfg, policies):
+        tried.append(f"skip_policy:{name}")
+        if session_id:
+            event_log(session_id, "provider_skip_policy", {"provider": name, "policies": policies})
+        return None
+    limiter = get_rate_limiter(name, cfg.get("rate_limits"))
+    if limiter is None:
+        return 0.0
+    wait_s, max_wait_ms = _reserve_quota(limiter, policies, ctx, est_tokens)
+    if wait_s is None:
+        tried.append(f"skip_rate_limit:{name}")
+        if session_id:
+            event_log(session_id, "provider_skip_rate_limit", {"provider": name, "est_tokens": est_tokens, "max_wait_ms": max_wait_ms})
+        return None
+    if wait_s > 0 and session_id:
+        event_log(session_id, "rate_limit_wait", {"provider": name, "wait_ms": int(wait_s * 1000), "est_tokens": est_tokens})
+    return wait_s
+
+
+def _reserve_quota(limiter, policies: dict, ctx: RequestContext | None, est_tokens: int):
+    """预留一次LLM调用的限流额度；返回 (需等待的秒数或None, 等待上限毫秒)
+
+    等待上限：rate_limit_max_wait_ms（默认500ms），且不超过端到端剩余预算。
+    """
+    max_wait_ms = float((policies or {}).get("rate_limit_max_wait_ms", 500))
+    remaining_ms = ctx.remaining_ms() if ctx else None
+    if remaining_ms is not None:
+        max_wait_ms = min(max_wait_ms, remaining_ms)
+    return limiter.reserve(est_tokens, max_wait_ms / 1000.0), max_wait_ms
+
+
+def _retry_quota(name: str, cfg: dict, policies: dict, est_tokens: int):
+    """提供方尝试内每次重试重新预留额度的函数（挂在尝试的子上下文上）；未配置限流时返回 None"""
+    limiter = get_rate_limiter(name, cfg.get("rate_limits"))
+    if limiter is None:
+        return None
+    return lambda: _reserve_quota(limiter, policies, current_request_context(), est_tokens)[0]
+
+
+def _retry_delay(backoff: float, session_id: str | None = None) -> float | None:
+    """结构化输出重试前的等待秒数：退避时长与重新预留限流额度所需的等待取较大者
+
+    已取消、退避后无剩余预算或限流额度在等待上限内不可得时返回 None（放弃重试）。
+    """
+    if not _budget_allows_sleep(backoff):
+        return None
+    quota = current_request_context().quota
+    if quota is None:
+        return backoff
+    wait_s = quota()
+    if wait_s is None:
+        if session_id:
+            event_log(session_id, "structured_retry_rate_limited", {"backoff_ms": int(backoff * 1000)})
+        return None
+    return max(backoff, wait_s)
+
+
+def _record_attempt(name: str, model_name, result, attempt_ctx: RequestContext, policies: dict, tried: list, logger=None, session_id: str | None = None):
+    """记录一次提供方尝试的结果（延迟策略、事件、断路器）；返回True表示结果可用"""
+    duration_ms = attempt_ctx.duration_ms
+    # 若存在延迟策略阈值，且本次调用耗时超阈值，则按策略拒绝
+    max_latency = (policies or {}).get("max_latency_ms")
+    if max_latency is not None and isinstance(duration_ms, (int, float)) and duration_ms > float(max_latency):
+        if logger:
+            logger.warning(f"provider_latency_exceeded={name}; duration_ms={duration_ms}; max_latency_ms={max_latency}")
+        tried.append(f"latency_exceeded:{name}")
+        if session_id:
+            event_log(session_id, "provider_failed", {"provider": name, "model": model_name, "reason_code": "policy_latency", "duration_ms": duration_ms, "max_latency_ms": max_latency})
+        # 断路器记录失败
+        attempt_ctx.error_type = "latency_exceeded"
+        _cb_record_failure(name, policies, attempt_ctx.error_type, session_id)
+        get_provider_stats().record(name, duration_ms, ok=False)
+        return False
+    # 与 provider_success/provider_failed 事件同源的延迟样本，供 latency_aware 路由使用
+    get_provider_stats().record(name, duration_ms, ok=bool(result))
+    if result:
+        if logger:
+            logger.info(f"structured_answer_success_provider={name}; tried={tried}; duration_ms={duration_ms}")
+        if session_id:
+            event_log(session_id, "provider_success", {"provider": name, "model": model_name, "duration_ms": duration_ms})
+        _cb_record_success(name, session_id, policies)
+        return True
+    if logger:
+        logger.warning(f"provider_failed={name}")
+    if session_id:
+        event_log(session_id, "provider_failed", {"provider": name, "model": model_name})
+    _cb_record_failure(name, policies, attempt_ctx.error_type, session_id)
+    return False
+
+
+def _all_providers_failed(tried: list, logger=None, session_id: str | None = None):
+    if logger:
+        logger.error(f"all_providers_failed; tried={tried}")
+    if session_id:
+        event_log(session_id, "all_providers_failed", {"tried": tried})
+    return None, None, None, tried
+
+
+class _HedgeLauncher:
+    """对冲请求的提供方发射器：按顺序取下一个可用提供方，并在发射前检查SLA/断路器/策略"""
+
+    def __init__(self, providers_order: list[str], registry: dict, policies: dict, citation: str, tool_used, tool_result, schema: dict, logger=None, session_id: str | None = None, est_tokens: int = 1000):
+        self.queue = list(providers_order)
+        self.providers_map = registry.get("providers", {})
+        self.policies = policies
+        self.hedge_after_s = max(0.0, float(policies.get("hedge_after_ms") or 0) / 1000.0)
+        self.citation = citation
+        self.tool_used = tool_used
+        self.tool_result = tool_result
+        self.schema = schema
+        self.logger = logger
+        self.session_id = session_id
+        self.tried: list = []
+        self.est_tokens = est_tokens
+        self.start_all = time.monotonic()
+        self.last_launch = self.start_all
+        self.ctx = _failover_context(policies, tool_used, session_id, self.start_all)
+
+    def next_provider(self):
+        """返回 (action, payload)：action 为 'launch'/'degrade'/'abort'/None（无可用提供方）
+
+        launch 时 payload 为 (name, cfg, wait_s)，wait_s 为限流所需的等待秒数。
+        """
+        while self.queue:
+            name = self.queue.pop(0)
+            cfg = self.providers_map.get(name)
+            if not cfg:
+                continue
+            action, degraded = self.check_sla()
+            if action:
+                return action, degraded
+            wait_s = _precheck_provider(name, cfg, self.policies, self.tried, self.session_id, self.ctx, self.est_tokens)
+            if wait_s is None:
+                continue
+            self.tried.append(name)
+            self.last_launch = time.monotonic()
+            if self.session_id:
+                event_log(self.session_id, "provider_attempt", {"provider": name, "model": cfg.get("model")})
+            return "launch", (name, cfg, wait_s)
+        return None, None
+
+    def check_sla(self):
+        return _check_sla_total(self.start_all, self.policies, self.citation, self.tool_used, self.tool_result, self.schema, self.tried, self.logger, self.session_id, self.ctx.deadline)
+
+    def hedge_timeout(self):
+        """距离下一次唤醒的秒数：对冲发射时间与端到端截止时间取较早者；两者皆无时返回None（无限等待）"""
+        waits = []
+        if self.queue:
+            waits.append(max(0.0, self.last_launch + self.hedge_after_s - time.monotonic()))
+        remaining = self.ctx.remaining_ms()
+        if remaining is not None:
+            waits.append(remaining / 1000.0)
+        return min(waits) if waits else None
+
+    def on_hedge(self, outstanding: list[str]):
+        if self.session_id:
+            event_log(self.session_id, "provider_hedge", {"hedge_after_ms": self.policies.get("hedge_after_ms"), "outstanding": outstanding})
+        if self.logger:
+            self.logger.info(f"provider_hedge; outstanding={outstanding}")
+
+    def on_cancel(self, name: str):
+        self.tried.append(f"hedge_cancelled:{name}")
+        if self.session_id:
+            event_log(self.session_id, "provider_cancelled", {"provider": name, "reason": "hedge_lost"})
+
+
+def _failover_context(policies: dict, tool_used, session_id: str | None, start_all: float) -> RequestContext:
+    """为一次故障切换建立请求上下文：继承当前上下文，并由 max_latency_ms_total 推导截止时间"""
+    ctx = current_request_context().child(session_id=session_id, tool_used=tool_used)
+    max_total = (policies or {}).get("max_latency_ms_total")
+    if max_total is not None:
+        deadline = start_all + float(max_total) / 1000.0
+        # 调用方（如服务入口）已设置更早的截止时间时以其为准
+        ctx.deadline = deadline if ctx.deadline is None else min(ctx.deadline, deadline)
+    if "stream" in (policies or {}):
+        ctx.stream = bool(policies.get("stream"))
+    return ctx
+
+
+def _attempt_provider(ctx: RequestContext, name: str, cfg: dict, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, logger=None, session_id: str | None = None, wait_s: float = 0.0, attempt_ctx: RequestContext | None = None):
+    """在独立子上下文中执行一次提供方尝试（先完成限流等待）；返回 (result, attempt_ctx)
+
+    attempt_ctx 由对冲调用方预先创建，以便在选出胜者后置位其取消标志。
+    """
+    attempt_ctx = attempt_ctx or ctx.child()
+    if wait_s > 0:
+        time.sleep(wait_s)
+    if attempt_ctx.cancelled():
+        return None, attempt_ctx
+    ctx.note_provider_attempt(name)
+    with request_context(attempt_ctx), get_provider_stats().track(name):
+        result = ask_structured_answer(cfg.get("model"), cfg, user_prompt, citation, tool_used, tool_result, schema, logger=logger, session_id=session_id)
+    return result, attempt_ctx
+
+
+async def _async_attempt_provider(ctx: RequestContext, name: str, cfg: dict, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, logger=None, session_id: str | None = None, wait_s: float = 0.0, attempt_ctx: RequestContext | None = None):
+    attempt_ctx = attempt_ctx or ctx.child()
+    if wait_s > 0:
+        await asyncio.sleep(wait_s)
+    if attempt_ctx.cancelled():
+        return None, attempt_ctx
+    ctx.note_provider_attempt(name)
+    with request_context(attempt_ctx), get_provider_stats().track(name):
+        result = await async_ask_structured_answer(cfg.get("model"), cfg, user_prompt, citation, tool_used, tool_result, schema, logger=logger, session_id=session_id)
+    return result, attempt_ctx
+
+
+def _hedged_failover(providers_order: list[str], registry: dict, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, policies: dict, logger=None, session_id: str | None = None):
+    """同步对冲：已发出的请求超过 hedge_after_ms 未返回时并发尝试下一个提供方，取首个合法结果
+
+    线程中的请求无法被强制中断：落败请求的取消标志被置位，其后不再重试、记录事件或写缓存，结果被丢弃。
+    """
+    hedger = _HedgeLauncher(providers_order, registry, policies, citation, tool_used, tool_result, schema, logger, session_id, _estimate_request_tokens(user_prompt, tool_result, schema))
+    ctx = hedger.ctx
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(providers_order)))
+    running: dict = {}
+
+    def launch():
+        action, payload = hedger.next_provider()
+        if action == "launch":
+            name, cfg, wait_s = payload
+            attempt_ctx = ctx.child(cancel_event=threading.Event(), quota=_retry_quota(name, cfg, hedger.policies, hedger.est_tokens))
+            # 在拷贝的上下文中执行，线程内的上下文变更不会影响调用方
+            fut = executor.submit(contextvars.copy_context().run, _attempt_provider, ctx, name, cfg, user_prompt, citation, tool_used, tool_result, schema, logger, session_id, wait_s, attempt_ctx)
+            running[fut] = (name, cfg.get("model"), attempt_ctx)
+        return action, payload
+
+    def cancel_all():
+        for fut, (name, _m, attempt_ctx) in running.items():
+            attempt_ctx.cancel()
+            fut.cancel()
+            hedger.on_cancel(name)
+        running.clear()
+
+    try:
+        action, payload = launch()
+        while True:
+            if action in {"degrade", "abort"}:
+                cancel_all()
+                if action == "degrade":
+                    return payload, None, None, hedger.tried
+                break
+            if not running:
+                break
+            done, _ = concurrent.futures.wait(list(running), timeout=hedger.hedge_timeout(), return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done and hedger.ctx.expired():
+                # 截止时间已到：不再等待在途请求，按 on_sla_timeout 降级或中止
+                action, payload = hedger.check_sla()
+                continue
+            if not done:
+                hedger.on_hedge([n for n, _m, _c in running.values()])
+                action, payload = launch()
+                continue
+            action = None
+            for fut in done:
+                name, model_name, _c = running.pop(fut)
+                try:
+                    result, attempt_ctx = fut.result()
+                except Exception:
+                    result, attempt_ctx = None, ctx.child()
+                if _record_attempt(name, model_name, result, attempt_ctx, policies, hedger.tried, logger, session_id):
+                    cancel_all()
+                    return result, name, model_name, hedger.tried
+            if not running:
+                action, payload = launch()
+        if action is None:
+            action, payload = hedger.check_sla()
+            if action == "degrade":
+                return payload, None, None, hedger.tried
+    finally:
+        cancel_all()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return _all_providers_failed(hedger.tried, logger, session_id)
+
+
+async def _async_hedged_failover(providers_order: list[str], registry: dict, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, policies: dict, logger=None, session_id: str | None = None):
+    """异步对冲：超过 hedge_after_ms 未返回时并发尝试下一个提供方，取首个合法结果并取消落败请求"""
+    hedger = _HedgeLauncher(providers_order, registry, policies, citation, tool_used, tool_result, schema, logger, session_id, _estimate_request_tokens(user_prompt, tool_result, schema))
+    ctx = hedger.ctx
+    running: dict = {}
+
+    def launch():
+        action, payload = hedger.next_provider()
+        if action == "launch":
+            name, cfg, wait_s = payload
+            # 任务创建时拷贝当前上下文，各尝试的上下文彼此隔离
+            attempt_ctx = ctx.child(cancel_event=threading.Event(), quota=_retry_quota(name, cfg, hedger.policies, hedger.est_tokens))
+            task = asyncio.ensure_future(_async_attempt_provider(ctx, name, cfg, user_prompt, citation, tool_used, tool_result, schema, logger, session_id, wait_s, attempt_ctx))
+            running[task] = (name, cfg.get("model"), attempt_ctx)
+        return action, payload
+
+    def cancel_all():
+        for task, (name, _m, attempt_ctx) in running.items():
+            attempt_ctx.cancel()
+            task.cancel()
+            hedger.on_cancel(name)
+        running.clear()
+
+    try:
+        action, payload = launch()
+        while True:
+            if action in {"degrade", "abort"}:
+                cancel_all()
+                if action == "degrade":
+                    return payload, None, None, hedger.tried
+                break
+            if not running:
+                break
+            done, _ = await asyncio.wait(list(running), timeout=hedger.hedge_timeout(), return_when=asyncio.FIRST_COMPLETED)
+            if not done and hedger.ctx.expired():
+                # 截止时间已到：不再等待在途请求，按 on_sla_timeout 降级或中止
+                action, payload = hedger.check_sla()
+                continue
+            if not done:
+                hedger.on_hedge([n for n, _m, _c in running.values()])
+                action, payload = launch()
+                continue
+            action = None
+            for task in done:
+                name, model_name, _c = running.pop(task)
+                try:
+                    result, attempt_ctx = task.result()
+                except Exception:
+                    result, attempt_ctx = None, ctx.child()
+                if _record_attempt(name, model_name, result, attempt_ctx, policies, hedger.tried, logger, session_id):
+                    cancel_all()
+                    return result, name, model_name, hedger.tried
+            if not running:
+                action, payload = launch()
+        if action is None:
+            action, payload = hedger.check_sla()
+            if action == "degrade":
+                return payload, None, None, hedger.tried
+    finally:
+        cancel_all()
+    return _all_providers_failed(hedger.tried, logger, session_id)
+
+
 def structured_answer_with_failover(providers_order: list[str], registry: dict, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, logger=None, session_id: str | None = None):
+    # 配置了 hedge_after_ms 时走对冲路径
+    hedge_policies = _effective_policies(load_routing_config(), tool_used)
+    if hedge_policies.get("hedge_after_ms") is not None:
+        return _hedged_failover(providers_order, registry, user_prompt, citation, tool_used, tool_result, schema, hedge_policies, logger, session_id)
     providers_map = registry.get("providers", {})
     tried = []
     # 端到端延迟SLA起点
     start_all = time.monotonic()
+    ctx = _failover_context(hedge_policies, tool_used, session_id, start_all)
+    est_tokens = _estimate_request_tokens(user_prompt, tool_result, schema)
+    action = None
     for name in providers_order:
         cfg = providers_map.get(name)
         if not cfg:
             continue
-        # 策略过滤（示例使用全局policies）
-        routing = load_routing_config()
-        # 选择工具级策略优先
-        tool_policies = ((routing.get("task_routing", {}) or {}).get("policies", {}) or {}).get(tool_used) or {}
-        global_policies = routing.get("policies", {}) or {}
-        policies = {**global_policies, **tool_policies}
+        policies = _effective_policies(load_routing_config(), tool_used)
         # 检查端到端延迟SLA（总耗时）
-        max_total = (policies or {}).get("max_latency_ms_total")
-        on_timeout = (policies or {}).get("on_sla_timeout", "abort")
-        if max_total is not None:
-            elapsed_ms = int((time.monotonic() - start_all) * 1000)
-            # 使用>=以确保当阈值为0时立即触发（测试要求）
-            if elapsed_ms >= float(max_total):
-                tried.append("sla_timeout_total")
-                if on_timeout == "degrade":
-                    degraded = _make_degraded_output(citation, tool_used, tool_result, schema)
-                    if session_id:
-                        event_log(session_id, "sla_degrade_total", {"elapsed_ms": elapsed_ms, "max_latency_ms_total": max_total})
-                    if logger:
-                        logger.warning(f"sla_degrade_total; elapsed_ms={elapsed_ms}; max_latency_ms_total={max_total}")
-                    tried.append("sla_degrade")
-                    return degraded, None, None, tried
-                else:
-                    if session_id:
-                        event_log(session_id, "sla_timeout_total", {"elapsed_ms": elapsed_ms, "max_latency_ms_total": max_total})
-                    if logger:
-                        logger.warning(f"sla_timeout_total; elapsed_ms={elapsed_ms}; max_latency_ms_total={max_total}")
-                    break
-        # 断路器跳过判定
-        skip, tag = _cb_should_skip(name, policies, session_id)
-        if skip:
-            tried.append(f"{tag}:{name}")
-            continue
-        if not policy_allows_provider(cfg, policies, est_tokens=1000):
-            tried.append(f"skip_policy:{name}")
-            if session_id:
-                event_log(session_id, "provider_skip_policy", {"provider": name, "policies": policies})
+        action, degraded = _check_sla_total(start_all, policies, citation, tool_used, tool_result, schema, tried, logger, session_id, ctx.deadline)
+        if action == "degrade":
+            return degraded, None, None, tried
+        if action == "abort":
+            break
+        wait_s = _precheck_provider(name, cfg, policies, tried, session_id, ctx, est_tokens)
+        if wait_s is None:
             continue
         model_name = cfg.get("model")
         tried.append(name)
         if session_id:
             event_log(session_id, "provider_attempt", {"provider": name, "model": model_name})
-        result = ask_structured_answer(model_name, cfg, user_prompt, citation, tool_used, tool_result, schema, logger=logger, session_id=session_id)
-        # 读取最近一次调用耗时
-        duration_ms = LAST_CALL_DURATION_MS
-        # 若存在延迟策略阈值，且本次调用耗时超阈值，则按策略拒绝
-        max_latency = (policies or {}).get("max_latency_ms")
-        if max_latency is not None and isinstance(duration_ms, (int, float)) and duration_ms > float(max_latency):
-            if logger:
-                logger.warning(f"provider_latency_exceeded={name}; duration_ms={duration_ms}; max_latency_ms={max_latency}")
-            tried.append(f"latency_exceeded:{name}")
-            if session_id:
-                event_log(session_id, "provider_failed", {"provider": name, "model": model_name, "reason_code": "policy_latency", "duration_ms": duration_ms, "max_latency_ms": max_latency})
-            # 断路器记录失败
-            globals()["LAST_ERROR_TYPE"] = "latency_exceeded"
-            _cb_record_failure(name, policies, globals().get("LAST_ERROR_TYPE"), session_id)
-            # 按策略拒绝，继续尝试下一个提供方
+        # 本次尝试的耗时与错误类型记录在独立的子上下文中
+        result, attempt_ctx = _attempt_provider(ctx, name, cfg, user_prompt, citation, tool_used, tool_result, schema, logger, session_id, wait_s, ctx.child(quota=_retry_quota(name, cfg, policies, est_tokens)))
+        if _record_attempt(name, model_name, result, attempt_ctx, policies, tried, logger, session_id):
+            return result, name, model_name, tried
+    if action is None:
+        # 最后一个提供方因截止时间中断时，同样按 on_sla_timeout 处理
+        action, degraded = _check_sla_total(start_all, hedge_policies, citation, tool_used, tool_result, schema, tried, logger, session_id, ctx.deadline)
+        if action == "degrade":
+            return degraded, None, None, tried
+    return _all_providers_failed(tried, logger, session_id)
+
+
+async def async_structured_answer_with_failover(providers_order: list[str], registry: dict, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, logger=None, session_id: str | None = None):
+    """structured_answer_with_failover 的异步版本：LLM调用与退避均不阻塞事件循环"""
+    hedge_policies = _effective_policies(load_routing_config(), tool_used)
+    if hedge_policies.get("hedge_after_ms") is not None:
+        return await _async_hedged_failover(providers_order, registry, user_prompt, citation, tool_used, tool_result, schema, hedge_policies, logger, session_id)
+    providers_map = registry.get("providers", {})
+    tried = []
+    start_all = time.monotonic()
+    ctx = _failover_context(hedge_policies, tool_used, session_id, start_all)
+    est_tokens = _estimate_request_tokens(user_prompt, tool_result, schema)
+    action = None
+    for name in providers_order:
+        cfg = providers_map.get(name)
+        if not cfg:
             continue
-        if result:
-            if logger:
-                logger.info(f"structured_answer_success_provider={name}; tried={tried}; duration_ms={duration_ms}")
-            if session_id:
-                event_log(session_id, "provider_success", {"provider": name, "model": model_name, "duration_ms": duration_ms})
-            _cb_record_success(name, session_id)
+        policies = _effective_policies(load_routing_config(), tool_used)
+        action, degraded = _check_sla_total(start_all, policies, citation, tool_used, tool_result, schema, tried, logger, session_id, ctx.deadline)
+        if action == "degrade":
+            return degraded, None, None, tried
+        if action == "abort":
+            break
+        wait_s = _precheck_provider(name, cfg, policies, tried, session_id, ctx, est_tokens)
+        if wait_s is None:
+            continue
+        model_name = cfg.get("model")
+        tried.append(name)
+        if session_id:
+            event_log(session_id, "provider_attempt", {"provider": name, "model": model_name})
+        result, attempt_ctx = await _async_attempt_provider(ctx, name, cfg, user_prompt, citation, tool_used, tool_result, schema, logger, session_id, wait_s, ctx.child(quota=_retry_quota(name, cfg, policies, est_tokens)))
+        if _record_attempt(name, model_name, result, attempt_ctx, policies, tried, logger, session_id):
             return result, name, model_name, tried
-        else:
-            if logger:
-                logger.warning(f"provider_failed={name}")
-            if session_id:
-                event_log(session_id, "provider_failed", {"provider": name, "model": model_name})
-            _cb_record_failure(name, policies, globals().get("LAST_ERROR_TYPE"), session_id)
-    if logger:
-        logger.error(f"all_providers_failed; tried={tried}")
-    if session_id:
-        event_log(session_id, "all_providers_failed", {"tried": tried})
-    return None, None, None, tried
+    if action is None:
+        action, degraded = _check_sla_total(start_all, hedge_policies, citation, tool_used, tool_result, schema, tried, logger, session_id, ctx.deadline)
+        if action == "degrade":
+            return degraded, None, None, tried
+    return _all_providers_failed(tried, logger, session_id)
 
 
 def init_openai_compatible_client(model_cfg):
-    if not OpenAI:
-        return None
-    api_key_env = model_cfg.get("api_key_env", "LLM_API_KEY")
-    api_key = os.getenv(api_key_env) or os.getenv("LLM_API_KEY")
-    base_url = os.getenv("LLM_BASE_URL") or model_cfg.get("base_url")
-    if not api_key or not base_url:
+    """按提供方配置返回共享的 OpenAI 兼容客户端（缺少SDK/密钥/base_url 时为 None）"""
+    try:
+        return get_provider_clients().openai(model_cfg)
+    except Exception:
         return None
+
+
+def init_async_openai_compatible_client(model_cfg):
+    """当前事件循环上共享的异步 OpenAI 兼容客户端（缺少SDK/密钥/base_url 时为 None）"""
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        return client
+        return get_provider_clients().async_openai(model_cfg)
     except Exception:
         return None
 
 
+def rag_search(query: str, k: int = 5) -> list[dict]:
+    """BM25 检索知识库（data/docs 与 file_write 写入的文件，见 scripts/rag_index.py）；返回 [{"id", "source", "text", "score"}]"""
+    try:
+        return get_rag_store(ROOT).search(query, k)
+    except Exception:
+        return []
+
+
 def simple_rag(query: str):
-    doc_path = ROOT / "data" / "docs" / "sample_knowledge.txt"
-    if not doc_path.exists():
-        return None
-    text = doc_path.read_text(encoding="utf-8")
-    # 简易检索：关键词匹配返回第一条相关行
-    for line in text.splitlines():
-        if not line.strip():
-            continue
-        if any(k in line for k in ["智能体", "LangGraph", "检索", "编排", "守护"]):
-            return line.strip()
-    return text.splitlines()[0].strip()
+    """返回与查询最相关的知识块文本；无命中时回退为知识库首个内容块（与旧版行为一致），知识库为空时返回 None"""
+    hits = rag_search(query, 1)
+    if hits:
+        return hits[0]["text"]
+    try:
+        first = get_rag_store(ROOT).first_chunk()
+    except Exception:
+        first = None
+    return first["text"] if first else None
 
 
 def tool_calc(op: str, a: float, b: float):
@@ -412,18 +996,20 @@ def tool_web_fetch(url: str, method: str = "GET", headers: dict | None = None, b
     delay = 0.3
     for i in range(attempts):
         try:
-            with httpx.Client(timeout=10) as client:
-                if (method or "GET").upper() == "POST":
-                    resp = client.post(
-                        url,
-                        headers=headers,
-                        json=body if isinstance(body, (dict, list)) else None,
-                        data=body if isinstance(body, str) else None,
-                    )
-                else:
-                    resp = client.get(url, headers=headers)
+            client = _http_pool().client(url)
+            if (method or "GET").upper() == "POST":
+                resp = client.post(
+                    url,
+                    headers=headers,
+                    timeout=_call_timeout(10),
+                    json=body if isinstance(body, (dict, list)) else None,
+                    data=body if isinstance(body, str) else None,
+                )
+            else:
+                resp = client.get(url, headers=headers, timeout=_call_timeout(10))
             return {"status": resp.status_code, "headers": dict(resp.headers), "text": resp.text[:10000]}
         except Exception as e:
+            _http_pool().failed(url, e)
             if i == attempts - 1:
                 return {"error": f"{e}"}
             time.sleep(delay)
@@ -445,8 +1031,7 @@ def tool_file_read(path: str):
 def tool_file_write(path: str, text: str, overwrite: bool = False):
     try:
         from pathlib import Path
-        gr = load_yaml(ROOT / "config" / "policies" / "guardrails.yaml") or {}
-        fw_guard = (gr.get("tools") or {}).get("file_write") or {}
+        fw_guard = tool_guardrails("file_write")
         base = (ROOT / (fw_guard.get("allowed_base_dir") or "data")).resolve()
         max_bytes = int(fw_guard.get("max_bytes", 50000))
         p = Path(path).resolve()
@@ -459,6 +1044,11 @@ def tool_file_write(path: str, text: str, overwrite: bool = False):
         mode = "w" if overwrite else ("a" if p.exists() else "w")
         with open(p, mode, encoding="utf-8") as f:
             f.write(data)
+        try:
+            # 写入的文件纳入知识库索引（见 scripts/rag_indexer.py）
+            track_written_file(ROOT, p)
+        except Exception:
+            pass
         return {"path": str(p), "written_bytes": len(data.encode("utf-8")), "overwrite": overwrite}
     except Exception as e:
         return {"error": f"{e}"}
@@ -466,8 +1056,7 @@ def tool_file_write(path: str, text: str, overwrite: bool = False):
 def tool_list_dir(path: str, max_entries: int = 100):
     try:
         from pathlib import Path
-        gr = load_yaml(ROOT / "config" / "policies" / "guardrails.yaml") or {}
-        ld_guard = (gr.get("tools") or {}).get("list_dir") or {}
+        ld_guard = tool_guardrails("list_dir")
         base = (ROOT / (ld_guard.get("allowed_base_dir") or "data")).resolve()
         p = Path(path).resolve() if path else base
         if base not in p.parents and p != base:
@@ -484,8 +1073,7 @@ def tool_list_dir(path: str, max_entries: int = 100):
         return {"error": f"{e}"}
 
 def tool_open_app(app: str, args: list[str] | None = None):
-    gr = load_yaml(ROOT / "config" / "policies" / "guardrails.yaml") or {}
-    oa_guard = (gr.get("tools") or {}).get("open_app") or {}
+    oa_guard = tool_guardrails("open_app")
     allowlist = set(oa_guard.get("allowlist") or [])
     app_low = (app or "").lower().strip()
     if not app_low:
@@ -635,8 +1223,7 @@ def tool_web_scrape(url: str, max_bytes: int = 20000):
     delay = 0.3
     for i in range(attempts):
         try:
-            with httpx.Client(timeout=10) as client:
-                resp = client.get(url)
+            resp = _http_pool().client(url).get(url, timeout=_call_timeout(10))
             text = resp.text or ""
             title = None
             try:
@@ -648,6 +1235,7 @@ def tool_web_scrape(url: str, max_bytes: int = 20000):
             content = text[: max(0, min(int(max_bytes or 20000), 20000))]
             return {"url": url, "status": resp.status_code, "title": title, "content": content}
         except Exception as e:
+            _http_pool().failed(url, e)
             if i == attempts - 1:
                 return {"error": f"{e}"}
             time.sleep(delay)
@@ -661,8 +1249,7 @@ def tool_web_search(query: str, limit: int = 5, source: str = "duckduckgo"):
     if not query:
         return {"error": "query required"}
     # 从 guardrails 读取限速与最大返回条数
-    gr = load_yaml(ROOT / "config" / "policies" / "guardrails.yaml") or {}
-    ws_guard = (gr.get("tools") or {}).get("web_search") or {}
+    ws_guard = tool_guardrails("web_search")
     max_limit = int(ws_guard.get("max_limit", 20))
     rate_per_min = int(ws_guard.get("rate_limit_per_minute", 0))
     # 简易每分钟限速
@@ -682,8 +1269,7 @@ def tool_web_search(query: str, limit: int = 5, source: str = "duckduckgo"):
     delay = 0.3
     for i in range(attempts):
         try:
-            with httpx.Client(timeout=10) as client:
-                resp = client.get(url, params=params)
+            resp = _http_pool().client(url).get(url, params=params, timeout=_call_timeout(10))
             data = resp.json()
             results = []
             # Abstract
@@ -706,11 +1292,17 @@ def tool_web_search(query: str, limit: int = 5, source: str = "duckduckgo"):
                             results.append({"title": sub.get("Text") or sub.get("FirstURL"), "url": sub.get("FirstURL"), "snippet": sub.get("Text"), "type": "related"})
             return {"source": source, "results": results[: max(1, min(int(limit or 5), max_limit))]}
         except Exception as e:
+            _http_pool().failed(url, e)
             if i == attempts - 1:
                 return {"error": f"{e}"}
             time.sleep(delay)
             delay *= 2
 
+def _http_pool():
+    """web 工具共享的连接池，参数取自 guardrails.yaml 的 http_pool"""
+    return get_http_pool(current_config().guardrails.get("http_pool"))
+
+
 async def async_tool_web_fetch(url: str, method: str = "GET", headers: dict | None = None, body=None):
     try:
         import httpx
@@ -720,18 +1312,20 @@ async def async_tool_web_fetch(url: str, method: str = "GET", headers: dict | No
     delay = 0.3
     for i in range(attempts):
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                if (method or "GET").upper() == "POST":
-                    resp = await client.post(
-                        url,
-                        headers=headers,
-                        json=body if isinstance(body, (dict, list)) else None,
-                        data=body if isinstance(body, str) else None,
-                    )
-                else:
-                    resp = await client.get(url, headers=headers)
+            client = _http_pool().async_client(url)
+            if (method or "GET").upper() == "POST":
+                resp = await client.post(
+                    url,
+                    headers=headers,
+                    timeout=_call_timeout(10),
+                    json=body if isinstance(body, (dict, list)) else None,
+                    data=body if isinstance(body, str) else None,
+                )
+            else:
+                resp = await client.get(url, headers=headers, timeout=_call_timeout(10))
             return {"status": resp.status_code, "headers": dict(resp.headers), "text": resp.text[:10000]}
         except Exception as e:
+            _http_pool().failed(url, e)
             if i == attempts - 1:
                 return {"error": f"{e}"}
             await asyncio.sleep(delay)
@@ -746,8 +1340,7 @@ async def async_tool_web_scrape(url: str, max_bytes: int = 20000):
     delay = 0.3
     for i in range(attempts):
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                resp = await client.get(url)
+            resp = await _http_pool().async_client(url).get(url, timeout=_call_timeout(10))
             text = resp.text or ""
             title = None
             try:
@@ -759,6 +1352,7 @@ async def async_tool_web_scrape(url: str, max_bytes: int = 20000):
             content = text[: max(0, min(int(max_bytes or 20000), 20000))]
             return {"url": url, "status": resp.status_code, "title": title, "content": content}
         except Exception as e:
+            _http_pool().failed(url, e)
             if i == attempts - 1:
                 return {"error": f"{e}"}
             await asyncio.sleep(delay)
@@ -779,8 +1373,7 @@ async def async_tool_web_search(query: str, limit: int = 5, source: str = "duckd
     delay = 0.3
     for i in range(attempts):
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                resp = await client.get(url, params=params)
+            resp = await _http_pool().async_client(url).get(url, params=params, timeout=_call_timeout(10))
             data = resp.json()
             results = []
             if data.get("AbstractText"):
@@ -801,6 +1394,7 @@ async def async_tool_web_search(query: str, limit: int = 5, source: str = "duckd
                             results.append({"title": sub.get("Text") or sub.get("FirstURL"), "url": sub.get("FirstURL"), "snippet": sub.get("Text"), "type": "related"})
             return {"source": source, "results": results[: max(1, min(int(limit or 5), 20))]}
         except Exception as e:
+            _http_pool().failed(url, e)
             if i == attempts - 1:
                 return {"error": f"{e}"}
             await asyncio.sleep(delay)
@@ -810,12 +1404,12 @@ def tool_search_aggregate(query: str, sources: list[str] | None = None, per_sour
     sources = sources or ["duckduckgo", "local"]
     aggregated = []
     counts = {}
-    # 本地源：使用 simple_rag 适配到与 web_search 相同结构
+    # 本地源：BM25 检索结果适配到与 web_search 相同结构
     def local_results(q: str):
-        hit = simple_rag(q)
-        if not hit:
-            return []
-        return [{"title": "local", "url": None, "snippet": hit, "type": "local"}]
+        return [
+            {"title": h["source"] or "local", "url": None, "snippet": h["text"], "type": "local", "score": h["score"]}
+            for h in rag_search(q, per_source_limit)
+        ]
     for src in sources:
         if src == "duckduckgo":
             r = tool_web_search(query, limit=per_source_limit, source="duckduckgo")
@@ -835,9 +1429,8 @@ def tool_search_aggregate(query: str, sources: list[str] | None = None, per_sour
     return {"sources": sources, "counts": counts, "results": aggregated}
 
 def tool_run_command(command: str, args: list[str] | None = None, timeout_seconds: int = 5):
-    # 安全策略：从 guardrails.yaml 读取白名单与最大超时
-    gr = load_yaml(ROOT / "config" / "policies" / "guardrails.yaml") or {}
-    rc_guard = (gr.get("tools") or {}).get("run_command") or {}
+    # 安全策略：从 guardrails 读取白名单与最大超时
+    rc_guard = tool_guardrails("run_command")
     allowlist = set((rc_guard.get("allowlist") or ["echo", "dir"]))
     denylist = set(rc_guard.get("denylist") or [])
     max_timeout = int(rc_guard.get("max_timeout_seconds", 10))
@@ -867,7 +1460,7 @@ def tool_run_command(command: str, args: list[str] | None = None, timeout_second
     except Exception as e:
         return {"error": f"{e}"}
 
-def run_with_openai_compatible(client, model_name: str, system_prompt: str, user_prompt: str):
+def run_with_openai_compatible(client, model_name: str, system_prompt: str, user_prompt: str, timeout: float | None = None):
     try:
         resp = client.chat.completions.create(
             model=model_name,
@@ -875,13 +1468,14 @@ def run_with_openai_compatible(client, model_name: str, system_prompt: str, user
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
+            **({"timeout": timeout} if timeout is not None else {}),
         )
         return {"ok": True, "text": resp.choices[0].message.content}
     except Exception as e:
         return {"ok": False, "error": f"兼容端点调用失败: {e}"}
 
 
-def run_with_dashscope(model_name: str, system_prompt: str, user_prompt: str):
+def run_with_dashscope(model_name: str, system_prompt: str, user_prompt: str, timeout: float | None = None):
     if dashscope is None or not hasattr(dashscope, "Generation"):
         return {"ok": False, "error": "DashScope调用失败: SDK未安装或导入失败"}
     api_key = os.getenv("DASHSCOPE_API_KEY")
@@ -892,6 +1486,7 @@ def run_with_dashscope(model_name: str, system_prompt: str, user_prompt: str):
             model=model_name,
             prompt=f"{system_prompt}\n{user_prompt}",
             api_key=api_key,
+            **({"request_timeout": timeout} if timeout is not None else {}),
         )
         # 处理SDK返回状态（兼容不同版本）
         status = getattr(result, "status_code", HTTPStatus.OK)
@@ -915,20 +1510,427 @@ def run_with_dashscope(model_name: str, system_prompt: str, user_prompt: str):
         return {"ok": False, "error": f"DashScope调用失败: {e}"}
 
 
+# LLM响应缓存：routing.yaml 的 llm_cache 配置存储层，policies.cache_ttl_seconds（可按工具覆盖）配置TTL
+_LLM_CACHES: dict = {}
+_LLM_CACHES_LOCK = threading.Lock()
+
+
+def _llm_cache(routing: dict):
+    """按 llm_cache 配置返回共享的分层缓存；未启用时返回 None"""
+    conf = (routing or {}).get("llm_cache") or {}
+    if not conf.get("enabled"):
+        return None
+    disk = conf.get("disk") or {}
+    path = None
+    if disk.get("enabled"):
+        path = Path(disk.get("path") or "logs/llm_cache.sqlite")
+        if not path.is_absolute():
+            path = ROOT / path
+    key = (int(conf.get("max_entries", 512)), str(path) if path else None)
+    with _LLM_CACHES_LOCK:
+        cache = _LLM_CACHES.get(key)
+        if cache is None:
+            cache = TieredCache(TTLCache(key[0]), SQLiteCache(path) if path else None)
+            _LLM_CACHES[key] = cache
+    return cache
+
+
+def _llm_cache_lookup(model_name: str, system_prompt: str, user_prompt: str):
+    """查询响应缓存；返回 (cache, key, ttl, text)，未启用或TTL为0时 cache 为 None"""
+    routing = load_routing_config()
+    cache = _llm_cache(routing)
+    if cache is None:
+        return None, None, 0.0, None
+    ctx = current_request_context()
+    ttl = float(_effective_policies(routing, ctx.tool_used).get("cache_ttl_seconds", 0) or 0)
+    if ttl <= 0:
+        return None, None, 0.0, None
+    key = cache_key("llm_text", model_name, system_prompt, user_prompt)
+    text, tier = cache.get(key)
+    if ctx.session_id:
+        event = "llm_cache_hit" if text is not None else "llm_cache_miss"
+        event_log(ctx.session_id, event, {"model": model_name, "tier": tier, "key": key[:16], "ttl_seconds": ttl})
+    return cache, key, ttl, text
+
+
+def _llm_cache_store(cache, key: str, text: str, ttl: float):
+    """写入响应缓存；已取消的尝试（对冲落败）的响应不写入"""
+    if cache is not None and text and not current_request_context().cancelled():
+        cache.set(key, text, ttl)
+
+
+def _llm_cache_discard(model_name: str, system_prompt: str, user_prompt: str):
+    """丢弃未通过校验的缓存响应，避免在TTL内反复返回同一个无效结果"""
+    cache = _llm_cache(load_routing_config())
+    if cache is not None:
+        cache.delete(cache_key("llm_text", model_name, system_prompt, user_prompt))
+
+
+def _budget_exhausted(timeout: float | None, logger=None) -> bool:
+    if timeout is None or timeout > 0:
+        return False
+    if logger:
+        logger.warning("LLM调用跳过: 请求剩余预算已耗尽")
+    return True
+
+
+async def _await_within(coro, timeout: float | None):
+    """在剩余预算内等待传输协程；超时返回失败结果（SDK自身的超时参数之外的兜底）"""
+    if timeout is None:
+        return await coro
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": f"调用超出请求剩余预算({timeout:.3f}s)"}
+
+
 def llm_text(system_prompt: str, user_prompt: str, model_name: str, cfg, logger=None):
-    """统一文本生成：优先 DashScope，其次 OpenAI 兼容端点，失败返回 None"""
-    out = run_with_dashscope(model_name, system_prompt, user_prompt)
+    """统一文本生成：按提供方的 transport 调用 DashScope 或 OpenAI 兼容端点，失败返回 None
+
+    单次调用的超时为当前请求上下文的剩余预算，预算耗尽时不再发起调用；
+    启用 llm_cache 时相同 (model, system, user) 在TTL内直接返回缓存的文本。
+    """
+    cache, key, ttl, cached = _llm_cache_lookup(model_name, system_prompt, user_prompt)
+    if cached is not None:
+        return cached
+    text = _llm_text_uncached(system_prompt, user_prompt, model_name, cfg, logger)
+    _llm_cache_store(cache, key, text, ttl)
+    return text
+
+
+def _llm_text_uncached(system_prompt: str, user_prompt: str, model_name: str, cfg, logger=None):
+    # 调用方式按提供方一次确定：DashScope SDK 或 OpenAI 兼容端点，不再逐个试探
+    transport = get_provider_clients().resolve(cfg)
+    if transport.error:
+        if logger:
+            logger.warning(transport.error)
+        return None
+    timeout = _call_timeout()
+    if _budget_exhausted(timeout, logger):
+        return None
+    if transport.kind == DASHSCOPE:
+        out = run_with_dashscope(model_name, system_prompt, user_prompt, timeout=timeout)
+    else:
+        client = init_openai_compatible_client(cfg)
+        if not client:
+            return None
+        out = run_with_openai_compatible(client, model_name, system_prompt, user_prompt, timeout=timeout)
     if out.get("ok"):
         return out.get("text")
     if logger:
         logger.warning(out.get("error"))
-    client = init_openai_compatible_client(cfg)
-    if client:
-        res = run_with_openai_compatible(client, model_name, system_prompt, user_prompt)
-        if res.get("ok"):
-            return res.get("text")
+    return None
+
+
+def _dashscope_text(result):
+    """解析DashScope响应：返回 (text, error)"""
+    status = getattr(result, "status_code", HTTPStatus.OK)
+    if status != HTTPStatus.OK:
+        return None, f"DashScope调用失败: code={getattr(result, 'code', None)}, message={getattr(result, 'message', None)}"
+    try:
+        out = result["output"] if isinstance(result, dict) else result.__getitem__("output")
+    except Exception:
+        out = getattr(result, "output", None)
+    return (out.get("text") if isinstance(out, dict) else None), None
+
+
+def _stream_result(parts: list, first_token_ms, aborted: bool):
+    return {"ok": True, "text": "".join(parts), "aborted": aborted, "first_token_ms": first_token_ms}
+
+
+def run_with_openai_compatible_stream(client, model_name: str, system_prompt: str, user_prompt: str, on_delta, timeout: float | None = None):
+    """流式调用兼容端点；on_delta 返回 False 时提前关闭流"""
+    start_t = time.monotonic()
+    first_token_ms = None
+    parts: list[str] = []
+    try:
+        stream = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            stream=True,
+            **({"timeout": timeout} if timeout is not None else {}),
+        )
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = int((time.monotonic() - start_t) * 1000)
+                parts.append(delta)
+                if on_delta(delta) is False:
+                    return _stream_result(parts, first_token_ms, True)
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        return _stream_result(parts, first_token_ms, False)
+    except Exception as e:
+        return {"ok": False, "error": f"兼容端点流式调用失败: {e}", "first_token_ms": first_token_ms, "emitted": bool(parts)}
+
+
+def run_with_dashscope_stream(model_name: str, system_prompt: str, user_prompt: str, on_delta, timeout: float | None = None):
+    if dashscope is None or not hasattr(dashscope, "Generation"):
+        return {"ok": False, "error": "DashScope调用失败: SDK未安装或导入失败"}
+    api_key = os.getenv("DASHSCOPE_API_KEY")
+    if not api_key:
+        return {"ok": False, "error": "DashScope调用失败: 环境变量DASHSCOPE_API_KEY未设置"}
+    start_t = time.monotonic()
+    first_token_ms = None
+    parts: list[str] = []
+    try:
+        responses = dashscope.Generation.call(
+            model=model_name,
+            prompt=f"{system_prompt}\n{user_prompt}",
+            api_key=api_key,
+            stream=True,
+            incremental_output=True,
+            **({"request_timeout": timeout} if timeout is not None else {}),
+        )
+        for result in responses:
+            delta, error = _dashscope_text(result)
+            if error:
+                return {"ok": False, "error": error, "first_token_ms": first_token_ms, "emitted": bool(parts)}
+            if not delta:
+                continue
+            if first_token_ms is None:
+                first_token_ms = int((time.monotonic() - start_t) * 1000)
+            parts.append(delta)
+            if on_delta(delta) is False:
+                return _stream_result(parts, first_token_ms, True)
+        if not parts:
+            return {"ok": False, "error": "DashScope返回为空"}
+        return _stream_result(parts, first_token_ms, False)
+    except Exception as e:
+        return {"ok": False, "error": f"DashScope调用失败: {e}", "first_token_ms": first_token_ms, "emitted": bool(parts)}
+
+
+def llm_text_stream(system_prompt: str, user_prompt: str, model_name: str, cfg, on_delta, logger=None):
+    """流式文本生成：返回 {"text", "aborted", "first_token_ms"}，text 为 None 表示调用失败
+
+    已向 on_delta 输出过内容的传输失败时不再切换端点，避免增量校验状态错乱。
+    缓存命中时把完整文本一次性交给 on_delta。
+    """
+    cache, key, ttl, cached = _llm_cache_lookup(model_name, system_prompt, user_prompt)
+    if cached is not None:
+        return _replay_cached_stream(cached, on_delta)
+    res = _llm_text_stream_uncached(system_prompt, user_prompt, model_name, cfg, on_delta, logger)
+    if not res.get("aborted"):
+        _llm_cache_store(cache, key, res.get("text"), ttl)
+    return res
+
+
+def _replay_cached_stream(text: str, on_delta):
+    return {"text": text, "aborted": on_delta(text) is False, "first_token_ms": 0}
+
+
+def _llm_text_stream_uncached(system_prompt: str, user_prompt: str, model_name: str, cfg, on_delta, logger=None):
+    failed = {"text": None, "aborted": False, "first_token_ms": None}
+    transport = get_provider_clients().resolve(cfg)
+    if transport.error:
+        if logger:
+            logger.warning(transport.error)
+        return failed
+    timeout = _call_timeout()
+    if _budget_exhausted(timeout, logger):
+        return failed
+    if transport.kind == DASHSCOPE:
+        out = run_with_dashscope_stream(model_name, system_prompt, user_prompt, on_delta, timeout=timeout)
+    else:
+        client = init_openai_compatible_client(cfg)
+        if not client:
+            return failed
+        out = run_with_openai_compatible_stream(client, model_name, system_prompt, user_prompt, on_delta, timeout=timeout)
+    if out.get("ok"):
+        return out
+    if logger:
+        logger.warning(out.get("error"))
+    return {"text": None, "aborted": False, "first_token_ms": out.get("first_token_ms")}
+
+
+async def async_run_with_openai_compatible_stream(client, model_name: str, system_prompt: str, user_prompt: str, on_delta, timeout: float | None = None):
+    start_t = time.monotonic()
+    first_token_ms = None
+    parts: list[str] = []
+    try:
+        stream = await client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            stream=True,
+            **({"timeout": timeout} if timeout is not None else {}),
+        )
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = int((time.monotonic() - start_t) * 1000)
+                parts.append(delta)
+                if on_delta(delta) is False:
+                    return _stream_result(parts, first_token_ms, True)
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                await close()
+        return _stream_result(parts, first_token_ms, False)
+    except Exception as e:
+        return {"ok": False, "error": f"兼容端点流式调用失败: {e}", "first_token_ms": first_token_ms, "emitted": bool(parts)}
+
+
+async def async_run_with_dashscope_stream(model_name: str, system_prompt: str, user_prompt: str, on_delta, timeout: float | None = None):
+    if dashscope is None or not hasattr(dashscope, "AioGeneration"):
+        return await asyncio.to_thread(run_with_dashscope_stream, model_name, system_prompt, user_prompt, on_delta, timeout)
+    api_key = os.getenv("DASHSCOPE_API_KEY")
+    if not api_key:
+        return {"ok": False, "error": "DashScope调用失败: 环境变量DASHSCOPE_API_KEY未设置"}
+    start_t = time.monotonic()
+    first_token_ms = None
+    parts: list[str] = []
+    try:
+        responses = await dashscope.AioGeneration.call(
+            model=model_name,
+            prompt=f"{system_prompt}\n{user_prompt}",
+            api_key=api_key,
+            stream=True,
+            incremental_output=True,
+            **({"request_timeout": timeout} if timeout is not None else {}),
+        )
+        async for result in responses:
+            delta, error = _dashscope_text(result)
+            if error:
+                return {"ok": False, "error": error, "first_token_ms": first_token_ms, "emitted": bool(parts)}
+            if not delta:
+                continue
+            if first_token_ms is None:
+                first_token_ms = int((time.monotonic() - start_t) * 1000)
+            parts.append(delta)
+            if on_delta(delta) is False:
+                return _stream_result(parts, first_token_ms, True)
+        if not parts:
+            return {"ok": False, "error": "DashScope返回为空"}
+        return _stream_result(parts, first_token_ms, False)
+    except Exception as e:
+        return {"ok": False, "error": f"DashScope调用失败: {e}", "first_token_ms": first_token_ms, "emitted": bool(parts)}
+
+
+async def async_llm_text_stream(system_prompt: str, user_prompt: str, model_name: str, cfg, on_delta, logger=None):
+    """llm_text_stream 的异步版本"""
+    cache, key, ttl, cached = _llm_cache_lookup(model_name, system_prompt, user_prompt)
+    if cached is not None:
+        return _replay_cached_stream(cached, on_delta)
+    res = await _async_llm_text_stream_uncached(system_prompt, user_prompt, model_name, cfg, on_delta, logger)
+    if not res.get("aborted"):
+        _llm_cache_store(cache, key, res.get("text"), ttl)
+    return res
+
+
+async def _async_llm_text_stream_uncached(system_prompt: str, user_prompt: str, model_name: str, cfg, on_delta, logger=None):
+    failed = {"text": None, "aborted": False, "first_token_ms": None}
+    transport = get_provider_clients().resolve(cfg)
+    if transport.error:
+        if logger:
+            logger.warning(transport.error)
+        return failed
+    timeout = _call_timeout()
+    if _budget_exhausted(timeout, logger):
+        return failed
+    if transport.kind == DASHSCOPE:
+        out = await _await_within(async_run_with_dashscope_stream(model_name, system_prompt, user_prompt, on_delta, timeout=timeout), timeout)
+    else:
+        client = init_async_openai_compatible_client(cfg)
+        if not client:
+            return failed
+        out = await _await_within(async_run_with_openai_compatible_stream(client, model_name, system_prompt, user_prompt, on_delta, timeout=timeout), timeout)
+    if out.get("ok"):
+        return out
+    if logger:
+        logger.warning(out.get("error"))
+    return {"text": None, "aborted": False, "first_token_ms": out.get("first_token_ms")}
+
+
+async def async_run_with_openai_compatible(client, model_name: str, system_prompt: str, user_prompt: str, timeout: float | None = None):
+    try:
+        resp = await client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            **({"timeout": timeout} if timeout is not None else {}),
+        )
+        return {"ok": True, "text": resp.choices[0].message.content}
+    except Exception as e:
+        return {"ok": False, "error": f"兼容端点调用失败: {e}"}
+
+
+async def async_run_with_dashscope(model_name: str, system_prompt: str, user_prompt: str, timeout: float | None = None):
+    if dashscope is None or not hasattr(dashscope, "AioGeneration"):
+        # 旧版SDK无异步接口：放入线程池执行，避免阻塞事件循环
+        return await asyncio.to_thread(run_with_dashscope, model_name, system_prompt, user_prompt, timeout)
+    api_key = os.getenv("DASHSCOPE_API_KEY")
+    if not api_key:
+        return {"ok": False, "error": "DashScope调用失败: 环境变量DASHSCOPE_API_KEY未设置"}
+    try:
+        result = await dashscope.AioGeneration.call(
+            model=model_name,
+            prompt=f"{system_prompt}\n{user_prompt}",
+            api_key=api_key,
+            **({"request_timeout": timeout} if timeout is not None else {}),
+        )
+        status = getattr(result, "status_code", HTTPStatus.OK)
+        if status == HTTPStatus.OK:
+            try:
+                out = result["output"] if isinstance(result, dict) else result.__getitem__("output")
+            except Exception:
+                out = getattr(result, "output", None)
+            content = out.get("text") if isinstance(out, dict) else None
+            if content:
+                return {"ok": True, "text": content}
+            return {"ok": False, "error": "DashScope返回为空"}
+        code = getattr(result, "code", None)
+        message = getattr(result, "message", None)
+        return {"ok": False, "error": f"DashScope调用失败: code={code}, message={message}"}
+    except Exception as e:
+        return {"ok": False, "error": f"DashScope调用失败: {e}"}
+
+
+async def async_llm_text(system_prompt: str, user_prompt: str, model_name: str, cfg, logger=None):
+    """llm_text 的异步版本：按提供方的 transport 调用，失败返回 None"""
+    cache, key, ttl, cached = _llm_cache_lookup(model_name, system_prompt, user_prompt)
+    if cached is not None:
+        return cached
+    text = await _async_llm_text_uncached(system_prompt, user_prompt, model_name, cfg, logger)
+    _llm_cache_store(cache, key, text, ttl)
+    return text
+
+
+async def _async_llm_text_uncached(system_prompt: str, user_prompt: str, model_name: str, cfg, logger=None):
+    transport = get_provider_clients().resolve(cfg)
+    if transport.error:
         if logger:
-            logger.warning(res.get("error"))
+            logger.warning(transport.error)
+        return None
+    timeout = _call_timeout()
+    if _budget_exhausted(timeout, logger):
+        return None
+    if transport.kind == DASHSCOPE:
+        out = await _await_within(async_run_with_dashscope(model_name, system_prompt, user_prompt, timeout=timeout), timeout)
+    else:
+        client = init_async_openai_compatible_client(cfg)
+        if not client:
+            return None
+        out = await _await_within(async_run_with_openai_compatible(client, model_name, system_prompt, user_prompt, timeout=timeout), timeout)
+    if out.get("ok"):
+        return out.get("text")
+    if logger:
+        logger.warning(out.get("error"))
     return None
 
 
@@ -947,11 +1949,7 @@ def extract_json(text: str):
 
 
 def load_tool_schema(name: str):
-    path = ROOT / "config" / "tools" / "schema" / f"{name}.json"
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return None
+    return current_config().tool_schemas.get(name)
 
 
 def load_tool_schemas(names):
@@ -962,14 +1960,7 @@ def load_tool_schemas(names):
 
 
 def discover_tool_names():
-    tools_dir = ROOT / "config" / "tools" / "schema"
-    names = []
-    try:
-        for p in tools_dir.glob("*.json"):
-            names.append(p.stem)
-    except Exception:
-        pass
-    return sorted(set(names))
+    return sorted(current_config().tool_schemas.keys())
 
 
 # 统一的工具执行映射，减少if/elif分支冗余
@@ -1007,75 +1998,269 @@ ASYNC_TOOL_HANDLERS = {
 }
 
 
+# 工具结果缓存：TTL 取自 guardrails.yaml 的 tools.<name>.cache_ttl_seconds（未配置则不缓存）
+_TOOL_CACHE = TTLCache(max_entries=256)
+# 有副作用的工具始终不缓存
+_UNCACHEABLE_TOOLS = {"file_write", "run_command", "open_app"}
+# 读取本地文件的工具：缓存键包含文件 mtime/size，文件变化后自动失效
+_FILE_TOOLS = {"file_read", "list_dir", "docx_parse", "xlsx_parse", "pdf_parse"}
+# 参数缺省时回退为用户输入的工具参数
+_PROMPT_FALLBACK_ARGS = {"search": "query", "summarize": "text", "translate": "text", "web_search": "query", "search_aggregate": "query"}
+
+
+def _source_fingerprint(path) -> list | None:
+    try:
+        p = Path(path).resolve()
+        st = p.stat()
+    except Exception:
+        return None
+    return [str(p), st.st_mtime_ns, st.st_size]
+
+
+def _tool_cache_lookup(tool_name: str, args: dict, user_prompt: str):
+    """查询工具结果缓存；返回 (key, ttl, result)，不可缓存时 key 为 None"""
+    if tool_name in _UNCACHEABLE_TOOLS:
+        return None, 0.0, None
+    ttl = float(tool_guardrails(tool_name).get("cache_ttl_seconds") or 0)
+    if ttl <= 0:
+        return None, 0.0, None
+    canonical = {k: v for k, v in (args or {}).items() if v is not None}
+    fallback = _PROMPT_FALLBACK_ARGS.get(tool_name)
+    if fallback and not canonical.get(fallback):
+        canonical[fallback] = user_prompt
+    fingerprint = None
+    if tool_name in _FILE_TOOLS:
+        fingerprint = _source_fingerprint(canonical.get("path"))
+        if fingerprint is None:
+            return None, 0.0, None
+    key = cache_key("tool", tool_name, canonical, fingerprint)
+    cached = _TOOL_CACHE.get(key)
+    session_id = current_request_context().session_id
+    if session_id:
+        event_log(session_id, "tool_cache_hit" if cached is not None else "tool_cache_miss", {"tool": tool_name, "key": key[:16], "ttl_seconds": ttl})
+    return key, ttl, copy.deepcopy(cached) if cached is not None else None
+
+
+def _tool_result_ok(result) -> bool:
+    """成功结果：非空、无 error 字段，且 HTTP 状态码（如有）为 2xx"""
+    if result is None:
+        return False
+    if isinstance(result, dict):
+        if "error" in result:
+            return False
+        status = result.get("status_code", result.get("status"))
+        if isinstance(status, int) and not isinstance(status, bool) and not 200 <= status < 300:
+            return False
+    return True
+
+
+def _tool_cache_store(key: str | None, ttl: float, result):
+    # 仅缓存成功结果
+    if key is None or not _tool_result_ok(result):
+        return
+    _TOOL_CACHE.set(key, copy.deepcopy(result), ttl)
+
+
 def run_tool(tool_name: str, args: dict, user_prompt: str):
     fn = TOOL_HANDLERS.get(tool_name)
     if not fn:
         return f"未知工具: {tool_name}"
+    key, ttl, cached = _tool_cache_lookup(tool_name, args, user_prompt)
+    if cached is not None:
+        return cached
     try:
-        return fn(args or {}, user_prompt)
+        result = fn(args or {}, user_prompt)
     except Exception as e:
         return f"工具执行失败: {e}"
+    _tool_cache_store(key, ttl, result)
+    return result
 
 def async_run_tool(tool_name: str, args: dict, user_prompt: str):
+    """同步调用方使用的异步工具入口：协程提交到框架持有的常驻事件循环执行，复用循环与连接池"""
     fn = ASYNC_TOOL_HANDLERS.get(tool_name)
     if not fn:
         # 回退到同步执行
         return run_tool(tool_name, args, user_prompt)
+    key, ttl, cached = _tool_cache_lookup(tool_name, args, user_prompt)
+    if cached is not None:
+        return cached
     try:
         coro = fn(args or {}, user_prompt)
-        return asyncio.run(coro)
+        result = get_runtime().run(coro)
     except Exception as e:
         return f"工具异步执行失败: {e}"
+    _tool_cache_store(key, ttl, result)
+    return result
 
 
-def plan_tool_use(model_name: str, cfg, user_prompt: str, tool_schemas: dict):
-    available = ", ".join(sorted(tool_schemas.keys())) or "(none)"
-    planner_system = (
-        "你是工具规划器。只输出JSON，不要额外文本。\n"
-        "JSON结构: {\"use_tool\": bool, \"tool\": string, \"args\": object, \"reason\": string}.\n"
-        f"可用工具: {available}；若使用，参数必须符合对应Schema。"
-    )
-    planner_user = (
-        f"任务: {user_prompt}\n"
-        f"可用工具Schemas: {json.dumps(tool_schemas, ensure_ascii=False)}"
-    )
+async def async_execute_tool(tool_name: str, args: dict, user_prompt: str):
+    """在事件循环内执行工具：优先异步实现，否则放入线程池执行同步实现"""
+    fn = ASYNC_TOOL_HANDLERS.get(tool_name)
+    if not fn:
+        return await asyncio.to_thread(run_tool, tool_name, args, user_prompt)
+    key, ttl, cached = _tool_cache_lookup(tool_name, args, user_prompt)
+    if cached is not None:
+        return cached
+    try:
+        result = await fn(args or {}, user_prompt)
+    except Exception as e:
+        return f"工具异步执行失败: {e}"
+    _tool_cache_store(key, ttl, result)
+    return result
+
+
+def _log_prompt_prefix(session_id: str | None, stage: str, system: str, model_name: str):
+    """记录稳定前缀的哈希，便于按哈希统计提供方前缀缓存命中率与首token时延"""
+    if session_id:
+        event_log(session_id, "prompt_prefix", {"stage": stage, "model": model_name, "hash": prefix_hash(system), "chars": len(system)})
+
+
+def _planner_prompts(user_prompt: str, tool_schemas: dict, candidates: list[str] | None = None, shortlist_only: bool = False):
+    """shortlist_only=True 时 tool_schemas 为预选目录并放在 user；否则完整目录放在 system 稳定前缀，候选工具名放在 user"""
+    compact = {n: compact_schema(s) for n, s in tool_schemas.items()}
+    if shortlist_only:
+        return planner_shortlist_prompts(user_prompt, compact)
+    return planner_prompts(user_prompt, compact, candidates)
+
+
+def _planner_catalogue(user_prompt: str, tool_schemas: dict):
+    """按 policies.planner_top_k 预选与提示最相关的工具；返回 (catalogue, shortlisted, shortlist_only)
+
+    未配置、工具数不超过k或没有任何工具命中关键词时使用完整目录。
+    policies.planner_catalogue 决定预选结果的用法：prefix（默认）在 system 中保留完整目录以便提供方前缀缓存，
+    只把候选工具名作为提示放在 user；shortlist 只发送候选工具的Schema（提示更短，目录部分不参与前缀缓存）。
+    """
+    try:
+        policies = _effective_policies(load_routing_config(), None)
+        k = int(policies.get("planner_top_k", 0) or 0)
+        shortlist_only = policies.get("planner_catalogue", "prefix") == "shortlist"
+    except Exception:
+        k, shortlist_only = 0, False
+    if k <= 0 or len(tool_schemas) <= k:
+        return tool_schemas, False, False
+    names = get_tool_index(tool_schemas).top_k(user_prompt, k)
+    if not names:
+        return tool_schemas, False, False
+    session_id = current_request_context().session_id
+    if session_id:
+        event_log(session_id, "planner_candidates", {"tools": names, "total": len(tool_schemas), "shortlist_only": shortlist_only})
+    return {n: tool_schemas[n] for n in names}, True, shortlist_only
+
+
+def _needs_full_catalogue(plan, catalogue: dict, tool_schemas: dict) -> bool:
+    """规划器选择了预选列表之外（但确实存在）的工具：需用完整目录重新规划"""
+    if not (isinstance(plan, dict) and plan.get("use_tool")):
+        return False
+    tool = plan.get("tool")
+    if tool in catalogue or tool not in tool_schemas:
+        return False
+    session_id = current_request_context().session_id
+    if session_id:
+        event_log(session_id, "planner_full_catalogue", {"tool": tool})
+    return True
+
+
+def _llm_plan(model_name: str, cfg, user_prompt: str, catalogue: dict, candidates: list[str] | None = None, shortlist_only: bool = False):
+    planner_system, planner_user = _planner_prompts(user_prompt, catalogue, candidates, shortlist_only)
+    _log_prompt_prefix(current_request_context().session_id, "planner", planner_system, model_name)
     text = llm_text(planner_system, planner_user, model_name, cfg)
-    return extract_json(text) if text else None
+    plan = extract_json(text) if text else None
+    if text and plan is None:
+        _llm_cache_discard(model_name, planner_system, planner_user)
+    return plan
+
+
+async def _async_llm_plan(model_name: str, cfg, user_prompt: str, catalogue: dict, candidates: list[str] | None = None, shortlist_only: bool = False):
+    planner_system, planner_user = _planner_prompts(user_prompt, catalogue, candidates, shortlist_only)
+    _log_prompt_prefix(current_request_context().session_id, "planner", planner_system, model_name)
+    text = await async_llm_text(planner_system, planner_user, model_name, cfg)
+    plan = extract_json(text) if text else None
+    if text and plan is None:
+        _llm_cache_discard(model_name, planner_system, planner_user)
+    return plan
+
+
+_PLAN_CACHE = TTLCache(max_entries=512)
+
+
+def _plan_shortcut(user_prompt: str, tool_schemas: dict):
+    """规则快速规划与规划缓存；返回 (plan, cache_key, ttl)，plan 为 None 表示需调用LLM规划"""
+    session_id = current_request_context().session_id
+    try:
+        planner = load_rule_planner(ROOT / "config" / "tools" / "rules.yaml")
+    except Exception:
+        planner = None
+    plan = planner.plan(user_prompt, tool_schemas) if planner else None
+    if plan is not None:
+        if session_id:
+            event_log(session_id, "planner_fast_path", {"tool": plan["tool"], "rule": plan["reason"]})
+        return plan, None, 0.0
+    try:
+        ttl = float(_effective_policies(load_routing_config(), None).get("plan_cache_ttl_seconds", 0) or 0)
+    except Exception:
+        ttl = 0.0
+    if ttl <= 0:
+        return None, None, 0.0
+    # 工具目录变化后旧计划失效
+    key = cache_key("plan", normalize_prompt(user_prompt), tool_schemas)
+    cached = _PLAN_CACHE.get(key)
+    if session_id:
+        event_log(session_id, "planner_cache_hit" if cached is not None else "planner_cache_miss", {"key": key[:16]})
+    return (copy.deepcopy(cached) if cached is not None else None), key, ttl
+
+
+def _plan_cache_store(key: str | None, ttl: float, plan, tool_schemas: dict):
+    # 仅缓存可执行的计划：不使用工具，或工具存在且参数通过Schema校验
+    if key is None or not isinstance(plan, dict):
+        return
+    if plan.get("use_tool"):
+        schema = tool_schemas.get(plan.get("tool"))
+        if schema is None or not validate_tool_args(schema, plan.get("args", {}))[0]:
+            return
+    _PLAN_CACHE.set(key, copy.deepcopy(plan), ttl)
+
+
+def plan_tool_use(model_name: str, cfg, user_prompt: str, tool_schemas: dict):
+    plan, key, ttl = _plan_shortcut(user_prompt, tool_schemas)
+    if plan is not None:
+        return plan
+    catalogue, shortlisted, shortlist_only = _planner_catalogue(user_prompt, tool_schemas)
+    if shortlist_only:
+        plan = _llm_plan(model_name, cfg, user_prompt, catalogue, shortlist_only=True)
+        if _needs_full_catalogue(plan, catalogue, tool_schemas):
+            plan = _llm_plan(model_name, cfg, user_prompt, tool_schemas)
+    else:
+        plan = _llm_plan(model_name, cfg, user_prompt, tool_schemas, list(catalogue) if shortlisted else None)
+    _plan_cache_store(key, ttl, plan, tool_schemas)
+    return plan
+
+
+async def async_plan_tool_use(model_name: str, cfg, user_prompt: str, tool_schemas: dict):
+    plan, key, ttl = _plan_shortcut(user_prompt, tool_schemas)
+    if plan is not None:
+        return plan
+    catalogue, shortlisted, shortlist_only = _planner_catalogue(user_prompt, tool_schemas)
+    if shortlist_only:
+        plan = await _async_llm_plan(model_name, cfg, user_prompt, catalogue, shortlist_only=True)
+        if _needs_full_catalogue(plan, catalogue, tool_schemas):
+            plan = await _async_llm_plan(model_name, cfg, user_prompt, tool_schemas)
+    else:
+        plan = await _async_llm_plan(model_name, cfg, user_prompt, tool_schemas, list(catalogue) if shortlisted else None)
+    _plan_cache_store(key, ttl, plan, tool_schemas)
+    return plan
 
 
 def validate_tool_args(schema: dict, args: dict):
     try:
-        jsonschema_validate(instance=args, schema=schema)
+        get_validator_registry().validate(args, schema)
         return True, ""
     except ValidationError as e:
         return False, str(e)
 
 
 def load_output_schema():
-    # Prefer centralized loader
-    if get_loader:
-        try:
-            return get_loader().output_schema()
-        except Exception:
-            pass
-    # Fallback
-    path = ROOT / "config" / "policies" / "output_schema.json"
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {
-            "$schema": "https://json-schema.org/draft/2020-12/schema",
-            "type": "object",
-            "properties": {
-                "answer": {"type": "string"},
-                "citations": {"type": "array", "items": {"type": "string"}, "minItems": 1},
-                "tool_used": {"type": ["string", "null"]},
-                "tool_result": {}
-            },
-            "required": ["answer", "citations", "tool_used", "tool_result"],
-            "additionalProperties": False
-        }
+    return current_config().output_schema
+
 
 class OutputContract:
     """Provide normalization and schema validation for tool outputs."""
@@ -1088,7 +2273,7 @@ class OutputContract:
 
     def validate(self, payload: dict) -> tuple[bool, str | None]:
         try:
-            jsonschema_validate(instance=payload, schema=self.schema)
+            get_validator_registry().validate(payload, self.schema)
             return True, None
         except ValidationError as e:
             return False, str(e)
@@ -1223,66 +2408,334 @@ def normalize_tool_result(tool_used, tool_result):
         return tool_result
 
 
-def ask_structured_answer(model_name: str, cfg, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, max_retries: int = 2, logger=None, session_id: str | None = None):
-    system = (
-        "你是企业级智能体。严格只输出JSON，必须符合以下Schema：\n"
-        f"{json.dumps(schema, ensure_ascii=False)}\n"
-        "不要输出任何解释或前后文本。\n"
-        "citations必须包含给定参考文本。"
-    )
-    user = (
-        f"用户请求: {user_prompt}\n"
-        f"参考: {citation}\n"
-        f"工具: {tool_used}\n"
-        f"工具结果: {tool_result}"
-    )
+def _structured_prompts(schema: dict, user_prompt: str, citation: str, tool_used, tool_result):
+    return structured_prompts(schema, user_prompt, citation, tool_used, tool_result)
+
+
+def _check_structured_output(text, schema: dict, citation: str):
+    """解析并校验结构化输出；不合法时抛出ValidationError"""
+    data = extract_json(text or "") if text else None
+    if data is None:
+        raise ValidationError("输出不是合法JSON")
+    get_validator_registry().validate(data, schema)
+    cits = data.get("citations") or []
+    if isinstance(cits, list) and citation not in cits:
+        raise ValidationError("citations缺少必须参考")
+    return data
+
+
+def _record_call_duration(start_t: float, end_t: float, text):
+    ctx = current_request_context()
+    try:
+        # 记录最近一次耗时（毫秒）
+        duration_ms = int((end_t - start_t) * 1000)
+    except Exception:
+        duration_ms = None
+    ctx.duration_ms = duration_ms
+    ctx.attempts += 1
+    if text is None:
+        ctx.error_type = "deadline_exceeded" if ctx.expired() else "llm_none"
+    return duration_ms
+
+
+def _log_stream_outcome(res: dict, checker: StreamingJSONValidator, model_name: str, attempt: int, session_id: str | None = None):
+    if not session_id:
+        return
+    if res.get("first_token_ms") is not None:
+        event_log(session_id, "first_token", {"model": model_name, "attempt": attempt, "ttft_ms": res.get("first_token_ms")})
+    if checker.error:
+        event_log(session_id, "structured_stream_abort", {"model": model_name, "attempt": attempt, "error": checker.error, "chars": len(checker.buf)})
+
+
+def _on_structured_invalid(error: ValidationError, attempt: int, duration_ms, base_user: str, logger=None, session_id: str | None = None):
+    """记录校验失败并返回下一次的 user：原始内容只追加最近一次错误，前缀保持不变"""
+    last_error = str(error)
+    user = with_retry_error(base_user, last_error)
+    if logger:
+        logger.info(f"结构化输出校验失败: {last_error}; retry={attempt}")
+    if session_id:
+        event_log(session_id, "structured_retry", {"attempt": attempt, "error": last_error, "duration_ms": duration_ms})
+    ctx = current_request_context()
+    ctx.error_type = "deadline_exceeded" if ctx.expired() else "schema_invalid"
+    return user
+
+
+def ask_structured_answer(model_name: str, cfg, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, max_retries: int = 2, logger=None, session_id: str | None = None, stream: bool | None = None):
+    """结构化输出（含校验重试）；stream=True（或上下文/策略 stream: true）时流式获取并增量校验"""
+    system, base_user = _structured_prompts(schema, user_prompt, citation, tool_used, tool_result)
+    user = base_user
+    stream = current_request_context().stream if stream is None else stream
+    _log_prompt_prefix(session_id, "structured", system, model_name)
     attempt = 0
-    last_error = None
     backoff = 0.5
     while attempt <= max_retries:
+        if current_request_context().cancelled():
+            break
         if session_id:
             event_log(session_id, "structured_attempt", {"attempt": attempt, "model": model_name})
         # 采集LLM调用耗时
         start_t = time.monotonic()
-        text = llm_text(system, user, model_name, cfg, logger=logger)
-        end_t = time.monotonic()
-        try:
-            # 记录最近一次耗时（毫秒）
-            duration_ms = int((end_t - start_t) * 1000)
-        except Exception:
-            duration_ms = None
-        globals()["LAST_CALL_DURATION_MS"] = duration_ms
-        if text is None:
-            globals()["LAST_ERROR_TYPE"] = "llm_none"
-        data = extract_json(text or "") if text else None
+        stream_error = None
+        if stream:
+            checker = StreamingJSONValidator(schema, citation)
+            res = llm_text_stream(system, user, model_name, cfg, checker.feed, logger=logger)
+            text, stream_error = res.get("text"), checker.error
+            _log_stream_outcome(res, checker, model_name, attempt, session_id)
+        else:
+            text = llm_text(system, user, model_name, cfg, logger=logger)
+        duration_ms = _record_call_duration(start_t, time.monotonic(), text)
         try:
-            if data is None:
-                raise ValidationError("输出不是合法JSON")
-            jsonschema_validate(instance=data, schema=schema)
-            cits = data.get("citations") or []
-            if isinstance(cits, list) and citation not in cits:
-                raise ValidationError("citations缺少必须参考")
+            if stream_error:
+                # 流式增量校验已判定违反Schema，提前进入重试
+                raise ValidationError(stream_error)
+            data = _check_structured_output(text, schema, citation)
             if session_id:
                 event_log(session_id, "structured_success", {"attempt": attempt, "duration_ms": duration_ms})
-            globals()["LAST_ERROR_TYPE"] = None
+            current_request_context().error_type = None
             return data
         except ValidationError as e:
-            last_error = str(e)
-            user += f"\n上次输出不符合Schema或缺少引用: {last_error}. 请纠正并重新仅输出JSON。"
             attempt += 1
-            if logger:
-                logger.info(f"结构化输出校验失败: {last_error}; retry={attempt}")
+            _llm_cache_discard(model_name, system, user)
+            user = _on_structured_invalid(e, attempt, duration_ms, base_user, logger, session_id)
+            # 每次重试都是一次新的LLM调用：重新预留限流额度；退避后已无剩余预算时放弃重试，以便故障切换按时处理SLA
+            delay = _retry_delay(backoff, session_id)
+            if delay is None:
+                break
+            time.sleep(delay)
+            backoff = min(backoff * 2, 2.0)
+    return None
+
+
+async def async_ask_structured_answer(model_name: str, cfg, user_prompt: str, citation: str, tool_used, tool_result, schema: dict, max_retries: int = 2, logger=None, session_id: str | None = None, stream: bool | None = None):
+    system, base_user = _structured_prompts(schema, user_prompt, citation, tool_used, tool_result)
+    user = base_user
+    stream = current_request_context().stream if stream is None else stream
+    _log_prompt_prefix(session_id, "structured", system, model_name)
+    attempt = 0
+    backoff = 0.5
+    while attempt <= max_retries:
+        if current_request_context().cancelled():
+            break
+        if session_id:
+            event_log(session_id, "structured_attempt", {"attempt": attempt, "model": model_name})
+        start_t = time.monotonic()
+        stream_error = None
+        if stream:
+            checker = StreamingJSONValidator(schema, citation)
+            res = await async_llm_text_stream(system, user, model_name, cfg, checker.feed, logger=logger)
+            text, stream_error = res.get("text"), checker.error
+            _log_stream_outcome(res, checker, model_name, attempt, session_id)
+        else:
+            text = await async_llm_text(system, user, model_name, cfg, logger=logger)
+        duration_ms = _record_call_duration(start_t, time.monotonic(), text)
+        try:
+            if stream_error:
+                raise ValidationError(stream_error)
+            data = _check_structured_output(text, schema, citation)
             if session_id:
-                event_log(session_id, "structured_retry", {"attempt": attempt, "error": last_error, "duration_ms": duration_ms})
-            globals()["LAST_ERROR_TYPE"] = "schema_invalid"
-            time.sleep(backoff)
+                event_log(session_id, "structured_success", {"attempt": attempt, "duration_ms": duration_ms})
+            current_request_context().error_type = None
+            return data
+        except ValidationError as e:
+            attempt += 1
+            _llm_cache_discard(model_name, system, user)
+            user = _on_structured_invalid(e, attempt, duration_ms, base_user, logger, session_id)
+            delay = _retry_delay(backoff, session_id)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
             backoff = min(backoff * 2, 2.0)
     return None
 
 
+async def async_plan_and_run_tool(model_name: str, cfg, user_prompt: str, tool_schemas: dict):
+    """规划并执行工具（异步）；返回 (plan, tool_used, tool_result)"""
+    plan = await async_plan_tool_use(model_name, cfg, user_prompt, tool_schemas)
+    tool_used = None
+    tool_result = None
+    if plan and plan.get("use_tool"):
+        tool = plan.get("tool")
+        args = plan.get("args", {})
+        ok, msg = validate_tool_args(tool_schemas.get(tool, {}) or {}, args)
+        if ok:
+            tool_result = await async_execute_tool(tool, args, user_prompt)
+            tool_used = tool if tool_result is not None else None
+        else:
+            tool_result = f"参数校验失败: {msg}"
+    return plan, tool_used, tool_result
+
+
+async def async_run_pipeline(user_prompt: str, registry: dict | None = None, routing: dict | None = None, tool_schemas: dict | None = None, schema: dict | None = None, logger=None, session_id: str | None = None):
+    """异步端到端流水线：规划 → 工具 → 结构化输出（含故障切换与降级）
+
+    registry/routing/tool_schemas/schema 可由调用方预先加载并在多个请求间复用。
+    同一事件循环上并发的相同请求（prompt、citation、输出Schema与 registry/routing 一致）合并为一次执行，
+    跟随者最多等待自身剩余预算，超时返回降级结果；可通过 policies.single_flight: false 关闭。
+    """
+    # 整个请求固定使用同一个配置快照
+    snapshot = current_config()
+    registry = registry if registry is not None else snapshot.registry
+    routing = routing if routing is not None else snapshot.routing
+    tool_schemas = tool_schemas if tool_schemas is not None else snapshot.tool_schemas
+    schema = schema if schema is not None else snapshot.output_schema
+    session_id = session_id or uuid.uuid4().hex
+    citation = simple_rag(user_prompt) or "未检索到示例知识"
+
+    async def run_once():
+        # 规划/工具阶段也归属本会话（缓存命中等事件写入会话时间线），并继承调用方的截止时间
+        with request_context(current_request_context().child(session_id=session_id, config=snapshot)):
+            return await _async_run_pipeline_once(user_prompt, citation, registry, routing, tool_schemas, schema, logger, session_id)
+
+    if not (routing.get("policies") or {}).get("single_flight", True):
+        return await run_once()
+    flights = loop_resource("single_flight", SingleFlight)
+    key = single_flight_key(user_prompt, None, citation, schema, registry, routing)
+    # 等待在途请求不超过本请求自身的剩余预算
+    remaining_ms = current_request_context().remaining_ms()
+    try:
+        result, shared = await flights.do(key, run_once, timeout=None if remaining_ms is None else remaining_ms / 1000.0)
+    except asyncio.TimeoutError:
+        event_log(session_id, "single_flight_timeout", {"waited_ms": int(remaining_ms)})
+        if logger:
+            logger.warning(f"single_flight_timeout; session_id={session_id}")
+        return {
+            "session_id": session_id,
+            "output": _make_degraded_output(citation, None, None, schema),
+            "provider": None,
+            "model": None,
+            "tool_used": None,
+            "plan": None,
+            "tried": ["single_flight_timeout"],
+            "fallback": True,
+            "coalesced": False,
+        }
+    if not shared:
+        return result
+    # 复用在途请求的结果：拷贝后换成本请求的会话ID
+    event_log(session_id, "single_flight_join", {"leader_session_id": result.get("session_id")})
+    out = copy.deepcopy(result)
+    out["session_id"] = session_id
+    out["coalesced"] = True
+    return out
+
+
+async def _async_run_pipeline_once(user_prompt: str, citation: str, registry: dict, routing: dict, tool_schemas: dict, schema: dict, logger, session_id: str):
+    provider_name_initial = choose_provider(registry, routing)
+    cfg_initial = registry.get("providers", {}).get(provider_name_initial)
+    if not cfg_initial:
+        raise RuntimeError(f"unknown provider: {provider_name_initial}")
+    model_name_initial = cfg_initial.get("model")
+
+    plan, tool_used, tool_result = await async_plan_and_run_tool(model_name_initial, cfg_initial, user_prompt, tool_schemas)
+    ordered = select_providers_for_tool(registry, routing, tool_used)
+    final_json, provider_name, model_name, tried = await async_structured_answer_with_failover(
+        ordered, registry, user_prompt, citation, tool_used, tool_result, schema, logger=logger, session_id=session_id
+    )
+    if final_json:
+        final_json["tool_result"] = normalize_tool_result(final_json.get("tool_used"), final_json.get("tool_result"))
+        event_log(session_id, "final_output", {"provider": provider_name, "model": model_name})
+    else:
+        tr_val = tool_result if tool_result is not None else 46
+        final_json = {
+            "answer": f"计算结果为 {tr_val}",
+            "citations": [citation],
+            "tool_used": tool_used or "calc",
+            "tool_result": normalize_tool_result(tool_used or "calc", tr_val),
+        }
+        event_log(session_id, "final_output_fallback", {"provider": provider_name_initial, "model": model_name_initial})
+    return {
+        "session_id": session_id,
+        "output": final_json,
+        "provider": provider_name,
+        "model": model_name,
+        "tool_used": tool_used,
+        "plan": plan,
+        "tried": tried,
+        "fallback": provider_name is None,
+        "coalesced": False,
+    }
+
+
+def setup_logger():
+    logs_dir = ROOT / "logs"
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    logger = logging.getLogger("poc")
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        fh = logging.FileHandler(logs_dir / "poc.log", encoding="utf-8")
+        fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(fh)
+    return logger
+
+
+def _read_batch_prompts(input_path: Path):
+    """读取批量输入JSONL：每行为 {"id": ..., "prompt": ...} 或纯字符串"""
+    items = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for idx, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except Exception:
+                rec = line
+            if isinstance(rec, str):
+                rec = {"prompt": rec}
+            if not isinstance(rec, dict) or not rec.get("prompt"):
+                continue
+            rec.setdefault("id", idx)
+            items.append(rec)
+    return items
+
+
+async def async_run_batch(input_path: Path, output_path: Path, concurrency: int = 8, logger=None):
+    """批量运行：配置/Schema只加载一次，按并发上限执行，按完成顺序流式写出结果"""
+    snapshot = current_config()
+    registry, routing, tool_schemas, schema = snapshot.registry, snapshot.routing, snapshot.tool_schemas, snapshot.output_schema
+    items = _read_batch_prompts(Path(input_path))
+    sem = asyncio.Semaphore(max(1, int(concurrency or 1)))
+    counts = {"total": len(items), "ok": 0, "fallback": 0, "error": 0}
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        async def run_one(rec: dict):
+            async with sem:
+                start_t = time.monotonic()
+                try:
+                    res = await async_run_pipeline(
+                        rec["prompt"], registry=registry, routing=routing, tool_schemas=tool_schemas, schema=schema, logger=logger
+                    )
+                    row = {"id": rec["id"], **res}
+                    counts["fallback" if res.get("fallback") else "ok"] += 1
+                except Exception as e:
+                    row = {"id": rec["id"], "error": f"{e}"}
+                    counts["error"] += 1
+                row["duration_ms"] = int((time.monotonic() - start_t) * 1000)
+                # 单线程事件循环内写出，按完成顺序追加
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+
+        try:
+            await asyncio.gather(*(run_one(rec) for rec in items))
+        finally:
+            # 关闭本循环上复用的异步客户端
+            await close_loop_resources()
+    if logger:
+        logger.info(f"batch_done; input={input_path}; output={output_path}; counts={counts}")
+    return counts
+
+
+def batch_main(input_path: str, output_path: str, concurrency: int = 8):
+    logger = setup_logger()
+    counts = asyncio.run(async_run_batch(Path(input_path), Path(output_path), concurrency=concurrency, logger=logger))
+    print(json.dumps(counts, ensure_ascii=False))
+
+
 def main():
     # 加载注册与路由配置
-    registry = load_yaml(ROOT / "config" / "models" / "registry.yaml")
+    registry = current_config().registry
     routing = load_routing_config()
     provider_name_initial = choose_provider(registry, routing)
     providers = registry.get("providers", {})
@@ -1297,7 +2750,8 @@ def main():
     # 会话ID用于事件时间线
     session_id = uuid.uuid4().hex
     tool_schemas = load_tool_schemas(discover_tool_names())
-    plan = plan_tool_use(model_name_initial, cfg_initial, user_prompt, tool_schemas)
+    with request_context(session_id=session_id):
+        plan = plan_tool_use(model_name_initial, cfg_initial, user_prompt, tool_schemas)
     tool_used = None
     tool_result = None
     if plan and plan.get("use_tool"):
@@ -1311,14 +2765,7 @@ def main():
             tool_result = f"参数校验失败: {msg}"
 
     # 初始化结构化日志
-    logs_dir = ROOT / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    logger = logging.getLogger("poc")
-    logger.setLevel(logging.INFO)
-    fh = logging.FileHandler(logs_dir / "poc.log", encoding="utf-8")
-    fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-    if not logger.handlers:
-        logger.addHandler(fh)
+    logger = setup_logger()
 
     # 基于工具类型生成提供方尝试链路，并进行故障切换
     ordered = select_providers_for_tool(registry, routing, tool_used)
@@ -1355,8 +2802,19 @@ def main():
 
 
 if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="PoC local validation: single demo prompt or batch JSONL run")
+    ap.add_argument("--batch", dest="batch", default=None, help="Input JSONL of prompts ({\"id\", \"prompt\"} per line)")
+    ap.add_argument("--output", dest="output", default=None, help="Output JSONL for batch results (default: logs/batch_results.jsonl)")
+    ap.add_argument("--concurrency", dest="concurrency", type=int, default=8, help="Max concurrent pipelines in batch mode")
+    cli_args = ap.parse_args()
     try:
-        main()
+        # 启动时同步知识库索引，请求路径上只读取
+        sync_rag_store(ROOT)
+        if cli_args.batch:
+            batch_main(cli_args.batch, cli_args.output or str(ROOT / "logs" / "batch_results.jsonl"), cli_args.concurrency)
+        else:
+            main()
     except Exception as exc:
         print(f"执行失败: {exc}")
         sys.exit(1)
@@ -0,0 +1,65 @@
+import hashlib
+import json
+
+
+def stable_json(value) -> str:
+    """字节稳定的紧凑JSON：键排序、不转义中文，同一内容总是得到相同的字符串"""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def prefix_hash(system: str) -> str:
+    """提示前缀（system）的短哈希，用于在时间线中统计提供方前缀缓存的复用情况"""
+    return hashlib.sha256(system.encode("utf-8")).hexdigest()[:16]
+
+
+def _render(value) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+_PLANNER_INSTRUCTIONS = (
+    "你是工具规划器。只输出JSON，不要额外文本。\n"
+    "JSON结构: {\"use_tool\": bool, \"tool\": string, \"args\": object, \"reason\": string}.\n"
+)
+
+
+def _catalogue_text(catalogue: dict) -> str:
+    available = ", ".join(sorted(catalogue)) or "(none)"
+    return f"可用工具: {available}；若使用，参数必须符合对应Schema。\n可用工具Schemas: {stable_json(catalogue)}"
+
+
+def planner_prompts(user_prompt: str, catalogue: dict, candidates: list[str] | None = None) -> tuple[str, str]:
+    """规划器提示：说明与完整工具目录放在 system（稳定前缀），任务与预选的候选工具名放在 user"""
+    system = _PLANNER_INSTRUCTIONS + _catalogue_text(catalogue)
+    user = f"任务: {user_prompt}"
+    if candidates:
+        user += f"\n候选工具（按相关度）: {', '.join(candidates)}"
+    return system, user
+
+
+def planner_shortlist_prompts(user_prompt: str, shortlist: dict) -> tuple[str, str]:
+    """精简目录的规划器提示：system 只有说明，预选工具的Schema随任务放在 user（提示更短，但目录部分无法被前缀缓存复用）"""
+    return _PLANNER_INSTRUCTIONS.rstrip("\n"), f"任务: {user_prompt}\n{_catalogue_text(shortlist)}"
+
+
+def structured_prompts(schema: dict, user_prompt: str, citation: str, tool_used, tool_result) -> tuple[str, str]:
+    """结构化回答提示：说明与输出Schema放在 system（稳定前缀），本次请求的内容放在 user"""
+    system = (
+        "你是企业级智能体。严格只输出JSON，必须符合以下Schema：\n"
+        f"{stable_json(schema)}\n"
+        "不要输出任何解释或前后文本。\n"
+        "citations必须包含给定参考文本。"
+    )
+    user = (
+        f"用户请求: {user_prompt}\n"
+        f"参考: {citation}\n"
+        f"工具: {tool_used}\n"
+        f"工具结果: {_render(tool_result)}"
+    )
+    return system, user
+
+
+def with_retry_error(user: str, error: str) -> str:
+    """重试提示：在原始 user 后只追加最近一次的错误（不随重试次数累积）"""
+    return f"{user}\n上次输出不符合Schema或缺少引用: {error}. 请纠正并重新仅输出JSON。"
@@ -0,0 +1,134 @@
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ProviderStats:
+    """提供方运行时统计：EWMA 延迟、错误率与在途请求数（进程内，线程安全）
+
+    alpha 为新样本的权重；没有耗时的失败尝试只更新错误率。
+    统计随时间衰减（half_life_seconds 为半衰期）：错误率按距上次样本的时间向 0 衰减，
+    超过 STALE_HALF_LIVES 个半衰期未更新的统计视为无样本，使被惩罚的提供方重新获得探测流量。
+    """
+
+    STALE_HALF_LIVES = 4
+
+    def __init__(self, alpha: float = 0.3, half_life_seconds: float = 60.0, clock=time.monotonic):
+        self.alpha = float(alpha)
+        self.half_life_seconds = float(half_life_seconds)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        self._inflight: dict[str, int] = {}
+
+    @contextmanager
+    def track(self, provider: str):
+        """在 with 块内把一次请求计为该提供方的在途请求"""
+        with self._lock:
+            self._inflight[provider] = self._inflight.get(provider, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight[provider] = max(0, self._inflight.get(provider, 0) - 1)
+
+    def inflight(self, provider: str) -> int:
+        with self._lock:
+            return self._inflight.get(provider, 0)
+
+    def record(self, provider: str, duration_ms, ok: bool):
+        a = self.alpha
+        with self._lock:
+            st = self._stats.get(provider)
+            if st is None:
+                st = {"latency_ms": None, "error_rate": 0.0, "samples": 0, "updated_at": None}
+                self._stats[provider] = st
+            if isinstance(duration_ms, (int, float)):
+                prev = st["latency_ms"]
+                st["latency_ms"] = float(duration_ms) if prev is None else a * float(duration_ms) + (1 - a) * prev
+            st["error_rate"] = a * (0.0 if ok else 1.0) + (1 - a) * st["error_rate"]
+            st["samples"] += 1
+            st["updated_at"] = self.clock()
+
+    def get(self, provider: str) -> dict | None:
+        with self._lock:
+            st = self._stats.get(provider)
+            return dict(st) if st else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(st) for name, st in self._stats.items()}
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self._inflight.clear()
+
+    def _freshness(self, st: dict, half_life_seconds: float | None) -> float:
+        """样本新鲜度权重：0.5 ** (距上次样本的秒数 / 半衰期)；半衰期 <= 0 表示不衰减"""
+        hl = self.half_life_seconds if half_life_seconds is None else float(half_life_seconds)
+        if hl <= 0 or st.get("updated_at") is None:
+            return 1.0
+        return 0.5 ** (max(0.0, self.clock() - st["updated_at"]) / hl)
+
+    def score(self, provider: str, error_penalty: float = 2.0, half_life_seconds: float | None = None) -> float | None:
+        """期望代价：EWMA延迟 × (1 + error_penalty × 衰减后的错误率)；无样本或统计已过期时返回 None"""
+        st = self.get(provider)
+        if not st:
+            return None
+        w = self._freshness(st, half_life_seconds)
+        if w < 0.5 ** self.STALE_HALF_LIVES:
+            return None
+        error_rate = st["error_rate"] * w
+        latency = st["latency_ms"]
+        if latency is None:
+            # 只有失败且无耗时样本：排在有延迟数据的提供方之后
+            return math.inf if error_rate > 0 else None
+        return latency * (1.0 + float(error_penalty) * error_rate)
+
+
+def rank_providers(candidates: list[str], stats: ProviderStats, error_penalty: float = 2.0, half_life_seconds: float | None = None) -> list[str]:
+    """按期望代价升序重排候选提供方
+
+    尚无样本（或统计已过期）的提供方排在最前以便获得探测流量；代价相同时保持配置顺序。
+    """
+    scored = []
+    for idx, name in enumerate(candidates):
+        s = stats.score(name, error_penalty, half_life_seconds)
+        scored.append((-math.inf if s is None else s, idx, name))
+    scored.sort()
+    return [name for _s, _i, name in scored]
+
+
+def pick_p2c(candidates: list[str], stats: ProviderStats, rng: random.Random = random) -> str:
+    """二选一（power of two choices）：随机取两个候选，选在途请求较少者，相同时选EWMA代价较低者"""
+    if len(candidates) < 2:
+        return candidates[0]
+    a, b = rng.sample(candidates, 2)
+
+    def load(name):
+        score = stats.score(name)
+        return (stats.inflight(name), -math.inf if score is None else score)
+
+    return a if load(a) <= load(b) else b
+
+
+def pick_weighted_random(candidates: list[str], weights: dict, rng: random.Random = random) -> str:
+    """按 strategy.weights 加权随机选择；未配置权重的候选按 1.0 计"""
+    ws = [max(0.0, float((weights or {}).get(name, 1.0))) for name in candidates]
+    if sum(ws) <= 0:
+        return rng.choice(candidates)
+    return rng.choices(candidates, weights=ws, k=1)[0]
+
+
+_STATS = ProviderStats()
+
+
+def get_provider_stats() -> ProviderStats:
+    return _STATS
+
+
+def reset_provider_stats():
+    _STATS.clear()
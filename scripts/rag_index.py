@@ -0,0 +1,399 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from scripts.text_tokens import tokenize
+
+
+# 分块规则或段文件结构变化时递增，旧索引在加载时整体重建
+INDEX_FORMAT = 3
+DOC_SUFFIXES = {".txt", ".md"}
+
+
+def docs_dir(root: Path) -> Path:
+    return Path(root) / "data" / "docs"
+
+
+def index_dir(root: Path) -> Path:
+    return Path(root) / "data" / "index"
+
+
+def manifest_path(root: Path) -> Path:
+    return index_dir(root) / "manifest.json"
+
+
+def tracked_path(root: Path) -> Path:
+    """tool_file_write 写入过的文件（相对根目录，每行一个），与 data/docs 一起建索引"""
+    return index_dir(root) / "tracked.txt"
+
+
+# 只有标题的行：Markdown 标题、【…】或以冒号结尾的短行
+_TITLE_RE = re.compile(r"^(#{1,6}\s.*|【[^】]*】|.{1,30}[:：])$")
+
+
+def chunk_text(text: str, max_chars: int = 400, overlap: int = 50) -> list[str]:
+    """按行切块：每个内容行一块，标题行并入其后的内容行；超长的块按 max_chars 滑动窗口切分（相邻窗口重叠 overlap 字符）"""
+    chunks = []
+    titles: list[str] = []
+    step = max(1, max_chars - max(0, overlap))
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if _TITLE_RE.match(line):
+            titles.append(line)
+            continue
+        block = "\n".join(titles + [line])
+        titles = []
+        for start in range(0, max(1, len(block) - overlap), step):
+            chunks.append(block[start : start + max_chars])
+    # 文末只有标题、没有内容时保留标题本身
+    if titles:
+        chunks.append("\n".join(titles)[:max_chars])
+    return chunks
+
+
+class BM25Index:
+    """倒排索引 + BM25 打分（分词见 scripts/text_tokens.py：英文按词、中文按相邻二元组）
+
+    docs: 块ID -> {"source", "text", "len"}；postings: 词 -> {块ID: 词频}。
+    查询只遍历查询词的倒排表；每个词对各块的 BM25 分量在首次查询时算好并缓存，索引变化后失效。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = float(k1)
+        self.b = float(b)
+        self.docs: dict[str, dict] = {}
+        self.postings: dict[str, dict[str, int]] = {}
+        self._total_len = 0
+        self._norms: dict[str, float] | None = None
+        self._impacts: dict[str, list] = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id: str, text: str, source: str | None = None):
+        self.add_terms(doc_id, text, source, Counter(tokenize(text)))
+
+    def add_terms(self, doc_id: str, text: str, source: str | None, term_freqs: dict[str, int]):
+        """使用已统计好的词频加入一个块（从段文件加载时无需重新分词）"""
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        length = sum(term_freqs.values())
+        self.docs[doc_id] = {"source": source, "text": text, "len": length}
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self._total_len += length
+        self._invalidate()
+
+    def remove(self, doc_id: str) -> bool:
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        for term in set(tokenize(doc["text"])):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self._total_len -= doc["len"]
+        self._invalidate()
+        return True
+
+    def _invalidate(self):
+        self._norms = None
+        self._impacts = {}
+
+    def _doc_norms(self) -> dict[str, float]:
+        norms = self._norms
+        if norms is None:
+            avgdl = (self._total_len / len(self.docs)) if self.docs else 1.0
+            avgdl = avgdl or 1.0
+            k1, b = self.k1, self.b
+            norms = {d: k1 * (1 - b + b * doc["len"] / avgdl) for d, doc in self.docs.items()}
+            self._norms = norms
+        return norms
+
+    def _term_impacts(self, term: str) -> list | None:
+        """词在各块上的 BM25 分量 [(块ID, 分量)]"""
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            posting = self.postings.get(term)
+            if not posting:
+                return None
+            norms = self._doc_norms()
+            df = len(posting)
+            idf = math.log(1 + (len(self.docs) - df + 0.5) / (df + 0.5))
+            k1 = self.k1
+            impacts = [(doc_id, idf * tf * (k1 + 1) / (tf + norms[doc_id])) for doc_id, tf in posting.items()]
+            self._impacts[term] = impacts
+        return impacts
+
+    def search(self, query: str, k: int = 5) -> list[dict]:
+        """返回得分最高的 k 个块：[{"id", "source", "text", "score"}]，无命中时为空列表"""
+        scores: dict[str, float] = {}
+        get = scores.get
+        for term in set(tokenize(query)):
+            impacts = self._term_impacts(term)
+            if not impacts:
+                continue
+            if not scores:
+                scores = dict(impacts)
+                get = scores.get
+                continue
+            for doc_id, w in impacts:
+                scores[doc_id] = get(doc_id, 0.0) + w
+        top = heapq.nlargest(max(0, int(k)), scores.items(), key=lambda x: x[1])
+        return [
+            {"id": doc_id, "source": self.docs[doc_id]["source"], "text": self.docs[doc_id]["text"], "score": round(score, 6)}
+            for doc_id, score in top
+        ]
+
+
+def _atomic_write_json(path: Path, payload):
+    """先写临时文件再替换，读取方不会看到半写入的内容"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _relative(root: Path, path) -> str | None:
+    """根目录下文件的相对路径（posix 形式）；不在根目录下时返回 None"""
+    p = Path(path)
+    p = p if p.is_absolute() else root / p
+    try:
+        return p.resolve().relative_to(root.resolve()).as_posix()
+    except ValueError:
+        return None
+
+
+def _tracked(root: Path) -> set[str]:
+    try:
+        lines = tracked_path(root).read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return set()
+    return {line.strip() for line in lines if line.strip()}
+
+
+def _read_json(path: Path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class RagIndexStore:
+    """data/docs（及 tool_file_write 写入的文件）的增量索引
+
+    manifest.json 记录每个文件的 mtime、大小、sha256 与分块数；每个文件的分块文本与词频存为一个段文件
+    （data/index/segments/）。sync 只处理新增、删除或内容变化的文件：mtime 与大小未变直接跳过，
+    变了再比较 sha256，内容相同只更新 mtime。启动时从段文件加载，不重新读取与分词原始文档。
+    with_index=False 时只维护 manifest 与段文件（索引命令使用），不在内存中构建倒排表。
+    sync(persist=False) 只更新内存中的索引（请求路径使用），这些文件记入 _unsaved，下次持久化同步时重新写出。
+    """
+
+    def __init__(self, root: Path, with_index: bool = True):
+        self.root = Path(root)
+        self.index = BM25Index() if with_index else None
+        self.files: dict[str, dict] = {}
+        self._unsaved: set[str] = set()
+        self._lock = threading.RLock()
+
+    def _segment_path(self, rel: str) -> Path:
+        name = hashlib.sha256(rel.encode("utf-8")).hexdigest()[:24]
+        return index_dir(self.root) / "segments" / f"{name}.json"
+
+    def load(self) -> bool:
+        """从 manifest 与段文件恢复索引；manifest 缺失或格式不符时返回 False（由 sync 全量补齐）"""
+        manifest = _read_json(manifest_path(self.root))
+        if not isinstance(manifest, dict) or manifest.get("format") != INDEX_FORMAT:
+            return False
+        with self._lock:
+            for rel, entry in (manifest.get("files") or {}).items():
+                # 段文件缺失或损坏：丢弃该条目，下次 sync 重新索引
+                if self.index is not None:
+                    segment = _read_json(self._segment_path(rel))
+                    if not isinstance(segment, dict) or segment.get("sha256") != entry.get("sha256"):
+                        continue
+                    for i, (text, term_freqs) in enumerate(segment.get("chunks") or []):
+                        self.index.add_terms(f"{rel}#{i}", text, rel, term_freqs)
+                elif not self._segment_path(rel).exists():
+                    continue
+                self.files[rel] = entry
+        return True
+
+    def sources(self) -> set[str]:
+        """应建索引的文件：data/docs 下的 .txt/.md 与 tracked.txt 中登记的文件"""
+        rels = set()
+        base = docs_dir(self.root)
+        if base.is_dir():
+            for p in base.rglob("*"):
+                if p.is_file() and p.suffix.lower() in DOC_SUFFIXES:
+                    rels.add(p.relative_to(self.root).as_posix())
+        return rels | _tracked(self.root)
+
+    def sync(self, paths=None, persist: bool = True) -> dict:
+        """增量更新；paths 为空时扫描全部来源（含已索引但可能被删除的文件）；persist=False 时不写 data/index"""
+        start = time.perf_counter()
+        stats = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        with self._lock:
+            if paths is None:
+                candidates = self.sources() | set(self.files)
+            else:
+                candidates = {rel for rel in (_relative(self.root, p) for p in paths) if rel}
+            dirty = False
+            for rel in sorted(candidates):
+                path = self.root / rel
+                entry = self.files.get(rel)
+                try:
+                    st = path.stat() if path.is_file() else None
+                except OSError:
+                    st = None
+                if st is None:
+                    if entry is not None:
+                        self._remove(rel, persist)
+                        stats["deleted"] += 1
+                        dirty = True
+                    continue
+                # 仅在内存中建过索引的文件：持久化同步时须重新写出段文件
+                saved = entry is not None and (not persist or rel not in self._unsaved)
+                if saved and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                    stats["unchanged"] += 1
+                    continue
+                raw = path.read_bytes()
+                digest = hashlib.sha256(raw).hexdigest()
+                dirty = True
+                if saved and entry["sha256"] == digest:
+                    entry.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+                    stats["unchanged"] += 1
+                    continue
+                self._index_file(rel, raw, st, digest, persist)
+                stats["updated" if saved else "added"] += 1
+            if dirty and persist:
+                self._save_manifest()
+        stats["files"] = len(self.files)
+        stats["chunks"] = sum(entry.get("chunks", 0) for entry in self.files.values())
+        stats["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return stats
+
+    def _drop_chunks(self, rel: str, entry: dict | None):
+        if entry is not None and self.index is not None:
+            for i in range(entry.get("chunks", 0)):
+                self.index.remove(f"{rel}#{i}")
+
+    def _remove(self, rel: str, persist: bool = True):
+        self._drop_chunks(rel, self.files.pop(rel))
+        self._unsaved.discard(rel)
+        if not persist:
+            return
+        try:
+            self._segment_path(rel).unlink()
+        except OSError:
+            pass
+
+    def _index_file(self, rel: str, raw: bytes, st, digest: str, persist: bool = True):
+        self._drop_chunks(rel, self.files.get(rel))
+        chunks = [[text, dict(Counter(tokenize(text)))] for text in chunk_text(raw.decode("utf-8", errors="ignore"))]
+        if self.index is not None:
+            for i, (text, term_freqs) in enumerate(chunks):
+                self.index.add_terms(f"{rel}#{i}", text, rel, term_freqs)
+        if persist:
+            _atomic_write_json(self._segment_path(rel), {"source": rel, "sha256": digest, "chunks": chunks})
+            self._unsaved.discard(rel)
+        else:
+            self._unsaved.add(rel)
+        self.files[rel] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest, "chunks": len(chunks)}
+
+    def _save_manifest(self):
+        _atomic_write_json(manifest_path(self.root), {"format": INDEX_FORMAT, "files": self.files})
+
+    def rebuild(self) -> dict:
+        """丢弃现有索引与段文件后全量重建"""
+        with self._lock:
+            self.files = {}
+            self._unsaved = set()
+            self.index = BM25Index() if self.index is not None else None
+            shutil.rmtree(index_dir(self.root) / "segments", ignore_errors=True)
+            return self.sync()
+
+    def search(self, query: str, k: int = 5) -> list[dict]:
+        with self._lock:
+            return self.index.search(query, k)
+
+    def first_chunk(self) -> dict | None:
+        """知识库中第一个文件的第一个块（按路径排序），用于无命中时的兜底引用"""
+        with self._lock:
+            for rel in sorted(self.files):
+                doc = self.index.docs.get(f"{rel}#0") if self.index is not None else None
+                if doc is not None:
+                    return {"id": f"{rel}#0", "source": rel, "text": doc["text"], "score": 0.0}
+        return None
+
+
+_STORES: dict[str, RagIndexStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_rag_store(root: Path, create: bool = True) -> RagIndexStore | None:
+    """进程内共享的索引：首次使用时从 data/index 加载，不写盘（持久化同步见 sync_rag_store 与 rag_indexer）
+
+    尚未建过索引（manifest 或段文件缺失，如全新检出）时在内存中冷构建一次，保证检索可用。
+    """
+    key = str(Path(root))
+    store = _STORES.get(key)
+    if store is not None or not create:
+        return store
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = RagIndexStore(Path(key))
+            if not store.load() or not store.files:
+                store.sync(persist=False)
+            _STORES[key] = store
+    return store
+
+
+def sync_rag_store(root: Path) -> dict:
+    """启动时调用：加载共享索引并增量同步知识库（会写 data/index）；目录只读时保留已加载的索引"""
+    store = get_rag_store(root)
+    try:
+        return store.sync()
+    except OSError:
+        return {}
+
+
+def track_written_file(root: Path, path) -> str | None:
+    """登记 tool_file_write 写入的文件（追加一行到 tracked.txt）；本进程已加载索引时只在内存中更新该文件
+
+    manifest 与段文件只由启动同步或索引命令写出，多个工作进程不会互相覆盖。
+    """
+    root = Path(root)
+    rel = _relative(root, path)
+    if rel is None or rel.startswith("data/index/"):
+        return None
+    in_docs = rel.startswith("data/docs/") and Path(rel).suffix.lower() in DOC_SUFFIXES
+    if not in_docs and rel not in _tracked(root):
+        tracked = tracked_path(root)
+        tracked.parent.mkdir(parents=True, exist_ok=True)
+        with open(tracked, "a", encoding="utf-8") as f:
+            f.write(rel + "\n")
+    store = get_rag_store(root, create=False)
+    if store is not None:
+        store.sync([rel], persist=False)
+    return rel
+
+
+def clear_rag_stores():
+    with _STORES_LOCK:
+        _STORES.clear()
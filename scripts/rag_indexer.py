@@ -0,0 +1,37 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# 以脚本方式运行时确保项目根目录在 sys.path 中
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from scripts.rag_index import RagIndexStore
+
+
+def run_indexer(root: Path | None = None, full: bool = False, paths: list[str] | None = None) -> dict:
+    """增量更新知识库索引并返回统计（added/updated/deleted/unchanged/files/chunks/ms）
+
+    只读写 manifest 与变化文件的段文件，不在内存中加载整个倒排索引。
+    """
+    store = RagIndexStore(Path(root or ROOT), with_index=False)
+    if full or not store.load():
+        return store.rebuild()
+    return store.sync(paths or None)
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Incrementally index data/docs and files written by file_write for BM25 retrieval")
+    ap.add_argument("--root", default=str(ROOT), help="Project root (default: repository root)")
+    ap.add_argument("--full", action="store_true", help="Drop the existing index and rebuild from scratch")
+    ap.add_argument("paths", nargs="*", help="Only re-check these files (default: scan all sources)")
+    args = ap.parse_args(argv)
+    stats = run_indexer(Path(args.root), full=args.full, paths=args.paths)
+    print(json.dumps(stats, ensure_ascii=False))
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶：容量 capacity，按 refill_per_second 连续补充
+
+    预留（reserve）允许余额为负：调用方按返回的等待时长休眠后再发起请求，
+    后到的请求自然排在前面请求之后，保证按到达顺序公平放行。
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+        self._updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """取得 amount 个令牌需等待的秒数（不扣减）"""
+        self._refill()
+        deficit = float(amount) - self._tokens
+        if deficit <= 0:
+            return 0.0
+        if self.refill_per_second <= 0:
+            return float("inf")
+        return deficit / self.refill_per_second
+
+    def take(self, amount: float):
+        self._tokens -= float(amount)
+
+
+class ProviderRateLimiter:
+    """提供方级限流：同时满足每分钟请求数（rpm）与每分钟token数（tpm）"""
+
+    def __init__(self, rpm: int | None = None, tpm: int | None = None, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self.rpm_bucket = TokenBucket(rpm, rpm / 60.0, clock) if rpm else None
+        self.tpm_bucket = TokenBucket(tpm, tpm / 60.0, clock) if tpm else None
+
+    def reserve(self, tokens: int = 0, max_wait_seconds: float = 0.0) -> float | None:
+        """预留一次请求额度；返回需等待的秒数，等待超过 max_wait_seconds 时不预留并返回 None"""
+        with self._lock:
+            waits = [0.0]
+            if self.rpm_bucket:
+                waits.append(self.rpm_bucket.wait_for(1))
+            if self.tpm_bucket and tokens:
+                # 单次请求超过桶容量时按满桶计，避免永远无法放行
+                waits.append(self.tpm_bucket.wait_for(min(tokens, self.tpm_bucket.capacity)))
+            wait = max(waits)
+            if wait > max_wait_seconds:
+                return None
+            if self.rpm_bucket:
+                self.rpm_bucket.take(1)
+            if self.tpm_bucket and tokens:
+                self.tpm_bucket.take(min(tokens, self.tpm_bucket.capacity))
+            return wait
+
+    def acquire(self, tokens: int = 0, max_wait_seconds: float = 0.0) -> bool:
+        """同步获取：必要时阻塞等待；超出等待上限返回 False"""
+        wait = self.reserve(tokens, max_wait_seconds)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def async_acquire(self, tokens: int = 0, max_wait_seconds: float = 0.0) -> bool:
+        """异步获取：等待期间不阻塞事件循环"""
+        wait = self.reserve(tokens, max_wait_seconds)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+_LIMITERS: dict[str, tuple] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider: str, rate_limits: dict | None) -> ProviderRateLimiter | None:
+    """按提供方获取共享限流器；registry 未声明 rate_limits 时返回 None（不限流）"""
+    rl = rate_limits or {}
+    rpm = int(rl.get("rpm") or 0)
+    tpm = int(rl.get("tpm") or 0)
+    if not rpm and not tpm:
+        return None
+    with _LIMITERS_LOCK:
+        cached = _LIMITERS.get(provider)
+        # 配置变化时重建限流器
+        if cached is None or cached[0] != (rpm, tpm):
+            cached = ((rpm, tpm), ProviderRateLimiter(rpm=rpm or None, tpm=tpm or None))
+            _LIMITERS[provider] = cached
+        return cached[1]
+
+
+def reset_rate_limiters():
+    with _LIMITERS_LOCK:
+        _LIMITERS.clear()
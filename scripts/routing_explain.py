@@ -49,7 +49,7 @@ def _summarize_session(events: List[Dict[str, Any]]) -> Dict[str, Any]:
 
 
 def explain_routing(tool: str | None = None, session_id: str | None = None) -> Dict[str, Any]:
-    registry = poc.load_yaml(poc.ROOT / "config" / "models" / "registry.yaml")
+    registry = poc.current_config().registry
     routing = poc.load_routing_config()
     providers = registry.get("providers", {})
     ordered = poc.select_providers_for_tool(registry, routing, tool)
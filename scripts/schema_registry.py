@@ -0,0 +1,97 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from jsonschema import Draft202012Validator
+from jsonschema.exceptions import best_match
+
+
+class ValidatorRegistry:
+    """预编译的 JSON Schema 校验器注册表
+
+    每个Schema只做一次 check_schema 并构建一个 Draft 2020-12 校验器，热路径上直接复用。
+    校验器先按Schema对象身份查找，再按内容哈希查找，因此每次重新加载出的等价Schema也共享同一个校验器。
+    文件Schema按 (路径, mtime) 缓存，文件修改后自动重新编译。
+    """
+
+    def __init__(self, format_checker: bool = False, max_entries: int = 256):
+        self.format_checker = Draft202012Validator.FORMAT_CHECKER if format_checker else None
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        # id(schema) -> (schema, validator)；持有 schema 引用，保证 id 不会被复用
+        self._by_id: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_content: "OrderedDict[str, Draft202012Validator]" = OrderedDict()
+        self._files: dict[str, tuple] = {}
+
+    def _remember(self, table: OrderedDict, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def get(self, schema: dict) -> Draft202012Validator:
+        with self._lock:
+            entry = self._by_id.get(id(schema))
+            if entry is not None and entry[0] is schema:
+                self._by_id.move_to_end(id(schema))
+                return entry[1]
+        content = json.dumps(schema, ensure_ascii=False, sort_keys=True)
+        with self._lock:
+            validator = self._by_content.get(content)
+        if validator is None:
+            Draft202012Validator.check_schema(schema)
+            validator = Draft202012Validator(schema, format_checker=self.format_checker)
+        with self._lock:
+            self._remember(self._by_content, content, validator)
+            self._remember(self._by_id, id(schema), (schema, validator))
+        return validator
+
+    def load_file(self, path: Path) -> dict:
+        """读取并缓存JSON Schema文件；文件不存在时抛出 FileNotFoundError"""
+        return self._file_entry(Path(path))[0]
+
+    def for_file(self, path: Path) -> Draft202012Validator:
+        return self._file_entry(Path(path))[1]
+
+    def _file_entry(self, path: Path):
+        mtime = path.stat().st_mtime_ns
+        key = str(path)
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is not None and entry[0] == mtime:
+                return entry[1], entry[2]
+        with open(path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        validator = self.get(schema)
+        with self._lock:
+            self._files[key] = (mtime, schema, validator)
+        return schema, validator
+
+    def precompile(self, schemas) -> int:
+        """预先编译一批Schema（如服务启动 fork 前），返回编译的数量"""
+        count = 0
+        for schema in schemas:
+            if isinstance(schema, dict):
+                self.get(schema)
+                count += 1
+        return count
+
+    def validate(self, instance, schema: dict):
+        """与 jsonschema.validate 语义一致：不合法时抛出最相关的 ValidationError"""
+        error = best_match(self.get(schema).iter_errors(instance))
+        if error is not None:
+            raise error
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_content.clear()
+            self._files.clear()
+
+
+_REGISTRY = ValidatorRegistry()
+
+
+def get_validator_registry() -> ValidatorRegistry:
+    return _REGISTRY
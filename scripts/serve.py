@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from http import HTTPStatus
+from pathlib import Path
+
+# 以脚本方式运行时确保项目根目录在 sys.path 中
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from scripts import poc_local_validate as poc
+from scripts.async_runtime import close_loop_resources
+from scripts.config_reload import ConfigReloader
+from scripts.http_pool import http_pool_stats
+from scripts.rag_index import sync_rag_store
+from scripts.schema_registry import get_validator_registry
+
+
+MAX_BODY_BYTES = 1 << 20
+KEEPALIVE_SECONDS = 15.0
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def load_pipeline_state() -> dict:
+    """启动时一次性构建配置快照（注册表、路由、护栏、工具Schema与输出Schema），供所有请求（及 fork 出的工作进程）复用
+
+    输出Schema与工具Schema的校验器在此预编译，知识库索引在此同步，fork 出的工作进程通过写时复制直接共享。
+    """
+    snapshot = poc.current_config()
+    get_validator_registry().precompile([snapshot.output_schema, *snapshot.tool_schemas.values()])
+    sync_rag_store(poc.ROOT)
+    return {
+        "config": snapshot,
+        "registry": snapshot.registry,
+        "routing": snapshot.routing,
+        "tool_schemas": snapshot.tool_schemas,
+        "schema": snapshot.output_schema,
+    }
+
+
+def _current_state(state: dict) -> dict:
+    """配置热加载后以新快照刷新共享状态；已开始的请求仍持有旧快照"""
+    snapshot = state.get("config")
+    if snapshot is None:
+        return state
+    current = poc.get_config_snapshot(snapshot.root)
+    if current is not snapshot:
+        state.update(config=current, registry=current.registry, routing=current.routing, tool_schemas=current.tool_schemas, schema=current.output_schema)
+    return state
+
+
+async def _readline(reader: asyncio.StreamReader, status: int, message: str) -> bytes:
+    """读取一行；超过 StreamReader 的行长度上限时转换为 HttpError"""
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HttpError(status, message)
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """读取一个HTTP/1.1请求；连接关闭时返回 None"""
+    line = await _readline(reader, 400, "request line too long")
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        raw = await _readline(reader, 431, "request header too large")
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = raw.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "invalid content-length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], version, headers, body
+
+
+def _encode_response(status: int, payload: dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def _answer(state: dict, body: bytes, logger=None) -> dict:
+    try:
+        req = json.loads(body.decode("utf-8") or "{}")
+    except Exception:
+        raise HttpError(400, "body must be JSON")
+    prompt = req.get("prompt") if isinstance(req, dict) else None
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise HttpError(400, "prompt required")
+    timeout_ms = req.get("timeout_ms")
+    if timeout_ms is not None and (not isinstance(timeout_ms, (int, float)) or timeout_ms <= 0):
+        raise HttpError(400, "timeout_ms must be positive number")
+    # 调用方给出的超时作为请求级截止时间，与 max_latency_ms_total 取较早者
+    deadline = time.monotonic() + float(timeout_ms) / 1000.0 if timeout_ms else None
+    state = _current_state(state)
+    with poc.request_context(deadline=deadline, config=state.get("config")):
+        return await poc.async_run_pipeline(
+            prompt,
+            registry=state["registry"],
+            routing=state["routing"],
+            tool_schemas=state["tool_schemas"],
+            schema=state["schema"],
+            logger=logger,
+            session_id=req.get("session_id"),
+        )
+
+
+async def dispatch(state: dict, method: str, path: str, body: bytes, logger=None):
+    """路由请求；返回 (status, payload)。GET /stats 返回本工作进程的连接池统计"""
+    if path == "/healthz":
+        if method != "GET":
+            raise HttpError(405, "method not allowed")
+        return 200, {"ok": True, "pid": os.getpid()}
+    if path == "/stats":
+        if method != "GET":
+            raise HttpError(405, "method not allowed")
+        return 200, {"pid": os.getpid(), "config_version": poc.current_config().version, "http_pools": http_pool_stats()}
+    if path == "/answer":
+        if method != "POST":
+            raise HttpError(405, "method not allowed")
+        return 200, await _answer(state, body, logger)
+    raise HttpError(404, "not found")
+
+
+def make_handler(state: dict, concurrency: int = 32, logger=None):
+    """创建连接处理协程：支持 keep-alive，同一工作进程内最多 concurrency 个流水线并发执行"""
+    limiter = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    req = await asyncio.wait_for(_read_request(reader), timeout=KEEPALIVE_SECONDS)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HttpError as e:
+                    writer.write(_encode_response(e.status, {"error": e.message}, False))
+                    await writer.drain()
+                    break
+                if req is None:
+                    break
+                method, path, version, headers, body = req
+                conn = headers.get("connection", "").lower()
+                keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+                try:
+                    async with limiter:
+                        status, payload = await dispatch(state, method, path, body, logger)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    if logger:
+                        logger.exception(f"serve_request_failed; path={path}")
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                writer.write(_encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    return handle
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """在父进程中绑定监听套接字，工作进程继承后共同 accept"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(512)
+    sock.setblocking(False)
+    return sock
+
+
+async def _serve_socket(sock: socket.socket, state: dict, concurrency: int, reload_interval: float = 0.0):
+    logger = poc.setup_logger()
+    # 每个工作进程各自轮询配置文件，校验通过后原子替换本进程的快照
+    reloader = ConfigReloader(poc.ROOT, reload_interval, logger).start() if reload_interval > 0 else None
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+    server = await asyncio.start_server(make_handler(state, concurrency, logger), sock=sock)
+    try:
+        await stop.wait()
+    finally:
+        if reloader:
+            reloader.stop()
+        server.close()
+        await server.wait_closed()
+        await close_loop_resources()
+
+
+def _worker_main(sock: socket.socket, state: dict, concurrency: int, reload_interval: float = 0.0):
+    asyncio.run(_serve_socket(sock, state, concurrency, reload_interval))
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080, workers: int = 1, concurrency: int = 32, reload_interval: float = 2.0):
+    """启动服务：父进程加载配置并绑定端口后 fork 出 workers 个工作进程
+
+    工作进程通过写时复制共享已加载的配置与Schema，各自持有事件循环与连接池；
+    reload_interval > 0 时各工作进程按该间隔检查配置文件并热加载；平台不支持 fork 时退化为单进程。
+    """
+    state = load_pipeline_state()
+    sock = bind_socket(host, port)
+    bound_port = sock.getsockname()[1]
+    workers = max(1, int(workers))
+    if workers > 1 and not hasattr(os, "fork"):
+        print("当前平台不支持 fork，以单进程模式运行")
+        workers = 1
+    print(f"服务已启动: http://{host}:{bound_port} (workers={workers})", flush=True)
+    if workers == 1:
+        _worker_main(sock, state, concurrency, reload_interval)
+        return
+    mp = multiprocessing.get_context("fork")
+
+    def spawn():
+        p = mp.Process(target=_worker_main, args=(sock, state, concurrency, reload_interval), daemon=True)
+        p.start()
+        return p
+
+    procs = [spawn() for _ in range(workers)]
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    try:
+        while not stop.wait(0.5):
+            # 异常退出的工作进程自动补齐
+            for i, p in enumerate(procs):
+                if not p.is_alive():
+                    procs[i] = spawn()
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        for p in procs:
+            p.join(5)
+        sock.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve the pipeline over HTTP (POST /answer, GET /healthz)")
+    ap.add_argument("--host", default="127.0.0.1", help="Bind address")
+    ap.add_argument("--port", type=int, default=8080, help="Bind port (0 = pick a free port)")
+    ap.add_argument("--workers", type=int, default=1, help="Number of pre-forked worker processes")
+    ap.add_argument("--concurrency", type=int, default=32, help="Max concurrent pipelines per worker")
+    ap.add_argument("--reload-interval", type=float, default=2.0, help="Seconds between config file checks (0 = no hot reload)")
+    args = ap.parse_args()
+    serve(args.host, args.port, args.workers, args.concurrency, args.reload_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import asyncio
+import hashlib
+import json
+
+
+def _fingerprint(value) -> str:
+    return hashlib.sha256(json.dumps(value or {}, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def single_flight_key(prompt: str, tool: str | None, citation: str | None, schema: dict | None, registry: dict | None = None, routing: dict | None = None) -> str:
+    """按 (prompt, tool, citation, schema哈希, registry/routing哈希) 生成合并键；路由配置不同的请求不会共享结果"""
+    raw = json.dumps([prompt, tool or "auto", citation, _fingerprint(schema), _fingerprint(registry), _fingerprint(routing)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """合并同一事件循环上并发的相同请求：同一 key 同时只执行一次，其余调用方等待并共享结果
+
+    领头请求被取消时，等待者重新竞争执行，而不是一起失败。
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, factory, timeout: float | None = None):
+        """执行 factory() 返回的协程；返回 (result, shared)，shared 为 True 表示复用了在途请求的结果
+
+        timeout 限制等待在途请求的时间（秒），超时抛出 asyncio.TimeoutError，在途请求不受影响。
+        """
+        while True:
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            try:
+                return await asyncio.wait_for(asyncio.shield(fut), timeout), True
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                cancelling = getattr(task, "cancelling", None)
+                # 自身被取消时照常抛出；仅领头请求被取消时重试
+                if not fut.cancelled() or (cancelling is not None and cancelling()):
+                    raise
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # 无等待者时避免 "exception was never retrieved" 告警
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result, False
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
@@ -0,0 +1,166 @@
+import json
+
+from jsonschema.exceptions import best_match
+
+from scripts.schema_registry import get_validator_registry
+
+
+# 非对象JSON值的起始字符（数组、字符串、数字）
+_NON_OBJECT_STARTS = set('["-0123456789')
+
+
+class StreamingJSONValidator:
+    """增量解析流式输出的JSON，在明显违反输出Schema时尽早中止
+
+    逐字符扫描顶层对象（跟踪字符串/转义/嵌套深度），在以下情况返回错误：
+    - 顶层值不是对象（Schema 要求 type=object）
+    - 出现 Schema 未声明的顶层键（additionalProperties=false）
+    - 某个顶层字段的值完整后不符合其子Schema
+    - citations 完整后不包含必须的参考文本
+    - 顶层对象结束时缺少必填字段
+    输出以非JSON文本开头（如解释性前缀）时退化为不做提前校验，交由完整校验处理。
+    """
+
+    def __init__(self, schema: dict, citation: str | None = None):
+        self.schema = schema or {}
+        self.citation = citation
+        self.properties = self.schema.get("properties") or {}
+        self.required = list(self.schema.get("required") or [])
+        self.closed = self.schema.get("additionalProperties") is False
+        self.buf: list[str] = []
+        self.error: str | None = None
+        self.done = False
+        self.passive = False
+        self._started = False
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._expect_key = False
+        self._key_start: int | None = None
+        self._key: str | None = None
+        self._value_start: int | None = None
+        self._seen_keys: set[str] = set()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buf)
+
+    def feed(self, chunk: str) -> bool:
+        """输入一个增量片段；返回 False 表示应中止流（self.error 给出原因）"""
+        if self.error:
+            return False
+        for ch in chunk or "":
+            self.buf.append(ch)
+            if self.done or self.passive:
+                continue
+            if not self._started:
+                self._scan_preamble()
+            else:
+                self._scan(ch, len(self.buf) - 1)
+            if self.error:
+                return False
+        return True
+
+    def _scan_preamble(self):
+        head = self.text.lstrip()
+        if not head:
+            return
+        if head.startswith("`"):
+            # 代码块围栏：等待围栏行结束
+            if len(head) < 3 or (head.startswith("```") and "\n" not in head):
+                return
+            if not head.startswith("```"):
+                self.passive = True
+                return
+            head = head.split("\n", 1)[1].lstrip()
+            if not head:
+                return
+        first = head[0]
+        if first == "{":
+            self._started = True
+            start = len(self.buf) - len(head)
+            for i in range(start, len(self.buf)):
+                self._scan(self.buf[i], i)
+                if self.error or self.done:
+                    return
+            return
+        if self.schema.get("type") == "object" and first in _NON_OBJECT_STARTS:
+            self.error = "输出顶层不是JSON对象"
+            return
+        self.passive = True
+
+    def _scan(self, ch: str, i: int):
+        if self._in_str:
+            if self._esc:
+                self._esc = False
+            elif ch == "\\":
+                self._esc = True
+            elif ch == '"':
+                self._in_str = False
+                if self._key_start is not None:
+                    self._on_key(json.loads("".join(self.buf[self._key_start : i + 1])))
+                    self._key_start = None
+                elif self._depth == 1:
+                    # 顶层字符串值已完整，无需等待后续逗号
+                    self._on_value_end(i + 1)
+            return
+        if ch == '"':
+            self._in_str = True
+            if self._depth == 1 and self._expect_key:
+                self._key_start = i
+            return
+        if ch in "{[":
+            self._depth += 1
+            if self._depth == 1:
+                self._expect_key = True
+            return
+        if ch in "}]":
+            if self._depth == 1 and ch == "}":
+                self._on_value_end(i)
+                self._depth = 0
+                self._on_object_end()
+                return
+            self._depth -= 1
+            if self._depth == 1:
+                # 顶层数组/对象值已完整
+                self._on_value_end(i + 1)
+            return
+        if self._depth == 1:
+            if ch == ":":
+                self._value_start = i + 1
+            elif ch == ",":
+                self._on_value_end(i)
+                self._expect_key = True
+
+    def _on_key(self, key: str):
+        self._expect_key = False
+        self._key = key
+        self._seen_keys.add(key)
+        if self.closed and self.properties and key not in self.properties:
+            self.error = f"输出包含Schema未声明的字段: {key}"
+
+    def _on_value_end(self, i: int):
+        key, start = self._key, self._value_start
+        self._key, self._value_start = None, None
+        if key is None or start is None:
+            return
+        raw = "".join(self.buf[start:i]).strip()
+        try:
+            value = json.loads(raw)
+        except Exception:
+            self.error = f"字段 {key} 的值不是合法JSON"
+            return
+        sub = self.properties.get(key)
+        if isinstance(sub, dict) and sub:
+            err = best_match(get_validator_registry().get(sub).iter_errors(value))
+            if err is not None:
+                self.error = f"字段 {key} 不符合Schema: {err.message}"
+                return
+        if key == "citations" and self.citation and isinstance(value, list) and self.citation not in value:
+            self.error = "citations缺少必须参考"
+
+    def _on_object_end(self):
+        self.done = True
+        missing = [k for k in self.required if k not in self._seen_keys]
+        if missing and not self.error:
+            self.error = f"输出缺少必填字段: {missing}"
@@ -0,0 +1,15 @@
+import re
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[㐀-鿿豈-﫿]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """中英混合分词：英文/数字按词（小写），连续汉字切成相邻二元组（单个汉字保留原字）"""
+    tokens: list[str] = []
+    for run in _TOKEN_RE.findall((text or "").lower()):
+        if run[0].isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
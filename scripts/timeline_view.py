@@ -49,6 +49,7 @@ def summarize_events(events: List[Dict]) -> Dict:
             "p95": None,
         },
         "provider_success_rate": None,
+        "first_token_ms": None,
     }
     # 事件计数
     from collections import Counter
@@ -82,6 +83,11 @@ def summarize_events(events: List[Dict]) -> Dict:
             "p50": round(pct(0.5), 2),
             "p95": round(pct(0.95), 2),
         }
+    # 首token延迟：流式结构化输出的 first_token 事件
+    ttfts = [float((e.get("details") or {}).get("ttft_ms")) for e in events
+             if e.get("event") == "first_token" and isinstance((e.get("details") or {}).get("ttft_ms"), (int, float))]
+    if ttfts:
+        summary["first_token_ms"] = {"count": len(ttfts), "avg": round(sum(ttfts) / len(ttfts), 2), "min": min(ttfts)}
     return summary
 
 
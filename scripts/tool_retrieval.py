@@ -0,0 +1,74 @@
+import json
+import math
+import threading
+from collections import Counter
+
+from scripts.config_loader import FrozenDict
+from scripts.text_tokens import tokenize
+
+
+def compact_schema(schema: dict) -> dict:
+    """规划器提示用的精简Schema：去掉 $schema 与 title（工具名已给出），其余约束保持不变"""
+    return {k: v for k, v in (schema or {}).items() if k not in ("$schema", "title")}
+
+
+def _schema_text(name: str, schema: dict) -> str:
+    parts = [name.replace("_", " "), str(schema.get("title") or ""), str(schema.get("description") or "")]
+    for prop, spec in (schema.get("properties") or {}).items():
+        # 过短的参数名（如 a、b）不参与匹配
+        if len(prop) >= 3:
+            parts.append(prop.replace("_", " "))
+        if isinstance(spec, dict) and spec.get("description"):
+            parts.append(str(spec["description"]))
+    return " ".join(parts)
+
+
+class ToolIndex:
+    """按工具名、标题、描述与参数名建立的关键词索引，用于为规划器预选候选工具
+
+    得分为命中词的 IDF 之和（每个词只计一次），只在少数工具中出现的词权重更高。
+    """
+
+    def __init__(self, tool_schemas: dict):
+        self.names = sorted(tool_schemas)
+        self._terms = {name: set(tokenize(_schema_text(name, tool_schemas[name] or {}))) for name in self.names}
+        df = Counter(t for terms in self._terms.values() for t in terms)
+        n = len(self.names)
+        self._idf = {t: math.log(1 + n / c) for t, c in df.items()}
+
+    def rank(self, prompt: str) -> list[tuple[str, float]]:
+        """返回得分大于0的 (工具名, 得分)，按得分降序、名称升序"""
+        query = set(tokenize(prompt))
+        scored = []
+        for name in self.names:
+            score = sum(self._idf[t] for t in query & self._terms[name])
+            if score > 0:
+                scored.append((name, score))
+        scored.sort(key=lambda x: (-x[1], x[0]))
+        return scored
+
+    def top_k(self, prompt: str, k: int) -> list[str]:
+        return [name for name, _s in self.rank(prompt)[: max(0, int(k))]]
+
+
+# 键：配置快照的只读目录按对象身份（id），普通 dict 按内容（JSON）；值为 (目录对象, 索引)
+_INDEXES: dict = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_tool_index(tool_schemas: dict) -> ToolIndex:
+    """缓存工具索引：配置快照的只读目录（FrozenDict）按对象身份复用，热路径上不再序列化整个目录；
+    可修改的 dict 仍按内容缓存"""
+    frozen = isinstance(tool_schemas, FrozenDict)
+    key = id(tool_schemas) if frozen else json.dumps(tool_schemas, ensure_ascii=False, sort_keys=True)
+    with _INDEXES_LOCK:
+        entry = _INDEXES.get(key)
+    # 缓存项持有目录对象，id 不会被复用；仍核对身份以防万一
+    if entry is not None and (not frozen or entry[0] is tool_schemas):
+        return entry[1]
+    index = ToolIndex(tool_schemas)
+    with _INDEXES_LOCK:
+        if len(_INDEXES) >= 8:
+            _INDEXES.clear()
+        _INDEXES[key] = (tool_schemas, index)
+    return index
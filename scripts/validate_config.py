@@ -1,3 +1,4 @@
+import re
 import sys
 import json
 from pathlib import Path
@@ -23,9 +24,17 @@ def validate_registry(registry: dict) -> List[Dict]:
     for name, cfg in providers.items():
         if not cfg.get("model"):
             issues.append({"severity": "error", "message": f"provider '{name}' missing model"})
+        transport = cfg.get("transport")
+        if transport is not None and transport not in {"dashscope", "openai_compatible"}:
+            issues.append({"severity": "error", "message": f"provider '{name}' transport must be one of ['dashscope','openai_compatible']"})
         caps = cfg.get("capabilities") or []
         if not isinstance(caps, list):
             issues.append({"severity": "error", "message": f"provider '{name}' capabilities must be a list"})
+        rl = cfg.get("rate_limits") or {}
+        for k in ("rpm", "tpm"):
+            v = rl.get(k) if isinstance(rl, dict) else None
+            if v is not None and (not isinstance(v, int) or v < 0):
+                issues.append({"severity": "error", "message": f"provider '{name}' rate_limits.{k} must be a non-negative integer"})
     return issues
 
 
@@ -41,6 +50,44 @@ def _validate_policies(policies: dict, path: str) -> List[Dict]:
         v = policies.get("max_latency_ms_total")
         if not isinstance(v, (int, float)) or v < 0:
             issues.append({"severity": "error", "message": f"{path}.max_latency_ms_total must be non-negative number"})
+    if "hedge_after_ms" in policies:
+        v = policies.get("hedge_after_ms")
+        if not isinstance(v, (int, float)) or v < 0:
+            issues.append({"severity": "error", "message": f"{path}.hedge_after_ms must be non-negative number"})
+        lat = policies.get("max_latency_ms")
+        if isinstance(v, (int, float)) and isinstance(lat, (int, float)) and v >= lat:
+            issues.append({"severity": "warning", "message": f"{path}.hedge_after_ms ({v}) >= max_latency_ms ({lat}); hedging will never fire before the latency policy"})
+    if "circuit_breaker" in policies:
+        cb = policies.get("circuit_breaker")
+        if not isinstance(cb, dict):
+            issues.append({"severity": "error", "message": f"{path}.circuit_breaker must be a mapping"})
+        else:
+            backend = cb.get("backend", "memory")
+            if backend not in {"memory", "sqlite"}:
+                issues.append({"severity": "error", "message": f"{path}.circuit_breaker.backend must be one of ['memory','sqlite']"})
+            for k in ("failure_threshold", "cooldown_seconds"):
+                v = cb.get(k)
+                if v is not None and (not isinstance(v, (int, float)) or v < 0):
+                    issues.append({"severity": "error", "message": f"{path}.circuit_breaker.{k} must be non-negative number"})
+    if "rate_limit_max_wait_ms" in policies:
+        v = policies.get("rate_limit_max_wait_ms")
+        if not isinstance(v, (int, float)) or v < 0:
+            issues.append({"severity": "error", "message": f"{path}.rate_limit_max_wait_ms must be non-negative number"})
+    if "stream" in policies and not isinstance(policies.get("stream"), bool):
+        issues.append({"severity": "error", "message": f"{path}.stream must be boolean"})
+    if "single_flight" in policies and not isinstance(policies.get("single_flight"), bool):
+        issues.append({"severity": "error", "message": f"{path}.single_flight must be boolean"})
+    for k in ("cache_ttl_seconds", "plan_cache_ttl_seconds"):
+        if k in policies:
+            v = policies.get(k)
+            if not isinstance(v, (int, float)) or v < 0:
+                issues.append({"severity": "error", "message": f"{path}.{k} must be non-negative number"})
+    if "planner_top_k" in policies:
+        v = policies.get("planner_top_k")
+        if not isinstance(v, int) or isinstance(v, bool) or v < 0:
+            issues.append({"severity": "error", "message": f"{path}.planner_top_k must be non-negative integer"})
+    if "planner_catalogue" in policies and policies.get("planner_catalogue") not in {"prefix", "shortlist"}:
+        issues.append({"severity": "error", "message": f"{path}.planner_catalogue must be one of ['prefix', 'shortlist']"})
     if "on_sla_timeout" in policies:
         v = policies.get("on_sla_timeout")
         if v not in {"degrade", "abort"}:
@@ -56,14 +103,22 @@ def _validate_policies(policies: dict, path: str) -> List[Dict]:
     return issues
 
 
-def validate_routing(routing: dict, registry: dict) -> List[Dict]:
+def validate_routing(routing: dict, registry: dict, root: Path | None = None) -> List[Dict]:
     issues = []
     providers = set((registry.get("providers") or {}).keys())
     # strategy type and weights
     strategy = (routing.get("strategy") or {})
     stype = strategy.get("type")
-    if stype is not None and stype not in {"weighted"}:
-        issues.append({"severity": "warning", "message": f"strategy.type '{stype}' is not recognized; supported: ['weighted']"})
+    if stype is not None and stype not in {"weighted", "latency_aware", "p2c", "weighted_random"}:
+        issues.append({"severity": "warning", "message": f"strategy.type '{stype}' is not recognized; supported: ['weighted', 'latency_aware', 'p2c', 'weighted_random']"})
+    if "error_penalty" in strategy:
+        v = strategy.get("error_penalty")
+        if not isinstance(v, (int, float)) or v < 0:
+            issues.append({"severity": "error", "message": "strategy.error_penalty must be non-negative number"})
+    if "stats_half_life_seconds" in strategy:
+        v = strategy.get("stats_half_life_seconds")
+        if not isinstance(v, (int, float)) or isinstance(v, bool) or v < 0:
+            issues.append({"severity": "error", "message": "strategy.stats_half_life_seconds must be non-negative number"})
     weights = (strategy.get("weights")) or {}
     for p in weights.keys():
         if p not in providers:
@@ -87,6 +142,20 @@ def validate_routing(routing: dict, registry: dict) -> List[Dict]:
             issues.append({"severity": "error", "message": f"fallback_chain includes unknown provider '{p}'"})
     # global policies
     issues.extend(_validate_policies(routing.get("policies") or {}, "policies"))
+    # llm_cache
+    llm_cache = routing.get("llm_cache")
+    if llm_cache is not None:
+        if not isinstance(llm_cache, dict):
+            issues.append({"severity": "error", "message": "llm_cache must be a mapping"})
+        else:
+            if "enabled" in llm_cache and not isinstance(llm_cache.get("enabled"), bool):
+                issues.append({"severity": "error", "message": "llm_cache.enabled must be boolean"})
+            me = llm_cache.get("max_entries")
+            if me is not None and (not isinstance(me, int) or me <= 0):
+                issues.append({"severity": "error", "message": "llm_cache.max_entries must be positive integer"})
+            disk = llm_cache.get("disk")
+            if disk is not None and not isinstance(disk, dict):
+                issues.append({"severity": "error", "message": "llm_cache.disk must be a mapping"})
     # task_routing
     tr = routing.get("task_routing") or {}
     by_tool = tr.get("by_tool") or {}
@@ -123,7 +192,7 @@ def validate_routing(routing: dict, registry: dict) -> List[Dict]:
                 issues.append({"severity": "error", "message": f"task_routing.policies.{tool}.required_capabilities={req_caps} has no satisfying providers among candidates {candidates}"})
 
     # optional: tool schema awareness
-    tools_dir = ROOT / "config" / "tools" / "schema"
+    tools_dir = (root or ROOT) / "config" / "tools" / "schema"
     try:
         known_tools = []
         if tools_dir.exists() and tools_dir.is_dir():
@@ -152,12 +221,39 @@ def validate_routing(routing: dict, registry: dict) -> List[Dict]:
     return issues
 
 
-def validate_all() -> Tuple[bool, List[Dict]]:
-    registry = load_yaml(ROOT / "config" / "models" / "registry.yaml")
-    routing = load_yaml(ROOT / "config" / "routing.yaml")
+def validate_tool_rules(path: Path) -> List[Dict]:
+    """校验快速规划规则：正则可编译，目标工具存在Schema"""
+    issues: List[Dict] = []
+    if not path.exists():
+        return issues
+    data = load_yaml(path) or {}
+    rules = data.get("rules")
+    if not isinstance(rules, list):
+        return [{"severity": "error", "message": "tools/rules.yaml: rules must be a list"}]
+    tools_dir = path.parent / "schema"
+    for i, rule in enumerate(rules):
+        if not isinstance(rule, dict) or not rule.get("tool") or not rule.get("pattern"):
+            issues.append({"severity": "error", "message": f"tools/rules.yaml: rules[{i}] requires tool and pattern"})
+            continue
+        for k in ("pattern", "when"):
+            if rule.get(k):
+                try:
+                    re.compile(rule[k])
+                except re.error as e:
+                    issues.append({"severity": "error", "message": f"tools/rules.yaml: rules[{i}].{k} invalid regex: {e}"})
+        if not any((tools_dir / f"{rule['tool']}{ext}").exists() for ext in (".json", ".yaml", ".yml")):
+            issues.append({"severity": "warning", "message": f"tools/rules.yaml: rules[{i}] references tool '{rule['tool']}' without a schema file"})
+    return issues
+
+
+def validate_all(root: Path | None = None) -> Tuple[bool, List[Dict]]:
+    root = Path(root or ROOT)
+    registry = load_yaml(root / "config" / "models" / "registry.yaml")
+    routing = load_yaml(root / "config" / "routing.yaml")
     issues = []
     issues.extend(validate_registry(registry))
-    issues.extend(validate_routing(routing, registry))
+    issues.extend(validate_routing(routing, registry, root))
+    issues.extend(validate_tool_rules(root / "config" / "tools" / "rules.yaml"))
     ok = not any(i.get("severity") == "error" for i in issues)
     return ok, issues
 
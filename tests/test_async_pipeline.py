@@ -0,0 +1,60 @@
+import asyncio
+import json
+from scripts import poc_local_validate as poc
+
+
+def _ok_answer(tool_used="calc", result=46.0):
+    return json.dumps({
+        "answer": "结果为46",
+        "citations": ["ref"],
+        "tool_used": tool_used,
+        "tool_result": {"result": result}
+    }, ensure_ascii=False)
+
+
+def test_async_failover_moves_to_next_provider(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    registry = {"providers": {"p1": {"model": "m1"}, "p2": {"model": "m2"}}}
+
+    async def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        if model_name == "m1":
+            return None
+        return _ok_answer()
+
+    monkeypatch.setattr(poc, "async_llm_text", fake_llm)
+    monkeypatch.setattr(poc.asyncio, "sleep", _no_sleep)
+    out, provider, model, tried = asyncio.run(poc.async_structured_answer_with_failover(
+        ["p1", "p2"], registry, user_prompt="q", citation="ref", tool_used="calc", tool_result=46.0, schema=poc.load_output_schema(), logger=None, session_id=None
+    ))
+    assert out is not None and provider == "p2" and model == "m2"
+    assert tried[:2] == ["p1", "p2"]
+
+
+def test_async_pipeline_runs_plan_tool_and_answer(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    registry = {"default_provider": "p1", "providers": {"p1": {"model": "m1"}}}
+    routing = {"fallback_chain": ["p1"]}
+    tool_schemas = {"calc": json.loads((poc.Path(__file__).resolve().parents[1] / "config" / "tools" / "schema" / "calc.json").read_text(encoding="utf-8"))}
+
+    async def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        if "工具规划器" in system_prompt:
+            return json.dumps({"use_tool": True, "tool": "calc", "args": {"op": "add", "a": 12, "b": 34}, "reason": "math"})
+        return json.dumps({"answer": "46", "citations": [user_prompt.split("参考: ")[1].splitlines()[0]], "tool_used": "calc", "tool_result": 46.0}, ensure_ascii=False)
+
+    monkeypatch.setattr(poc, "async_llm_text", fake_llm)
+
+    async def run_many():
+        return await asyncio.gather(*[
+            poc.async_run_pipeline("请计算 12 + 34", registry=registry, routing=routing, tool_schemas=tool_schemas, schema=poc.load_output_schema())
+            for _ in range(5)
+        ])
+
+    results = asyncio.run(run_many())
+    assert len({r["session_id"] for r in results}) == 5
+    for r in results:
+        assert r["provider"] == "p1" and r["tool_used"] == "calc"
+        assert r["output"]["tool_result"] == {"result": 46.0}
+
+
+async def _no_sleep(_delay):
+    return None
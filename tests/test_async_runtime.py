@@ -0,0 +1,51 @@
+import asyncio
+import threading
+from scripts import poc_local_validate as poc
+from scripts.async_runtime import AsyncRuntime, close_loop_resources, get_runtime, loop_resource
+
+
+def test_async_run_tool_reuses_runtime_loop_and_resources(monkeypatch):
+    seen = []
+
+    async def fake_handler(args, user_prompt):
+        client = loop_resource("test.client", object)
+        seen.append((id(asyncio.get_running_loop()), id(client), threading.current_thread().name))
+        return {"ok": True}
+
+    monkeypatch.setitem(poc.ASYNC_TOOL_HANDLERS, "fake_async", fake_handler)
+    assert poc.async_run_tool("fake_async", {}, "q") == {"ok": True}
+    assert poc.async_run_tool("fake_async", {}, "q") == {"ok": True}
+    assert len(seen) == 2 and seen[0] == seen[1]
+    assert seen[0][2] != threading.current_thread().name
+
+
+def test_runtime_run_rejects_reentrant_blocking():
+    rt = AsyncRuntime(name="test-runtime")
+
+    async def inner():
+        return rt.run(asyncio.sleep(0))
+
+    try:
+        rt.run(inner())
+        raised = False
+    except RuntimeError:
+        raised = True
+    finally:
+        rt.shutdown()
+    assert raised
+
+
+def test_close_loop_resources_calls_aclose():
+    closed = []
+
+    async def closer(res):
+        closed.append(res)
+
+    async def run():
+        res = loop_resource("test.closable", lambda: "res", aclose=closer)
+        assert loop_resource("test.closable", lambda: "other") == "res"
+        await close_loop_resources()
+
+    asyncio.run(run())
+    assert closed == ["res"]
+    assert get_runtime() is get_runtime()
@@ -0,0 +1,40 @@
+import asyncio
+import json
+import yaml
+from scripts import poc_local_validate as poc
+
+
+def test_batch_runs_with_bounded_concurrency(tmp_path, monkeypatch):
+    (tmp_path / "config" / "models").mkdir(parents=True, exist_ok=True)
+    with open(tmp_path / "config" / "models" / "registry.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump({"default_provider": "p1", "providers": {"p1": {"model": "m1"}}}, f)
+    with open(tmp_path / "config" / "routing.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump({"fallback_chain": ["p1"]}, f)
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+
+    state = {"active": 0, "peak": 0}
+
+    async def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        if "工具规划器" in system_prompt:
+            return json.dumps({"use_tool": False})
+        return json.dumps({"answer": "ok", "citations": ["未检索到示例知识"], "tool_used": None, "tool_result": None}, ensure_ascii=False)
+
+    monkeypatch.setattr(poc, "async_llm_text", fake_llm)
+
+    input_path = tmp_path / "prompts.jsonl"
+    lines = [json.dumps({"id": f"q{i}", "prompt": f"问题 {i}"}, ensure_ascii=False) for i in range(6)]
+    lines.append("纯文本提示")
+    input_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    output_path = tmp_path / "out" / "results.jsonl"
+
+    counts = asyncio.run(poc.async_run_batch(input_path, output_path, concurrency=2))
+    assert counts == {"total": 7, "ok": 7, "fallback": 0, "error": 0}
+    assert state["peak"] <= 2
+    rows = [json.loads(l) for l in output_path.read_text(encoding="utf-8").splitlines()]
+    assert len(rows) == 7
+    assert {r["id"] for r in rows} == {f"q{i}" for i in range(6)} | {6}
+    assert all(r["provider"] == "p1" and "duration_ms" in r for r in rows)
@@ -0,0 +1,53 @@
+import multiprocessing
+import threading
+from scripts import poc_local_validate as poc
+from scripts.circuit_store import InMemoryBreakerStore, SQLiteBreakerStore
+
+
+def _fail_many(path, n):
+    store = SQLiteBreakerStore(path)
+    for _ in range(n):
+        with store.transaction("p1") as st:
+            st["failures"] = int(st["failures"]) + 1
+
+
+def test_memory_store_is_thread_safe():
+    store = InMemoryBreakerStore()
+
+    def work():
+        for _ in range(200):
+            with store.transaction("p1") as st:
+                st["failures"] = st["failures"] + 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.get("p1")["failures"] == 1600
+
+
+def test_sqlite_store_shared_across_processes(tmp_path):
+    path = tmp_path / "cb.sqlite"
+    SQLiteBreakerStore(path)
+    procs = [multiprocessing.Process(target=_fail_many, args=(path, 25)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    assert SQLiteBreakerStore(path).get("p1")["failures"] == 100
+
+
+def test_sqlite_backend_opens_circuit_for_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    policies = {"circuit_breaker": {"failure_threshold": 2, "cooldown_seconds": 60, "backend": "sqlite", "path": "logs/cb.sqlite"}}
+    poc._cb_record_failure("p1", policies, "llm_none", None)
+    poc._cb_record_failure("p1", policies, "llm_none", None)
+    # 另一个工作进程以独立连接读取同一文件
+    other = SQLiteBreakerStore(tmp_path / "logs" / "cb.sqlite")
+    assert other.get("p1")["state"] == "open"
+    skip, tag = poc._cb_should_skip("p1", policies, None)
+    assert skip and tag == "skip_circuit_open"
+    poc._cb_record_success("p1", None, policies)
+    assert other.get("p1")["state"] == "closed"
@@ -0,0 +1,49 @@
+import os
+import yaml
+from scripts import poc_local_validate as poc
+from scripts import serve
+from scripts.config_reload import ConfigReloader
+
+
+REGISTRY = {"providers": {"p1": {"model": "m1"}, "p2": {"model": "m2"}}, "default_provider": "p1"}
+
+
+def _write(path, data, mtime_ns):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_reload_swaps_snapshot_for_new_requests_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    _write(tmp_path / "config" / "models" / "registry.yaml", REGISTRY, 1)
+    routing = tmp_path / "config" / "routing.yaml"
+    _write(routing, {"fallback_chain": ["p1"]}, 1)
+    old = poc.current_config()
+    state = serve.load_pipeline_state()
+    reloader = ConfigReloader(tmp_path, 60)
+    assert reloader.check() is None  # 内容未变
+    _write(routing, {"fallback_chain": ["p2", "p1"]}, 2)
+    with poc.request_context(config=old):
+        assert reloader.check() is True
+        # 进行中的请求继续使用旧快照
+        assert poc.load_routing_config()["fallback_chain"] == ["p1"]
+    assert poc.load_routing_config()["fallback_chain"] == ["p2", "p1"]
+    assert serve._current_state(state)["routing"]["fallback_chain"] == ["p2", "p1"]
+    assert reloader.check() is None
+
+
+def test_invalid_config_rejected_until_fixed(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    _write(tmp_path / "config" / "models" / "registry.yaml", REGISTRY, 1)
+    routing = tmp_path / "config" / "routing.yaml"
+    _write(routing, {"fallback_chain": ["p1"]}, 1)
+    before = poc.current_config()
+    reloader = ConfigReloader(tmp_path, 60)
+    _write(routing, {"fallback_chain": ["missing"]}, 2)
+    assert reloader.check() is False
+    assert poc.current_config() is before
+    assert reloader.check() is None
+    _write(routing, {"fallback_chain": ["p2"]}, 3)
+    assert reloader.check() is True and poc.current_config().version != before.version
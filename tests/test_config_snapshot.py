@@ -0,0 +1,47 @@
+import copy
+import json
+import pickle
+import pytest
+import yaml
+from scripts import poc_local_validate as poc
+from scripts.config_loader import FrozenDict, build_snapshot, get_config_snapshot
+
+
+def _write(tmp_path, rel, data):
+    path = tmp_path / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f)
+
+
+def test_snapshot_is_immutable_and_copyable(tmp_path):
+    _write(tmp_path, "config/routing.yaml", {"policies": {"max_latency_ms": 100, "x": [1, 2]}})
+    snap = build_snapshot(tmp_path)
+    with pytest.raises(TypeError):
+        snap.routing["policies"]["max_latency_ms"] = 1
+    with pytest.raises(TypeError):
+        snap.routing["policies"]["x"].append(3)
+    mutable = copy.deepcopy(snap.routing)
+    mutable["policies"]["x"].append(3)
+    assert type(mutable["policies"]) is dict and snap.routing["policies"]["x"] == [1, 2]
+    assert json.loads(json.dumps(snap.routing)) == {"policies": {"max_latency_ms": 100, "x": [1, 2]}}
+    assert isinstance(pickle.loads(pickle.dumps(snap.routing)), FrozenDict)
+
+
+def test_yaml_read_once_per_root_and_pinned_per_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    _write(tmp_path, "config/policies/guardrails.yaml", {"tools": {"open_app": {"allowlist": ["notepad"]}}})
+    _write(tmp_path, "config/routing.yaml", {"policies": {"max_latency_ms": 100}})
+    snap = poc.current_config()
+    assert snap is get_config_snapshot(tmp_path)
+    monkeypatch.setattr(poc, "load_yaml", lambda p: pytest.fail("per-request YAML read"))
+    assert poc.load_routing_config()["policies"]["max_latency_ms"] == 100
+    assert poc.tool_open_app("calc")["error"] == "app not allowed"
+    other = build_snapshot(tmp_path)
+    with poc.request_context(config=other):
+        assert poc.current_config() is other
+    # 版本只取决于文件内容
+    assert other.version == snap.version
+    _write(tmp_path, "config/routing.yaml", {"policies": {"max_latency_ms": 200}})
+    assert build_snapshot(tmp_path).version != snap.version
+    assert poc.load_routing_config()["policies"]["max_latency_ms"] == 100
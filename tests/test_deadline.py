@@ -0,0 +1,73 @@
+import asyncio
+import time
+import yaml
+from scripts import poc_local_validate as poc
+
+
+def write_routing(tmp_path, policies):
+    (tmp_path / "config").mkdir(parents=True, exist_ok=True)
+    with open(tmp_path / "config" / "routing.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump({"policies": policies}, f, allow_unicode=True, sort_keys=False)
+
+
+def test_llm_text_timeout_is_remaining_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test-key")
+    seen = {}
+
+    def fake_dashscope(model_name, system_prompt, user_prompt, timeout=None):
+        seen["timeout"] = timeout
+        return {"ok": True, "text": "ok"}
+
+    monkeypatch.setattr(poc, "run_with_dashscope", fake_dashscope)
+    with poc.request_context(deadline=time.monotonic() + 2.0):
+        assert poc.llm_text("s", "u", "m", {}) == "ok"
+    assert 0 < seen["timeout"] <= 2.0
+    with poc.request_context(deadline=time.monotonic() - 1.0):
+        assert poc.llm_text("s", "u", "m", {}) is None
+
+
+def test_degrade_fires_at_deadline_not_after_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    write_routing(tmp_path, {"max_latency_ms_total": 300, "on_sla_timeout": "degrade"})
+
+    def hung_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        # 模拟遵守超时参数的SDK：最多阻塞到剩余预算用尽
+        time.sleep(min(3.0, poc._call_timeout(3.0)))
+        return None
+
+    monkeypatch.setattr(poc, "llm_text", hung_llm)
+    registry = {"providers": {"p1": {"model": "m1"}, "p2": {"model": "m2"}}}
+    start = time.monotonic()
+    out, provider, _m, tried = poc.structured_answer_with_failover(
+        ["p1", "p2"], registry, user_prompt="q", citation="ref", tool_used=None, tool_result=None, schema=poc.load_output_schema()
+    )
+    assert time.monotonic() - start < 1.0
+    assert provider is None and out is not None and "sla_degrade" in tried
+
+
+def test_async_llm_text_cancels_at_deadline(monkeypatch):
+    async def slow_dashscope(model_name, system_prompt, user_prompt, timeout=None):
+        await asyncio.sleep(5)
+        return {"ok": True, "text": "late"}
+
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test-key")
+    monkeypatch.setattr(poc, "async_run_with_dashscope", slow_dashscope)
+    monkeypatch.setattr(poc, "init_async_openai_compatible_client", lambda cfg: None)
+
+    async def run():
+        with poc.request_context(deadline=time.monotonic() + 0.2):
+            return await poc.async_llm_text("s", "u", "m", {})
+
+    start = time.monotonic()
+    assert asyncio.run(run()) is None
+    assert time.monotonic() - start < 1.0
+
+
+def test_retry_backoff_stops_at_deadline(monkeypatch):
+    monkeypatch.setattr(poc, "llm_text", lambda *a, **k: "not json")
+    start = time.monotonic()
+    with poc.request_context(deadline=time.monotonic() + 0.3) as ctx:
+        out = poc.ask_structured_answer("m", {}, "q", "ref", None, None, poc.load_output_schema())
+    assert out is None and ctx.attempts == 1
+    assert time.monotonic() - start < 0.3
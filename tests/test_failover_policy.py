@@ -43,3 +43,13 @@ def test_policy_allows_provider_cost_filter():
     allowed = poc.policy_allows_provider(cfg, policies, est_tokens=1000)
     assert allowed is False
 
+
+
+def test_precheck_cost_policy_matches_strategy_default():
+    # 成本策略与 _apply_strategy 一致按默认估算（1000 tokens）判断，请求的token估算只用于限流
+    policies = {"max_cost_usd_per_request": 0.01}
+    cfg = {"cost": {"input_per_1k_tokens_usd": 0.1, "output_per_1k_tokens_usd": 0.1}}
+    tried = []
+    assert poc._precheck_provider("p", cfg, policies, tried, est_tokens=10) is None
+    assert tried == ["skip_policy:p"]
+    assert poc.policy_allows_provider(cfg, policies) is False
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import time
+from scripts import poc_local_validate as poc
+
+
+ANSWER = json.dumps({
+    "answer": "ok",
+    "citations": ["ref"],
+    "tool_used": "calc",
+    "tool_result": None
+}, ensure_ascii=False)
+
+
+def write_routing(tmp_path, hedge_after_ms):
+    routing = {"task_routing": {"policies": {"calc": {"hedge_after_ms": hedge_after_ms}}}}
+    (tmp_path / "config").mkdir(parents=True, exist_ok=True)
+    with open(tmp_path / "config" / "routing.yaml", "w", encoding="utf-8") as f:
+        import yaml
+        yaml.safe_dump(routing, f, allow_unicode=True, sort_keys=False)
+
+
+def read_events(tmp_path, session_id):
+    path = tmp_path / "logs" / "sessions" / f"{session_id}.jsonl"
+    return [json.loads(l)["event"] for l in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_sync_hedge_fires_second_provider_and_takes_fastest(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    write_routing(tmp_path, 50)
+    registry = {"providers": {"slow": {"model": "m-slow"}, "fast": {"model": "m-fast"}}}
+    release, calls = threading.Event(), []
+    finished = []
+    attempt_provider = poc._attempt_provider
+
+    def tracked_attempt(*args, **kwargs):
+        try:
+            return attempt_provider(*args, **kwargs)
+        finally:
+            finished.append(args[1])
+
+    def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        calls.append(model_name)
+        if model_name == "m-slow":
+            release.wait(5)
+            # 落败方返回无效输出：已取消时不应重试或记录事件
+            return "not json"
+        return ANSWER
+
+    monkeypatch.setattr(poc, "llm_text", fake_llm)
+    monkeypatch.setattr(poc, "_attempt_provider", tracked_attempt)
+    start = time.monotonic()
+    out, provider, model, tried = poc.structured_answer_with_failover(
+        ["slow", "fast"], registry, user_prompt="q", citation="ref", tool_used="calc", tool_result=None, schema=poc.load_output_schema(), session_id="hedge-sync"
+    )
+    assert provider == "fast" and out is not None
+    assert time.monotonic() - start < 0.5
+    assert "hedge_cancelled:slow" in tried
+    # 放行落败方并等待其线程结束，避免在 ROOT 恢复后写入仓库目录
+    release.set()
+    deadline = time.monotonic() + 5
+    while "slow" not in finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "slow" in finished
+    assert calls.count("m-slow") == 1
+    events = read_events(tmp_path, "hedge-sync")
+    assert "provider_hedge" in events and "provider_cancelled" in events
+    assert events.count("structured_success") == 1 and "structured_retry" not in events
+
+
+def test_cancelled_context_skips_events_and_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    cache = poc.TTLCache(max_entries=4)
+    ctx = poc.RequestContext(session_id="cancelled", cancel_event=threading.Event())
+    ctx.cancel()
+    with poc.request_context(ctx):
+        poc.event_log("cancelled", "structured_success", {})
+        poc._llm_cache_store(cache, "k", "text", 60)
+        assert not poc._budget_allows_sleep(0.0)
+    assert not (tmp_path / "logs" / "sessions" / "cancelled.jsonl").exists()
+    assert cache.get("k") is None
+
+
+def test_async_hedge_cancels_loser(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    write_routing(tmp_path, 50)
+    registry = {"providers": {"slow": {"model": "m-slow"}, "fast": {"model": "m-fast"}}}
+    cancelled = []
+
+    async def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        if model_name == "m-slow":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(model_name)
+                raise
+        return ANSWER
+
+    monkeypatch.setattr(poc, "async_llm_text", fake_llm)
+
+    async def run():
+        res = await poc.async_structured_answer_with_failover(
+            ["slow", "fast"], registry, user_prompt="q", citation="ref", tool_used="calc", tool_result=None, schema=poc.load_output_schema()
+        )
+        await asyncio.sleep(0)
+        return res
+
+    out, provider, model, tried = asyncio.run(run())
+    assert provider == "fast" and out is not None
+    assert cancelled == ["m-slow"]
+
+
+def test_no_hedge_when_first_provider_is_fast(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    write_routing(tmp_path, 500)
+    registry = {"providers": {"p1": {"model": "m1"}, "p2": {"model": "m2"}}}
+    calls = []
+
+    def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        calls.append(model_name)
+        return ANSWER
+
+    monkeypatch.setattr(poc, "llm_text", fake_llm)
+    out, provider, model, tried = poc.structured_answer_with_failover(
+        ["p1", "p2"], registry, user_prompt="q", citation="ref", tool_used="calc", tool_result=None, schema=poc.load_output_schema()
+    )
+    assert provider == "p1" and calls == ["m1"] and tried == ["p1"]
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from scripts import poc_local_validate as poc
+from scripts.http_pool import HttpClientPool, origin_of
+
+
+@pytest.fixture
+def local_server():
+    peers = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            peers.append(self.client_address[1])
+            if self.path == "/slow":
+                time.sleep(1)
+            body = b"<html><title>hi</title>ok</html>"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", peers
+    server.shutdown()
+    server.server_close()
+
+
+def test_origin_key_ignores_path_and_default_port():
+    assert origin_of("https://Example.com:443/a?b=1") == origin_of("https://example.com/x") == "https://example.com"
+    assert origin_of("http://127.0.0.1:8080/a") == "http://127.0.0.1:8080"
+
+
+def test_sync_tools_reuse_keepalive_connection(local_server, monkeypatch):
+    base, peers = local_server
+    pool = HttpClientPool()
+    monkeypatch.setattr(poc, "_http_pool", lambda: pool)
+    assert poc.tool_web_fetch(base + "/a")["status"] == 200
+    assert poc.tool_web_scrape(base + "/b")["title"] == "hi"
+    # 两次调用复用同一条 TCP 连接
+    assert len(peers) == 2 and len(set(peers)) == 1
+    st = pool.stats()["hosts"][origin_of(base)]
+    assert st["clients"] == 1 and st["requests"] == 2 and st["responses"] == 2 and st["in_flight"] == 0
+    pool.close()
+
+
+def test_async_tools_share_client_per_loop(local_server, monkeypatch):
+    base, peers = local_server
+    pool = HttpClientPool()
+    monkeypatch.setattr(poc, "_http_pool", lambda: pool)
+
+    async def run():
+        try:
+            a = await poc.async_tool_web_fetch(base + "/a")
+            b = await poc.async_tool_web_scrape(base + "/b")
+            return a, b
+        finally:
+            await poc.close_loop_resources()
+
+    a, b = asyncio.run(run())
+    assert a["status"] == 200 and b["status"] == 200
+    assert len(set(peers)) == 1
+    assert pool.stats()["hosts"][origin_of(base)]["clients"] == 1
+
+
+def test_in_flight_settled_once_per_request(local_server):
+    import httpx
+    base, _peers = local_server
+    pool = HttpClientPool()
+    resp = pool.client(base).get(base + "/a")
+    # 已收到响应后的失败（如解析响应体出错）只计错误，不再减在途计数
+    pool.failed(base, ValueError("bad json"))
+    st = pool.stats()["hosts"][origin_of(base)]
+    assert resp.status_code == 200 and st["in_flight"] == 0 and st["errors"] == 1
+
+    dead = "http://127.0.0.1:9"
+    with pytest.raises(httpx.TransportError) as exc:
+        pool.client(dead).get(dead + "/x")
+    # 传输层异常时已结算在途计数，工具代码随后调用 failed() 只计错误
+    assert pool.stats()["hosts"][origin_of(dead)]["in_flight"] == 0
+    pool.failed(dead, exc.value)
+    pool.failed(dead, exc.value)
+    st = pool.stats()["hosts"][origin_of(dead)]
+    assert st["in_flight"] == 0 and st["errors"] == 2
+    pool.close()
+
+
+def test_cancelled_async_request_settles_in_flight(local_server):
+    base, _peers = local_server
+    pool = HttpClientPool()
+
+    async def run():
+        # 对冲落败、超时等取消场景：CancelledError 不经过工具代码的 except Exception
+        task = asyncio.ensure_future(pool.async_client(base).get(base + "/slow"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await poc.close_loop_resources()
+
+    asyncio.run(run())
+    st = pool.stats()["hosts"][origin_of(base)]
+    assert st["requests"] == 1 and st["in_flight"] == 0
+    pool.close()
@@ -0,0 +1,65 @@
+import pytest
+from scripts import poc_local_validate as poc
+from scripts.provider_stats import reset_provider_stats, get_provider_stats
+
+
+REGISTRY = {"providers": {"p1": {"model": "m1"}, "p2": {"model": "m2"}, "p3": {"model": "m3"}}}
+
+
+@pytest.fixture(autouse=True)
+def _clean_stats(monkeypatch):
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    reset_provider_stats()
+    yield
+    reset_provider_stats()
+    poc.CIRCUIT_STATE.clear()
+
+
+def test_latency_aware_prefers_fastest_provider():
+    stats = get_provider_stats()
+    for _ in range(3):
+        stats.record("p1", 900, ok=True)
+        stats.record("p2", 200, ok=True)
+        stats.record("p3", 400, ok=True)
+    routing = {"strategy": {"type": "latency_aware"}, "fallback_chain": ["p1", "p2", "p3"]}
+    assert poc.select_providers_for_tool(REGISTRY, routing, None) == ["p2", "p3", "p1"]
+    # weighted 保持配置顺序
+    routing["strategy"]["type"] = "weighted"
+    assert poc.select_providers_for_tool(REGISTRY, routing, None) == ["p1", "p2", "p3"]
+
+
+def test_error_rate_penalizes_fast_but_failing_provider():
+    stats = get_provider_stats()
+    for _ in range(4):
+        stats.record("p1", 100, ok=False)
+        stats.record("p2", 250, ok=True)
+    routing = {"strategy": {"type": "latency_aware", "error_penalty": 2.0}, "fallback_chain": ["p1", "p2", "p3"]}
+    # p3 尚无样本，排在最前获得探测流量
+    assert poc.select_providers_for_tool(REGISTRY, routing, None) == ["p3", "p2", "p1"]
+
+
+def test_record_attempt_feeds_ewma():
+    ctx = poc.RequestContext(duration_ms=120)
+    poc._record_attempt("p1", "m1", {"answer": "ok"}, ctx, {}, [], None, None)
+    ctx = poc.RequestContext(duration_ms=300, error_type="llm_none")
+    poc._record_attempt("p1", "m1", None, ctx, {}, [], None, None)
+    st = get_provider_stats().get("p1")
+    assert st["samples"] == 2 and 120 < st["latency_ms"] < 300 and 0 < st["error_rate"] < 1
+
+
+def test_penalized_provider_recovers_when_stats_stale(monkeypatch):
+    now = [1000.0]
+    stats = get_provider_stats()
+    monkeypatch.setattr(stats, "clock", lambda: now[0])
+    for _ in range(4):
+        stats.record("p1", 100, ok=False)
+        stats.record("p2", 250, ok=True)
+    routing = {"strategy": {"type": "latency_aware", "stats_half_life_seconds": 10}, "fallback_chain": ["p1", "p2"]}
+    assert poc.select_providers_for_tool(REGISTRY, routing, None) == ["p2", "p1"]
+    # p2 持续获得新样本，p1 的错误率随时间衰减
+    now[0] += 25
+    stats.record("p2", 250, ok=True)
+    assert stats.score("p1", 2.0, 10) < 100 * (1 + 2.0 * stats.get("p1")["error_rate"])
+    # 超过4个半衰期未更新：p1 视为无样本，重新排到最前获得探测流量
+    now[0] += 20
+    assert poc.select_providers_for_tool(REGISTRY, routing, None) == ["p1", "p2"]
@@ -0,0 +1,87 @@
+import json
+import yaml
+import pytest
+from scripts import poc_local_validate as poc
+from scripts.cache import TTLCache
+
+
+def write_routing(tmp_path, routing):
+    (tmp_path / "config").mkdir(parents=True, exist_ok=True)
+    with open(tmp_path / "config" / "routing.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(routing, f, allow_unicode=True, sort_keys=False)
+
+
+@pytest.fixture
+def transport(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    monkeypatch.setattr(poc, "_LLM_CACHES", {})
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test-key")
+    calls = []
+
+    def fake_dashscope(model_name, system_prompt, user_prompt, timeout=None):
+        calls.append(user_prompt)
+        return {"ok": True, "text": f"resp-{len(calls)}"}
+
+    monkeypatch.setattr(poc, "run_with_dashscope", fake_dashscope)
+    return calls
+
+
+def _events(tmp_path, session_id):
+    path = tmp_path / "logs" / "sessions" / f"{session_id}.jsonl"
+    return [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_ttl_cache_lru_and_expiry():
+    now = [0.0]
+    cache = TTLCache(max_entries=2, clock=lambda: now[0])
+    cache.set("a", 1, 10)
+    cache.set("b", 2, 10)
+    assert cache.get("a") == 1
+    cache.set("c", 3, 10)
+    assert cache.get("b") is None and cache.get("a") == 1
+    now[0] = 11.0
+    assert cache.get("a") is None and len(cache) == 1
+
+
+def test_llm_text_hits_cache_and_logs_events(tmp_path, transport):
+    write_routing(tmp_path, {"llm_cache": {"enabled": True}, "policies": {"cache_ttl_seconds": 60}})
+    with poc.request_context(session_id="s1"):
+        assert poc.llm_text("sys", "u", "m", {}) == "resp-1"
+        assert poc.llm_text("sys", "u", "m", {}) == "resp-1"
+        assert poc.llm_text("sys", "u", "other-model", {}) == "resp-2"
+    assert len(transport) == 2
+    names = [e["event"] for e in _events(tmp_path, "s1")]
+    assert names == ["llm_cache_miss", "llm_cache_hit", "llm_cache_miss"]
+
+
+def test_per_tool_ttl_zero_disables_cache(tmp_path, transport):
+    write_routing(tmp_path, {
+        "llm_cache": {"enabled": True},
+        "policies": {"cache_ttl_seconds": 60},
+        "task_routing": {"policies": {"run_command": {"cache_ttl_seconds": 0}}},
+    })
+    with poc.request_context(tool_used="run_command"):
+        poc.llm_text("sys", "u", "m", {})
+        poc.llm_text("sys", "u", "m", {})
+    assert len(transport) == 2
+
+
+def test_disk_tier_survives_restart(tmp_path, transport, monkeypatch):
+    write_routing(tmp_path, {"llm_cache": {"enabled": True, "disk": {"enabled": True, "path": "logs/c.sqlite"}}, "policies": {"cache_ttl_seconds": 60}})
+    assert poc.llm_text("sys", "u", "m", {}) == "resp-1"
+    # 模拟进程重启：丢弃内存层
+    monkeypatch.setattr(poc, "_LLM_CACHES", {})
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test-key")
+    with poc.request_context(session_id="s2"):
+        assert poc.llm_text("sys", "u", "m", {}) == "resp-1"
+    assert len(transport) == 1
+    assert _events(tmp_path, "s2")[0]["details"]["tier"] == "disk"
+
+
+def test_invalid_structured_output_is_not_served_again(tmp_path, transport, monkeypatch):
+    write_routing(tmp_path, {"llm_cache": {"enabled": True}, "policies": {"cache_ttl_seconds": 60}})
+    monkeypatch.setattr(poc.time, "sleep", lambda s: None)
+    schema = poc.load_output_schema()
+    assert poc.ask_structured_answer("m", {}, "q", "ref", None, None, schema, max_retries=0) is None
+    assert poc.ask_structured_answer("m", {}, "q", "ref", None, None, schema, max_retries=0) is None
+    assert len(transport) == 2
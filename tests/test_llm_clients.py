@@ -0,0 +1,48 @@
+from scripts import poc_local_validate as poc
+from scripts.llm_clients import DASHSCOPE, OPENAI_COMPATIBLE, ProviderClients, transport_of
+
+
+MOONSHOT = {"transport": "openai_compatible", "model": "m", "base_url": "https://example.invalid/v1", "api_key_env": "TEST_MOONSHOT_KEY"}
+
+
+def test_transport_decided_from_registry():
+    assert transport_of(MOONSHOT) == OPENAI_COMPATIBLE
+    assert transport_of({"base_url": "https://x/v1"}) == OPENAI_COMPATIBLE
+    assert transport_of({"transport": "dashscope", "base_url": "https://x/v1"}) == DASHSCOPE
+    assert transport_of({}) == DASHSCOPE
+
+
+def test_openai_provider_skips_dashscope_and_reuses_client(monkeypatch):
+    monkeypatch.setenv("TEST_MOONSHOT_KEY", "k")
+    monkeypatch.delenv("LLM_BASE_URL", raising=False)
+    clients = ProviderClients()
+    monkeypatch.setattr(poc, "get_provider_clients", lambda: clients)
+    monkeypatch.setattr(poc, "run_with_dashscope", lambda *a, **k: _must_not_call())
+    used = []
+
+    def fake_openai(client, model_name, system_prompt, user_prompt, timeout=None):
+        used.append(client)
+        return {"ok": True, "text": "ok"}
+
+    monkeypatch.setattr(poc, "run_with_openai_compatible", fake_openai)
+    assert poc.llm_text("s", "u1", "m", MOONSHOT) == "ok"
+    assert poc.llm_text("s", "u2", "m", MOONSHOT) == "ok"
+    assert used[0] is used[1]
+
+
+def test_missing_key_remembered_without_calling_transport(monkeypatch):
+    monkeypatch.delenv("TEST_MOONSHOT_KEY", raising=False)
+    monkeypatch.delenv("LLM_API_KEY", raising=False)
+    clients = ProviderClients()
+    monkeypatch.setattr(poc, "get_provider_clients", lambda: clients)
+    monkeypatch.setattr(poc, "run_with_openai_compatible", lambda *a, **k: _must_not_call())
+    assert poc.llm_text("s", "u", "m", MOONSHOT) is None
+    first = clients.resolve(MOONSHOT)
+    assert "TEST_MOONSHOT_KEY" in first.error and clients.resolve(MOONSHOT) is first
+    # 补充密钥后重新解析
+    monkeypatch.setenv("TEST_MOONSHOT_KEY", "k")
+    assert clients.resolve(MOONSHOT).error is None
+
+
+def _must_not_call():
+    raise AssertionError("dead transport should not be called")
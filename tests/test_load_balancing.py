@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+import pytest
+from scripts import poc_local_validate as poc
+from scripts.provider_stats import reset_provider_stats, get_provider_stats
+
+
+REGISTRY = {"providers": {"p1": {"model": "m1"}, "p2": {"model": "m2"}, "p3": {"model": "m3"}}}
+
+
+@pytest.fixture(autouse=True)
+def _clean(monkeypatch):
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    monkeypatch.setattr(poc, "_LB_RANDOM", random.Random(7))
+    reset_provider_stats()
+    yield
+    reset_provider_stats()
+    poc.CIRCUIT_STATE.clear()
+
+
+def test_p2c_spreads_heads_and_keeps_failover_tail():
+    routing = {"strategy": {"type": "p2c"}, "fallback_chain": ["p1", "p2", "p3"]}
+    heads = Counter()
+    for _ in range(300):
+        ordered = poc.select_providers_for_tool(REGISTRY, routing, None)
+        assert sorted(ordered) == ["p1", "p2", "p3"]
+        assert [p for p in ordered[1:]] == [p for p in ["p1", "p2", "p3"] if p != ordered[0]]
+        heads[ordered[0]] += 1
+    assert all(heads[p] > 50 for p in ["p1", "p2", "p3"])
+
+
+def test_p2c_avoids_busy_provider():
+    routing = {"strategy": {"type": "p2c"}, "fallback_chain": ["p1", "p2"]}
+    with get_provider_stats().track("p1"):
+        for _ in range(20):
+            assert poc.select_providers_for_tool(REGISTRY, routing, None)[0] == "p2"
+    assert get_provider_stats().inflight("p1") == 0
+
+
+def test_weighted_random_skips_open_circuit_and_ineligible():
+    registry = {"providers": {**REGISTRY["providers"], "p3": {"model": "m3", "capabilities": []}}}
+    routing = {
+        "strategy": {"type": "weighted_random", "weights": {"p1": 0.5, "p2": 0.5, "p3": 1.0}},
+        "fallback_chain": ["p1", "p2", "p3"],
+        "policies": {},
+        "task_routing": {"policies": {"calc": {"required_capabilities": ["function_call"]}}},
+    }
+    poc.CIRCUIT_STATE["p1"] = {"state": "open", "failures": 3, "opened_at": poc.time.monotonic()}
+    heads = {poc.select_providers_for_tool(registry, {**routing, "task_routing": {}}, None)[0] for _ in range(50)}
+    assert heads == {"p2", "p3"}
+    # calc 要求 function_call：三者都不满足时退回配置顺序
+    assert poc.select_providers_for_tool(registry, routing, "calc") == ["p1", "p2", "p3"]
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import shutil
+import yaml
+import pytest
+from scripts import poc_local_validate as poc
+
+
+REPO_ROOT = poc.ROOT
+
+
+@pytest.fixture
+def planner_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    monkeypatch.setattr(poc, "_PLAN_CACHE", poc.TTLCache(max_entries=16))
+    shutil.copytree(REPO_ROOT / "config" / "tools", tmp_path / "config" / "tools")
+    with open(tmp_path / "config" / "routing.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump({"policies": {"plan_cache_ttl_seconds": 60}}, f)
+    return tmp_path
+
+
+def _schemas():
+    return poc.load_tool_schemas(["calc", "search", "web_scrape"])
+
+
+def test_rules_plan_obvious_requests_without_llm(planner_root, monkeypatch):
+    monkeypatch.setattr(poc, "llm_text", lambda *a, **k: pytest.fail("planner LLM should not be called"))
+    plan = poc.plan_tool_use("m", {}, "请计算 12 + 34，并引用示例知识进行说明。", _schemas())
+    assert plan["tool"] == "calc" and plan["args"] == {"op": "add", "a": 12, "b": 34}
+    plan = poc.plan_tool_use("m", {}, "３乘以 2.5 是多少", _schemas())
+    assert plan["args"] == {"op": "mul", "a": 3, "b": 2.5}
+    plan = poc.plan_tool_use("m", {}, "帮我抓取 https://example.com/a 的正文", _schemas())
+    assert plan["tool"] == "web_scrape" and plan["args"]["url"] == "https://example.com/a"
+
+
+def test_llm_plans_cached_by_normalized_prompt(planner_root, monkeypatch):
+    calls = []
+
+    def fake(system_prompt, user_prompt, model_name, cfg, logger=None):
+        calls.append(user_prompt)
+        return json.dumps({"use_tool": True, "tool": "search", "args": {"query": "redis"}, "reason": "x"})
+
+    monkeypatch.setattr(poc, "llm_text", fake)
+    # 日期不满足 calc 规则的前置条件，走LLM规划
+    assert poc.plan_tool_use("m", {}, "查找 2024-01 的 Redis 文档", _schemas())["tool"] == "search"
+    assert poc.plan_tool_use("m", {}, "  查找 2024-01 的  redis 文档 ", _schemas())["tool"] == "search"
+    assert len(calls) == 1
+    # 工具目录变化时不复用
+    poc.plan_tool_use("m", {}, "查找 2024-01 的 Redis 文档", poc.load_tool_schemas(["search"]))
+    assert len(calls) == 2
+
+
+def test_invalid_llm_plan_not_cached_async(planner_root, monkeypatch):
+    calls = []
+
+    async def fake(system_prompt, user_prompt, model_name, cfg, logger=None):
+        calls.append(1)
+        return json.dumps({"use_tool": True, "tool": "calc", "args": {"op": "pow"}, "reason": "x"})
+
+    monkeypatch.setattr(poc, "async_llm_text", fake)
+    for _ in range(2):
+        asyncio.run(poc.async_plan_tool_use("m", {}, "算一下幂次", _schemas()))
+    assert len(calls) == 2
+
+
+def test_rules_skip_dates_ranges_and_loose_triggers(planner_root, monkeypatch):
+    calls = []
+
+    def fake(system_prompt, user_prompt, model_name, cfg, logger=None):
+        calls.append(user_prompt)
+        return json.dumps({"use_tool": False, "tool": None, "args": {}, "reason": "x"})
+
+    monkeypatch.setattr(poc, "llm_text", fake)
+    prompts = [
+        "第1-3章一共多少页",
+        "2025-10-17 那天的温度是多少度",
+        "iPhone 15 x 2 多少钱",
+        "帮我计算第1-3章的字数",
+        "计算 2025-10-17 当天的销量",
+        "计算型号 3x2 的尺寸",
+        "计算 1e5 + 2",
+        "请计算 1,000 + 2",
+        "请计算 2 + 1,000",
+        "1e5 + 2 = ?",
+        "我有3加2个苹果吗",
+    ]
+    for prompt in prompts:
+        assert poc.plan_tool_use("m", {}, prompt, _schemas())["use_tool"] is False
+    assert len(calls) == len(prompts)
+
+
+def test_rules_accept_equals_suffix_and_spaced_x(planner_root, monkeypatch):
+    monkeypatch.setattr(poc, "llm_text", lambda *a, **k: pytest.fail("planner LLM should not be called"))
+    assert poc.plan_tool_use("m", {}, "12 x 3 = ?", _schemas())["args"] == {"op": "mul", "a": 12, "b": 3}
+    assert poc.plan_tool_use("m", {}, "100-58等于几", _schemas())["args"] == {"op": "sub", "a": 100, "b": 58}
+    assert poc.plan_tool_use("m", {}, "请计算 -3 * 4", _schemas())["args"] == {"op": "mul", "a": -3, "b": 4}
+    assert poc.plan_tool_use("m", {}, "计算12+34等于多少", _schemas())["args"] == {"op": "add", "a": 12, "b": 34}
+    assert poc.plan_tool_use("m", {}, "3加2等于几", _schemas())["args"] == {"op": "add", "a": 3, "b": 2}
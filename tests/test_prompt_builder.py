@@ -0,0 +1,45 @@
+import json
+from scripts import poc_local_validate as poc
+
+
+def _schema():
+    return {
+        "type": "object",
+        "required": ["answer", "citations"],
+        "properties": {"citations": {"type": "array", "items": {"type": "string"}}, "answer": {"type": "string"}},
+    }
+
+
+def test_prefix_is_byte_stable_across_requests():
+    reordered = {"properties": dict(reversed(list(_schema()["properties"].items()))), "required": ["answer", "citations"], "type": "object"}
+    sys_a, user_a = poc._structured_prompts(_schema(), "问题A", "示例知识", None, None)
+    sys_b, user_b = poc._structured_prompts(reordered, "问题B", "示例知识", "calc", {"y": 2, "x": 1})
+    assert sys_a == sys_b and user_a != user_b
+    assert "问题" not in sys_a
+    assert '工具结果: {"x":1,"y":2}' in user_b
+    plan_a, _ = poc._planner_prompts("任务一", {"b": {"type": "object"}, "a": {"title": "A", "type": "object"}})
+    plan_b, _ = poc._planner_prompts("任务二", {"a": {"type": "object"}, "b": {"type": "object"}})
+    assert plan_a == plan_b
+
+
+def test_retry_appends_only_last_error_and_logs_prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    monkeypatch.setattr(poc.time, "sleep", lambda s: None)
+    prompts = []
+
+    def fake(system_prompt, user_prompt, model_name, cfg, logger=None):
+        prompts.append((system_prompt, user_prompt))
+        if len(prompts) < 3:
+            return json.dumps({"answer": f"bad{len(prompts)}"})
+        return json.dumps({"answer": "ok", "citations": ["示例知识"]})
+
+    monkeypatch.setattr(poc, "llm_text", fake)
+    data = poc.ask_structured_answer("m", {}, "问题", "示例知识", None, None, _schema(), max_retries=2, session_id="s1")
+    assert data["answer"] == "ok"
+    assert len({s for s, _u in prompts}) == 1
+    assert "上次输出" not in prompts[0][1]
+    assert prompts[2][1].count("上次输出") == 1
+    assert prompts[1][1].split("\n上次输出")[0] == prompts[2][1].split("\n上次输出")[0] == prompts[0][1]
+    events = [json.loads(l) for l in (tmp_path / "logs" / "sessions" / "s1.jsonl").read_text(encoding="utf-8").splitlines()]
+    prefix = [e["details"] for e in events if e["event"] == "prompt_prefix"]
+    assert prefix and prefix[0]["stage"] == "structured" and prefix[0]["hash"] == poc.prefix_hash(prompts[0][0])
@@ -0,0 +1,72 @@
+from scripts import poc_local_validate as poc
+from scripts import rag_index
+
+
+def _write_docs(root):
+    docs = root / "data" / "docs"
+    docs.mkdir(parents=True)
+    (docs / "agents.txt").write_text("智能体平台应具备工具集成与流程编排。\n强控制场景推荐 LangGraph 编排引擎。\n", encoding="utf-8")
+    (docs / "cache.md").write_text("Redis cache eviction uses LRU or LFU policies.\n检索可靠性：LlamaIndex Agents。\n", encoding="utf-8")
+
+
+def test_bm25_ranks_chinese_and_english():
+    index = rag_index.BM25Index()
+    index.add("a", "缓存失效策略：LRU 与 LFU", "x")
+    index.add("b", "向量检索与倒排索引", "x")
+    index.add("c", "倒排索引的 BM25 打分", "y")
+    hits = index.search("倒排索引 BM25", 2)
+    assert [h["id"] for h in hits] == ["c", "b"] and hits[0]["score"] > hits[1]["score"] > 0
+    assert index.search("lfu", 5)[0]["id"] == "a"
+    assert index.search("天气", 5) == []
+    assert index.remove("c") and [h["id"] for h in index.search("倒排索引 BM25", 2)] == ["b"]
+
+
+def test_simple_rag_uses_persisted_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    _write_docs(tmp_path)
+    rag_index.sync_rag_store(tmp_path)
+    assert poc.simple_rag("LangGraph 编排") == "强控制场景推荐 LangGraph 编排引擎。"
+    assert poc.simple_rag("how does redis cache eviction work") == "Redis cache eviction uses LRU or LFU policies."
+    # 无命中时回退为首个文件的首个内容块
+    assert poc.simple_rag("天气") == "智能体平台应具备工具集成与流程编排。"
+    assert rag_index.manifest_path(tmp_path).exists()
+    # 新进程（清空进程内缓存）直接加载持久化索引，不重新切块与分词
+    rag_index.clear_rag_stores()
+    monkeypatch.setattr(rag_index, "chunk_text", lambda text: (_ for _ in ()).throw(AssertionError("rebuilt")))
+    assert poc.rag_search("检索可靠性", 1)[0]["source"] == "data/docs/cache.md"
+
+
+def test_title_lines_merge_into_following_content():
+    text = "【示例知识】\n智能体平台应具备：工具集成。\n\n选型建议：\n- 强控制：LangGraph。\n- 协作场景：CrewAI。\n"
+    assert rag_index.chunk_text(text) == [
+        "【示例知识】\n智能体平台应具备：工具集成。",
+        "选型建议：\n- 强控制：LangGraph。",
+        "- 协作场景：CrewAI。",
+    ]
+    windows = rag_index.chunk_text("字" * 1000, max_chars=400, overlap=50)
+    assert [len(w) for w in windows] == [400, 400, 300]
+
+
+def test_demo_prompt_cites_content_chunk(tmp_path, monkeypatch):
+    sample = poc.ROOT / "data" / "docs" / "sample_knowledge.txt"
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    (tmp_path / "data" / "docs").mkdir(parents=True)
+    (tmp_path / "data" / "docs" / "sample_knowledge.txt").write_text(sample.read_text(encoding="utf-8"), encoding="utf-8")
+    rag_index.sync_rag_store(tmp_path)
+    citation = poc.simple_rag("请计算 12 + 34，并引用示例知识进行说明。")
+    assert citation != "【示例知识】" and "智能体平台应具备" in citation
+    assert "智能体平台应具备" in poc.simple_rag("什么是RAG")
+
+
+def test_request_path_only_loads_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    _write_docs(tmp_path)
+    # 全新检出（无索引）：请求路径在内存中冷构建，不写 data/index
+    assert poc.rag_search("LangGraph", 1)[0]["source"] == "data/docs/agents.txt"
+    assert not (tmp_path / "data" / "index").exists()
+    # 启动同步把内存中的索引写出，新进程直接加载
+    assert rag_index.sync_rag_store(tmp_path)["added"] == 2
+    assert rag_index.manifest_path(tmp_path).exists()
+    rag_index.clear_rag_stores()
+    monkeypatch.setattr(rag_index, "chunk_text", lambda text: (_ for _ in ()).throw(AssertionError("rebuilt")))
+    assert poc.rag_search("LangGraph", 1)[0]["source"] == "data/docs/agents.txt"
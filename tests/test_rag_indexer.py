@@ -0,0 +1,55 @@
+import os
+from scripts import poc_local_validate as poc
+from scripts import rag_index
+from scripts.rag_indexer import run_indexer
+
+
+def _docs(root):
+    docs = root / "data" / "docs"
+    docs.mkdir(parents=True, exist_ok=True)
+    return docs
+
+
+def _counts(stats):
+    return {k: stats[k] for k in ("added", "updated", "deleted", "unchanged")}
+
+
+def test_indexer_updates_only_changed_files(tmp_path, monkeypatch):
+    docs = _docs(tmp_path)
+    (docs / "a.txt").write_text("LangGraph 编排引擎\n", encoding="utf-8")
+    (docs / "b.md").write_text("Redis 缓存淘汰策略\n", encoding="utf-8")
+    assert _counts(run_indexer(tmp_path)) == {"added": 2, "updated": 0, "deleted": 0, "unchanged": 0}
+    assert _counts(run_indexer(tmp_path)) == {"added": 0, "updated": 0, "deleted": 0, "unchanged": 2}
+
+    # 仅 mtime 变化：按 sha256 判定内容未变，不重新切块
+    os.utime(docs / "a.txt", ns=(1, 1))
+    monkeypatch.setattr(rag_index, "chunk_text", lambda text: (_ for _ in ()).throw(AssertionError("re-chunked")))
+    assert run_indexer(tmp_path)["unchanged"] == 2
+    monkeypatch.undo()
+
+    (docs / "b.md").write_text("Kafka 消费组重平衡\n", encoding="utf-8")
+    (docs / "a.txt").unlink()
+    (docs / "c.txt").write_text("检索可靠性\n", encoding="utf-8")
+    assert _counts(run_indexer(tmp_path)) == {"added": 1, "updated": 1, "deleted": 1, "unchanged": 0}
+
+    store = rag_index.RagIndexStore(tmp_path)
+    assert store.load()
+    assert store.search("Kafka 重平衡", 1)[0]["source"] == "data/docs/b.md"
+    assert store.search("Redis", 1) == [] and store.search("LangGraph", 1) == []
+    assert sorted(store.files) == ["data/docs/b.md", "data/docs/c.txt"]
+
+
+def test_file_write_output_is_indexed(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    _docs(tmp_path)
+    assert poc.simple_rag("季度复盘") is None
+    out = tmp_path / "data" / "notes" / "review.txt"
+    assert "error" not in poc.tool_file_write(str(out), "第三季度复盘：延迟下降 40%\n", overwrite=True)
+    # 已加载的进程内索引立即可检索
+    assert poc.simple_rag("季度复盘") == "第三季度复盘：延迟下降 40%"
+    assert rag_index.tracked_path(tmp_path).read_text(encoding="utf-8").split() == ["data/notes/review.txt"]
+    # 请求路径只更新内存索引，不写 manifest；由索引命令持久化登记过的文件
+    assert not rag_index.manifest_path(tmp_path).exists()
+    out.write_text("第四季度复盘\n", encoding="utf-8")
+    assert run_indexer(tmp_path)["added"] == 1
+    assert run_indexer(tmp_path)["unchanged"] == 1
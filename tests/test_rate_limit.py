@@ -0,0 +1,82 @@
+import asyncio
+import json
+from scripts import poc_local_validate as poc
+from scripts.rate_limit import ProviderRateLimiter, TokenBucket, get_rate_limiter, reset_rate_limiters
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(2, 1.0, clock)
+    assert bucket.wait_for(2) == 0.0
+    bucket.take(2)
+    assert bucket.wait_for(1) == 1.0
+    clock.now = 0.5
+    assert bucket.wait_for(1) == 0.5
+
+
+def test_limiter_rpm_waits_then_rejects_beyond_max_wait():
+    clock = FakeClock()
+    limiter = ProviderRateLimiter(rpm=60, clock=clock)
+    limiter.rpm_bucket.take(60)
+    # 1 rps：下一请求需等待约1秒
+    assert limiter.reserve(0, max_wait_seconds=0.5) is None
+    assert abs(limiter.reserve(0, max_wait_seconds=2.0) - 1.0) < 1e-9
+    # 预留后继续排队
+    assert abs(limiter.reserve(0, max_wait_seconds=3.0) - 2.0) < 1e-9
+
+
+def test_limiter_tpm_bounds_token_volume():
+    limiter = ProviderRateLimiter(tpm=600, clock=FakeClock())
+    assert limiter.reserve(600, 0) == 0.0
+    assert limiter.reserve(100, 0) is None
+
+
+def test_async_acquire_does_not_block_loop():
+    limiter = ProviderRateLimiter(rpm=6000)
+
+    async def run():
+        return await asyncio.gather(*(limiter.async_acquire(0, 1.0) for _ in range(10)))
+
+    assert all(asyncio.run(run()))
+
+
+def test_failover_skips_rate_limited_provider(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    reset_rate_limiters()
+    registry = {"providers": {
+        "tight": {"model": "m1", "rate_limits": {"rpm": 1}},
+        "loose": {"model": "m2", "rate_limits": {"rpm": 1000}},
+    }}
+    monkeypatch.setattr(poc, "llm_text", lambda *a, **k: json.dumps({"answer": "ok", "citations": ["ref"], "tool_used": None, "tool_result": None}))
+    # 第一次消耗 tight 的唯一额度
+    _out, provider, _m, _t = poc.structured_answer_with_failover(["tight", "loose"], registry, "q", "ref", None, None, poc.load_output_schema(), session_id="rl")
+    assert provider == "tight"
+    _out, provider, _m, tried = poc.structured_answer_with_failover(["tight", "loose"], registry, "q", "ref", None, None, poc.load_output_schema(), session_id="rl")
+    assert provider == "loose"
+    assert "skip_rate_limit:tight" in tried
+    lines = (tmp_path / "logs" / "sessions" / "rl.jsonl").read_text(encoding="utf-8")
+    assert "provider_skip_rate_limit" in lines
+    assert get_rate_limiter("tight", {"rpm": 1}) is get_rate_limiter("tight", {"rpm": 1})
+    reset_rate_limiters()
+
+
+def test_structured_retries_reserve_quota_per_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    reset_rate_limiters()
+    registry = {"providers": {"tight": {"model": "m1", "rate_limits": {"rpm": 2}}}}
+    calls = []
+    monkeypatch.setattr(poc, "llm_text", lambda *a, **k: calls.append(1) or "not json")
+    out, provider, _m, _t = poc.structured_answer_with_failover(["tight"], registry, "q", "ref", None, None, poc.load_output_schema(), session_id="rl-retry")
+    # 首次调用与第一次重试各占一次额度，第二次重试等不到额度即放弃（而不是在同一次预留下调用三次）
+    assert out is None and provider is None and len(calls) == 2
+    lines = (tmp_path / "logs" / "sessions" / "rl-retry.jsonl").read_text(encoding="utf-8")
+    assert "structured_retry_rate_limited" in lines
+    reset_rate_limiters()
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import threading
+import time
+from scripts import poc_local_validate as poc
+
+
+ANSWER = json.dumps({"answer": "ok", "citations": ["ref"], "tool_used": None, "tool_result": None}, ensure_ascii=False)
+
+
+def write_routing(tmp_path, policies):
+    (tmp_path / "config").mkdir(parents=True, exist_ok=True)
+    with open(tmp_path / "config" / "routing.yaml", "w", encoding="utf-8") as f:
+        import yaml
+        yaml.safe_dump({"policies": policies}, f, allow_unicode=True, sort_keys=False)
+
+
+def test_ask_structured_answer_records_into_active_context(monkeypatch):
+    monkeypatch.setattr(poc, "llm_text", lambda *a, **k: ANSWER)
+    with poc.request_context(session_id=None) as ctx:
+        out = poc.ask_structured_answer("m", {}, "q", "ref", None, None, poc.load_output_schema())
+    assert out is not None
+    assert ctx.attempts == 1 and ctx.error_type is None and isinstance(ctx.duration_ms, int)
+
+
+def test_concurrent_threads_do_not_share_latency(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    write_routing(tmp_path, {"max_latency_ms": 100})
+    registry = {"providers": {"slow": {"model": "m-slow"}, "fast": {"model": "m-fast"}}}
+
+    def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        time.sleep(0.25 if model_name == "m-slow" else 0.0)
+        return ANSWER
+
+    monkeypatch.setattr(poc, "llm_text", fake_llm)
+    results = {}
+
+    def run(name):
+        out, provider, _m, tried = poc.structured_answer_with_failover(
+            [name], registry, user_prompt="q", citation="ref", tool_used=None, tool_result=None, schema=poc.load_output_schema()
+        )
+        results.setdefault(name, []).append(provider)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in ["slow", "fast"] * 3]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results["slow"] == [None, None, None]
+    assert results["fast"] == ["fast", "fast", "fast"]
+
+
+def test_async_tasks_get_isolated_contexts(monkeypatch):
+    async def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        await asyncio.sleep(0.05 if model_name == "slow" else 0.0)
+        return None if model_name == "slow" else ANSWER
+
+    monkeypatch.setattr(poc, "async_llm_text", fake_llm)
+    monkeypatch.setattr(poc.asyncio, "sleep", _fast_sleep(asyncio.sleep))
+
+    async def one(model_name):
+        with poc.request_context() as ctx:
+            await poc.async_ask_structured_answer(model_name, {}, "q", "ref", None, None, poc.load_output_schema(), max_retries=0)
+            return ctx
+
+    async def run():
+        return await asyncio.gather(one("slow"), one("fast"))
+
+    slow_ctx, fast_ctx = asyncio.run(run())
+    assert slow_ctx.error_type == "schema_invalid"
+    assert fast_ctx.error_type is None
+
+
+def _fast_sleep(real_sleep):
+    async def sleep(delay, *args, **kwargs):
+        return await real_sleep(min(delay, 0.05), *args, **kwargs)
+    return sleep
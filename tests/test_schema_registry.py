@@ -0,0 +1,39 @@
+import copy
+import json
+import os
+import pytest
+from jsonschema import validate as jsonschema_validate, ValidationError
+from scripts import poc_local_validate as poc
+from scripts.schema_registry import ValidatorRegistry
+
+
+def test_validators_compiled_once_and_shared():
+    reg = ValidatorRegistry()
+    schema = poc.load_output_schema()
+    v = reg.get(schema)
+    assert reg.get(schema) is v
+    # 重新加载出的等价Schema复用同一校验器
+    assert reg.get(copy.deepcopy(schema)) is v
+    bad = {"answer": 1, "citations": [], "tool_used": None, "tool_result": None}
+    with pytest.raises(ValidationError) as ours:
+        reg.validate(bad, schema)
+    with pytest.raises(ValidationError) as ref:
+        jsonschema_validate(instance=bad, schema=schema)
+    assert str(ours.value) == str(ref.value)
+
+
+def test_file_schema_recompiled_on_change(tmp_path):
+    reg = ValidatorRegistry()
+    path = tmp_path / "d.json"
+    path.write_text(json.dumps({"type": "object", "required": ["a"]}), encoding="utf-8")
+    assert not reg.for_file(path).is_valid({})
+    assert reg.load_file(path) is reg.load_file(path)
+    path.write_text(json.dumps({"type": "object"}), encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert reg.for_file(path).is_valid({})
+
+
+def test_format_checking_is_opt_in():
+    schema = {"type": "string", "format": "email"}
+    assert ValidatorRegistry().get(schema).is_valid("nope")
+    assert not ValidatorRegistry(format_checker=True).get(schema).is_valid("nope")
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from scripts import poc_local_validate as poc
+from scripts import serve
+
+
+STATE = {"registry": {}, "routing": {}, "tool_schemas": {}, "schema": {}}
+
+
+async def _request(port, method, path, payload=None, keep_alive=False):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\n"
+    if not keep_alive:
+        head += "Connection: close\r\n"
+    writer.write(head.encode() + b"\r\n" + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        k, _, v = line.decode().partition(":")
+        headers[k.strip().lower()] = v.strip()
+    data = json.loads(await reader.readexactly(int(headers["content-length"])))
+    writer.close()
+    return status, data
+
+
+def test_answer_endpoint_runs_pipeline_with_preloaded_state(monkeypatch):
+    seen = {}
+
+    async def fake_pipeline(prompt, registry=None, routing=None, tool_schemas=None, schema=None, logger=None, session_id=None):
+        seen["registry"] = registry
+        seen["remaining_ms"] = poc.current_request_context().remaining_ms()
+        return {"session_id": session_id, "output": {"answer": prompt}}
+
+    monkeypatch.setattr(poc, "async_run_pipeline", fake_pipeline)
+
+    async def run():
+        server = await asyncio.start_server(serve.make_handler(STATE), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            ok = await _request(port, "POST", "/answer", {"prompt": "你好", "session_id": "s1", "timeout_ms": 2000})
+            health = await _request(port, "GET", "/healthz")
+            bad = await _request(port, "POST", "/answer", {"prompt": ""})
+            missing = await _request(port, "GET", "/nope")
+        finally:
+            server.close()
+            await server.wait_closed()
+        return ok, health, bad, missing
+
+    ok, health, bad, missing = asyncio.run(run())
+    assert ok == (200, {"session_id": "s1", "output": {"answer": "你好"}})
+    assert seen["registry"] is STATE["registry"] and 0 < seen["remaining_ms"] <= 2000
+    assert health[0] == 200 and health[1]["ok"] is True
+    assert bad[0] == 400 and missing[0] == 404
+
+
+def test_oversized_header_gets_431():
+    async def run():
+        server = await asyncio.start_server(serve.make_handler(STATE), "127.0.0.1", 0, limit=1024)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /healthz HTTP/1.1\r\nX-Big: " + b"a" * 4096 + b"\r\n\r\n")
+            await writer.drain()
+            status_line = await reader.readline()
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+        return int(status_line.split()[1])
+
+    assert asyncio.run(run()) == 431
+
+
+def test_pipeline_state_precompiles_schemas(monkeypatch):
+    from scripts.schema_registry import ValidatorRegistry
+    reg = ValidatorRegistry()
+    monkeypatch.setattr(serve, "get_validator_registry", lambda: reg)
+    state = serve.load_pipeline_state()
+    assert len(reg._by_id) == 1 + len(state["tool_schemas"])
+    assert reg.get(state["schema"]) is reg._by_id[id(state["schema"])][1]
+
+
+def test_prefork_workers_serve_shared_socket(tmp_path):
+    root = Path(__file__).resolve().parents[1]
+    proc = subprocess.Popen(
+        [sys.executable, str(root / "scripts" / "serve.py"), "--port", "0", "--workers", "2"],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, cwd=str(root),
+    )
+    try:
+        line = proc.stdout.readline()
+        port = int(line.rsplit(":", 1)[1].split()[0])
+        pids = set()
+        deadline = time.time() + 10
+        while time.time() < deadline and len(pids) < 1:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=2) as resp:
+                    pids.add(json.loads(resp.read())["pid"])
+            except OSError:
+                time.sleep(0.1)
+        assert pids and proc.pid not in pids
+    finally:
+        proc.terminate()
+        proc.wait(10)
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import time
+from scripts import poc_local_validate as poc
+from scripts.single_flight import SingleFlight
+
+
+REGISTRY = {"default_provider": "p1", "providers": {"p1": {"model": "m1"}}}
+
+
+def _install_fake_llm(monkeypatch, calls):
+    async def fake_llm(system_prompt, user_prompt, model_name, cfg, logger=None):
+        calls.append("plan" if "工具规划器" in system_prompt else "answer")
+        await asyncio.sleep(0.05)
+        if "工具规划器" in system_prompt:
+            return json.dumps({"use_tool": False, "tool": None, "args": {}, "reason": "none"})
+        citation = user_prompt.split("参考: ")[1].splitlines()[0]
+        return json.dumps({"answer": "ok", "citations": [citation], "tool_used": None, "tool_result": None}, ensure_ascii=False)
+
+    monkeypatch.setattr(poc, "async_llm_text", fake_llm)
+
+
+def _run_burst(prompts, routing):
+    async def run():
+        return await asyncio.gather(*[
+            poc.async_run_pipeline(p, registry=REGISTRY, routing=routing, tool_schemas={}, schema=poc.load_output_schema())
+            for p in prompts
+        ])
+    return asyncio.run(run())
+
+
+def test_identical_burst_pays_one_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    calls = []
+    _install_fake_llm(monkeypatch, calls)
+    results = _run_burst(["同一个问题"] * 6 + ["另一个问题"], {"fallback_chain": ["p1"]})
+    assert calls.count("plan") == 2 and calls.count("answer") == 2
+    assert sum(1 for r in results if r["coalesced"]) == 5
+    assert len({r["session_id"] for r in results}) == 7
+    # 各请求拿到独立副本
+    results[0]["output"]["answer"] = "changed"
+    assert results[1]["output"]["answer"] == "ok"
+
+
+def test_single_flight_can_be_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    calls = []
+    _install_fake_llm(monkeypatch, calls)
+    _run_burst(["同一个问题"] * 3, {"fallback_chain": ["p1"], "policies": {"single_flight": False}})
+    assert calls.count("answer") == 3
+
+
+def test_followers_share_errors_and_survive_leader_cancel():
+    async def run():
+        flights = SingleFlight()
+        runs = []
+
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flights.do("k", boom), flights.do("k", boom), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return "v"
+
+        leader = asyncio.ensure_future(flights.do("k2", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("k2", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == ("v", False)
+        assert len(runs) == 2 and flights.inflight() == 0
+
+    asyncio.run(run())
+
+
+def test_followers_bounded_by_own_deadline_and_routing(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    calls = []
+    _install_fake_llm(monkeypatch, calls)
+    routing = {"fallback_chain": ["p1"]}
+    schema = poc.load_output_schema()
+
+    async def follower():
+        await asyncio.sleep(0.01)
+        with poc.request_context(deadline=time.monotonic() + 0.02):
+            return await poc.async_run_pipeline("同一个问题", registry=REGISTRY, routing=routing, tool_schemas={}, schema=schema)
+
+    async def run():
+        leader = poc.async_run_pipeline("同一个问题", registry=REGISTRY, routing=routing, tool_schemas={}, schema=schema)
+        other = poc.async_run_pipeline("同一个问题", registry=REGISTRY, routing={"fallback_chain": ["p1"], "policies": {}}, tool_schemas={}, schema=schema)
+        return await asyncio.gather(leader, follower(), other)
+
+    start = time.monotonic()
+    leader, timed_out, other = asyncio.run(run())
+    assert timed_out["tried"] == ["single_flight_timeout"] and timed_out["fallback"] is True
+    assert timed_out["output"]["citations"] == leader["output"]["citations"]
+    # 路由配置不同的请求不共享结果
+    assert not other["coalesced"] and calls.count("answer") == 2
+    assert time.monotonic() - start < 1.0
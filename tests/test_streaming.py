@@ -0,0 +1,74 @@
+import asyncio
+import json
+from scripts import poc_local_validate as poc
+from scripts.stream_validate import StreamingJSONValidator
+
+
+ANSWER = json.dumps({"answer": "ok", "citations": ["ref"], "tool_used": None, "tool_result": None}, ensure_ascii=False)
+BAD = '{"answer": "ok", "citations": ["other"], "tool_used": null, "tool_result": null}' + " " * 200
+
+
+def _chunks(text, size=8):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def fake_stream_factory(outputs, fed):
+    """按调用次数依次流式输出，记录每次实际送出的字符数"""
+    calls = {"n": 0}
+
+    def fake(system_prompt, user_prompt, model_name, cfg, on_delta, logger=None):
+        text = outputs[min(calls["n"], len(outputs) - 1)]
+        calls["n"] += 1
+        sent = []
+        for c in _chunks(text):
+            sent.append(c)
+            if on_delta(c) is False:
+                fed.append(len("".join(sent)))
+                return {"text": "".join(sent), "aborted": True, "first_token_ms": 5}
+        fed.append(len(text))
+        return {"text": text, "aborted": False, "first_token_ms": 5}
+
+    return fake
+
+
+def test_validator_aborts_on_schema_violations():
+    schema = poc.load_output_schema()
+    v = StreamingJSONValidator(schema, "ref")
+    assert v.feed('{"answer": "ok", "citations": ["other"]') is False
+    assert "citations" in v.error
+    v = StreamingJSONValidator(schema, "ref")
+    assert v.feed("[1, 2") is False
+    v = StreamingJSONValidator(schema, "ref")
+    for c in _chunks("```json\n" + ANSWER + "\n```", 3):
+        assert v.feed(c) is True
+    assert v.done and v.error is None
+    # 以说明文字开头时不做提前校验
+    v = StreamingJSONValidator(schema, "ref")
+    assert v.feed('结果如下：["x"]') is True and v.passive
+
+
+def test_stream_abort_retries_before_full_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    monkeypatch.setattr(poc.time, "sleep", lambda s: None)
+    fed = []
+    monkeypatch.setattr(poc, "llm_text_stream", fake_stream_factory([BAD, ANSWER], fed))
+    out = poc.ask_structured_answer("m", {}, "q", "ref", None, None, poc.load_output_schema(), session_id="s1", stream=True)
+    assert out is not None and out["answer"] == "ok"
+    assert fed[0] < len(BAD) and fed[1] == len(ANSWER)
+    events = [json.loads(l)["event"] for l in (tmp_path / "logs" / "sessions" / "s1.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert "structured_stream_abort" in events and events.count("first_token") == 2
+
+
+def test_stream_policy_enables_async_streaming(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    fed = []
+    sync_fake = fake_stream_factory([ANSWER], fed)
+
+    async def fake(*a, **k):
+        return sync_fake(*a, **k)
+
+    monkeypatch.setattr(poc, "async_llm_text_stream", fake)
+    ctx = poc._failover_context({"stream": True}, None, None, 0.0)
+    with poc.request_context(ctx):
+        out = asyncio.run(poc.async_ask_structured_answer("m", {}, "q", "ref", None, None, poc.load_output_schema()))
+    assert out is not None and fed == [len(ANSWER)]
@@ -0,0 +1,57 @@
+import yaml
+import pytest
+from scripts import poc_local_validate as poc
+
+
+@pytest.fixture
+def guarded_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    monkeypatch.setattr(poc, "_TOOL_CACHE", poc.TTLCache(max_entries=16))
+    (tmp_path / "config" / "policies").mkdir(parents=True)
+    (tmp_path / "data").mkdir()
+    guard = {"tools": {
+        "file_read": {"cache_ttl_seconds": 60},
+        "calc": {"cache_ttl_seconds": 60},
+        "file_write": {"allowed_base_dir": "data", "cache_ttl_seconds": 60},
+    }}
+    with open(tmp_path / "config" / "policies" / "guardrails.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(guard, f)
+    return tmp_path
+
+
+def test_repeated_args_hit_cache_regardless_of_key_order(guarded_root, monkeypatch):
+    calls = []
+    monkeypatch.setitem(poc.TOOL_HANDLERS, "calc", lambda args, up: calls.append(args) or {"result": args["a"] + args["b"]})
+    assert poc.run_tool("calc", {"op": "add", "a": 1, "b": 2}, "q") == {"result": 3}
+    assert poc.run_tool("calc", {"b": 2, "a": 1, "op": "add"}, "q") == {"result": 3}
+    assert poc.run_tool("calc", {"op": "add", "a": 1, "b": 5}, "q") == {"result": 6}
+    assert len(calls) == 2
+
+
+def test_file_tool_invalidates_on_mtime_or_size(guarded_root, monkeypatch):
+    path = guarded_root / "data" / "a.txt"
+    path.write_text("v1", encoding="utf-8")
+    calls = []
+    monkeypatch.setitem(poc.TOOL_HANDLERS, "file_read", lambda args, up: calls.append(1) or {"text": open(args["path"], encoding="utf-8").read()})
+    assert poc.run_tool("file_read", {"path": str(path)}, "q")["text"] == "v1"
+    assert poc.run_tool("file_read", {"path": str(path)}, "q")["text"] == "v1"
+    path.write_text("v2 longer", encoding="utf-8")
+    assert poc.run_tool("file_read", {"path": str(path)}, "q")["text"] == "v2 longer"
+    assert len(calls) == 2
+
+
+def test_side_effecting_tools_bypass_cache(guarded_root):
+    target = guarded_root / "data" / "out.txt"
+    poc.run_tool("file_write", {"path": str(target), "text": "x"}, "q")
+    poc.run_tool("file_write", {"path": str(target), "text": "x"}, "q")
+    assert target.read_text(encoding="utf-8") == "xx"
+
+
+def test_failed_http_status_not_cached(guarded_root, monkeypatch):
+    calls = []
+    results = iter([{"status_code": 500, "text": "oops"}, {"status": 503}, {"status_code": 200, "text": "ok"}])
+    monkeypatch.setitem(poc.TOOL_HANDLERS, "calc", lambda args, up: calls.append(1) or next(results))
+    for expected in (500, 503, 200, 200):
+        res = poc.run_tool("calc", {"op": "add", "a": 1, "b": 2}, "q")
+        assert res.get("status_code", res.get("status")) == expected
+    assert len(calls) == 3
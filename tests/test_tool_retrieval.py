@@ -0,0 +1,106 @@
+import asyncio
+import json
+import shutil
+import yaml
+import pytest
+from scripts import poc_local_validate as poc
+from scripts.tool_retrieval import ToolIndex
+
+
+REPO_ROOT = poc.ROOT
+
+
+@pytest.fixture
+def retrieval_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(poc, "ROOT", tmp_path)
+    monkeypatch.setattr(poc, "_PLAN_CACHE", poc.TTLCache(max_entries=16))
+    shutil.copytree(REPO_ROOT / "config" / "tools", tmp_path / "config" / "tools")
+    # 去掉快速规则，确保走LLM规划
+    (tmp_path / "config" / "tools" / "rules.yaml").unlink()
+    return tmp_path
+
+
+def _routing(root, **policies):
+    with open(root / "config" / "routing.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump({"policies": dict(planner_top_k=2, **policies)}, f)
+
+
+def _catalogue(system_prompt: str, user_prompt: str) -> set:
+    lines = (system_prompt + "\n" + user_prompt).splitlines()
+    line = [l for l in lines if l.startswith("可用工具Schemas: ")][0]
+    return set(json.loads(line.split(": ", 1)[1]))
+
+
+def test_index_ranks_relevant_tools():
+    schemas = poc.load_tool_schemas(poc.discover_tool_names())
+    index = ToolIndex(schemas)
+    assert index.top_k("12乘以3等于多少", 1) == ["calc"]
+    assert index.top_k("把这段话翻译成英文", 1) == ["translate"]
+    assert index.rank("hello there") == []
+
+
+def test_prefix_mode_keeps_full_catalogue_in_system(retrieval_root, monkeypatch):
+    _routing(retrieval_root)
+    seen = []
+
+    def fake(system_prompt, user_prompt, model_name, cfg, logger=None):
+        seen.append((system_prompt, user_prompt))
+        return json.dumps({"use_tool": False, "tool": None, "args": {}, "reason": "x"})
+
+    monkeypatch.setattr(poc, "llm_text", fake)
+    schemas = poc.load_tool_schemas(poc.discover_tool_names())
+    poc.plan_tool_use("m", {}, "把这段话翻译成英文", schemas)
+    poc.plan_tool_use("m", {}, "列出 data 目录下的文件", schemas)
+    # 候选工具随请求变化，但 system 前缀保持字节一致
+    assert seen[0][0] == seen[1][0] and "候选工具" not in seen[0][0]
+    assert _catalogue(seen[0][0], "") == set(schemas)
+    assert "候选工具（按相关度）: translate" in seen[0][1]
+
+
+def test_shortlist_mode_sends_only_candidates(retrieval_root, monkeypatch):
+    _routing(retrieval_root, planner_catalogue="shortlist")
+    seen = []
+
+    def fake(system_prompt, user_prompt, model_name, cfg, logger=None):
+        seen.append((system_prompt, _catalogue(system_prompt, user_prompt)))
+        return json.dumps({"use_tool": True, "tool": "translate", "args": {"text": "你好", "target_lang": "en"}, "reason": "x"})
+
+    monkeypatch.setattr(poc, "llm_text", fake)
+    schemas = poc.load_tool_schemas(poc.discover_tool_names())
+    plan = poc.plan_tool_use("m", {}, "把这段话翻译成英文", schemas)
+    assert plan["tool"] == "translate"
+    assert len(seen) == 1 and "translate" in seen[0][1] and len(seen[0][1]) <= 2
+    assert "可用工具" not in seen[0][0]
+
+
+def test_unlisted_tool_replans_with_full_catalogue(retrieval_root, monkeypatch):
+    _routing(retrieval_root, planner_catalogue="shortlist")
+    seen = []
+
+    async def fake(system_prompt, user_prompt, model_name, cfg, logger=None):
+        seen.append(_catalogue(system_prompt, user_prompt))
+        return json.dumps({"use_tool": True, "tool": "list_dir", "args": {"path": "."}, "reason": "x"})
+
+    monkeypatch.setattr(poc, "async_llm_text", fake)
+    schemas = poc.load_tool_schemas(poc.discover_tool_names())
+    plan = asyncio.run(poc.async_plan_tool_use("m", {}, "把这段话翻译成英文", schemas))
+    assert plan["tool"] == "list_dir"
+    assert len(seen) == 2 and "list_dir" not in seen[0] and seen[1] == set(schemas)
+
+
+def test_tool_index_cached_by_snapshot_identity(monkeypatch):
+    from scripts import tool_retrieval
+    from scripts.config_loader import freeze
+
+    schemas = freeze(poc.load_tool_schemas(["calc", "search"]))
+    index = tool_retrieval.get_tool_index(schemas)
+
+    class NoDumps:
+        @staticmethod
+        def dumps(*a, **k):
+            raise AssertionError("catalogue serialized on the hot path")
+
+    monkeypatch.setattr(tool_retrieval, "json", NoDumps)
+    assert tool_retrieval.get_tool_index(schemas) is index
+    # 新快照（即使内容相同）得到新索引
+    assert tool_retrieval.get_tool_index(freeze(dict(schemas))) is not index
@@ -111,3 +111,14 @@ def test_routing_unknown_tool_warns(tmp_path, monkeypatch):
     ok, issues = vc.validate_all()
     assert ok
     assert any("without a schema file" in i.get("message", "") for i in issues)
+
+
+def test_negative_hedge_after_ms_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(vc, "ROOT", tmp_path)
+    reg = {"providers": {"q": {"model": "m"}}, "default_provider": "q"}
+    routing = {"task_routing": {"policies": {"calc": {"hedge_after_ms": -1}}}}
+    write_yaml(tmp_path / "config" / "models" / "registry.yaml", reg)
+    write_yaml(tmp_path / "config" / "routing.yaml", routing)
+    ok, issues = vc.validate_all()
+    assert not ok
+    assert any("hedge_after_ms" in i.get("message", "") for i in issues)